@@ -0,0 +1,575 @@
+"""
+Local columnar mirror of patient_assessments for the analytics endpoints.
+
+Rows are kept in one partition per month (by assessment_date). Each
+partition stores its data as typed NumPy columns:
+
+- ``dates``: datetime64[s];
+- ``prediction``, ``risk_level``, ``physician``, ``model_version``: int32
+  codes into store-wide dictionaries;
+- ``eeg``: an (n, 19) float32 matrix, NaN where a row had no usable EEG.
+
+Queries are vectorized passes over those arrays. Months that lie wholly
+inside the requested range reuse per-partition results that are cached
+until the partition next changes. Only the months at the edges of the
+range are filtered row by row, so queries take milliseconds and never
+touch the remote database.
+
+The mirror stays current from two sources:
+
+- The write-behind insert path (``record``, an AssessmentWriter listener)
+  adds this worker's new assessments immediately.
+- ``sync`` reads rows created since the last sync (keyset on created_at, id)
+  from the database, every ``sync_interval`` seconds. The rows it fetches
+  replace the matching listener rows.
+
+Updates to existing rows, such as rescore_job.py, show up at the next full
+``rebuild`` (every ``rebuild_interval``, or ``python analytics_store.py
+rebuild``). After each sync that changes anything, the partitions are
+written as ``.npz`` files into a new snapshot directory, and CURRENT is
+switched to it. Months that did not change are hard-linked, not rewritten.
+A restart therefore loads the mirror from disk and only fetches what is
+new.
+
+Every worker process of a server keeps its own mirror, but they share the
+snapshot directory. Snapshot names end in the writer's PID. A worker prunes
+only its own older snapshots, plus those of processes that have exited, so
+it never deletes one another worker may still be reading or linking from.
+``start`` returns at once. The snapshot load and the first sync run on the
+background thread, so until they finish, queries answer from whatever is
+loaded, and ``synced_at`` is null until the first sync.
+"""
+
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from assessment_queries import _quote
+from features import eeg_columns, decode_eeg_blobs
+
+TABLE = "patient_assessments"
+FETCH_COLUMNS = ("id,patient_id,assessment_date,created_at,prediction,risk_level,"
+                 "referring_physician,model_version,eeg_data")
+CATEGORIES = ("prediction", "risk_level", "physician", "model_version")
+BUCKETS = ("day", "week", "month")
+CURRENT_FILE = "CURRENT"
+KEEP_SNAPSHOTS = 3
+
+_TIMESTAMP = re.compile(r"\d{4}-\d\d-\d\d[T ]\d\d:\d\d:\d\d(\.\d{1,6})?")
+
+
+def _snapshot_pid(name):
+    pid = name.rsplit("-", 1)[-1]
+    return int(pid) if pid.isdigit() else None
+
+
+def _pid_alive(pid):
+    if os.name == "nt":
+        # os.kill(pid, 0) would signal the process on Windows; assume it is alive
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _timestamp(value):
+    """ISO timestamp text without its UTC offset (every timestamp here is UTC), or "NaT"."""
+    match = _TIMESTAMP.match(str(value or ""))
+    return match.group(0).replace(" ", "T") if match else "NaT"
+
+
+def _row_key(row):
+    # Identifies a listener row among fetched ones: the DB reformats assessment_date, so normalize it
+    return row.get("patient_id"), np.datetime64(_timestamp(row.get("assessment_date")), "us")
+
+
+class _Codes:
+    """Append-only string <-> int32 code dictionary for one categorical column."""
+
+    def __init__(self, values=()):
+        self.values = list(values)
+        self.index = {v: i for i, v in enumerate(self.values)}
+
+    def encode(self, items):
+        out = np.empty(len(items), dtype=np.int32)
+        for i, item in enumerate(items):
+            item = item or "Unknown"
+            code = self.index.get(item)
+            if code is None:
+                code = self.index[item] = len(self.values)
+                self.values.append(item)
+            out[i] = code
+        return out
+
+
+class _Partition:
+    """One month of assessments as growable typed columns."""
+
+    def __init__(self, columns=None):
+        columns = columns or _empty_columns(0)
+        self.n = len(columns["dates"])
+        self._data = {k: np.array(v) for k, v in columns.items()}
+        self.dirty = True
+        self.saved_path = None
+        self._cache = {}
+
+    def append(self, columns):
+        m = len(columns["dates"])
+        if self.n + m > len(self._data["dates"]):
+            capacity = max(1024, 2 * (self.n + m))
+            for key, array in self._data.items():
+                grown = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+                grown[:self.n] = array[:self.n]
+                self._data[key] = grown
+        for key, values in columns.items():
+            self._data[key][self.n:self.n + m] = values
+        self.n += m
+        self.dirty = True
+        self._cache.clear()
+
+    def columns(self):
+        return {key: array[:self.n] for key, array in self._data.items()}
+
+    def cached(self, key, compute):
+        """``compute(columns)`` for the whole partition, memoized until the next append."""
+        if key not in self._cache:
+            self._cache[key] = compute(self.columns())
+        return self._cache[key]
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            part = cls({key: data[key] for key in data.files})
+        part.dirty = False
+        part.saved_path = path
+        return part
+
+
+def _empty_columns(n):
+    return {"dates": np.empty(n, dtype="datetime64[s]"),
+            **{key: np.empty(n, dtype=np.int32) for key in CATEGORIES},
+            "eeg": np.empty((n, len(eeg_columns)), dtype=np.float32)}
+
+
+def _bucket_index(dates, bucket):
+    """Integer period of each date: days, Monday-based weeks or months since 1970."""
+    if bucket == "month":
+        return dates.astype("datetime64[M]").astype(np.int64)
+    days = dates.astype("datetime64[D]").astype(np.int64)
+    # 1970-01-01 was a Thursday; shift so weeks start on Monday
+    return days if bucket == "day" else (days + 3) // 7
+
+
+def _bucket_label(index, bucket):
+    if bucket == "month":
+        return str(np.datetime64(int(index), "M"))
+    return str(np.datetime64(int(index) * (7 if bucket == "week" else 1) - (3 if bucket == "week" else 0), "D"))
+
+
+class AnalyticsStore:
+    """Month-partitioned columnar mirror with in-process queries (see module docstring)."""
+
+    def __init__(self, directory="analytics", sync_interval=60.0, rebuild_interval=86400.0,
+                 overlap=300.0, page_size=1000):
+        self.directory = directory or None
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self.overlap = overlap
+        self.page_size = page_size
+        self._lock = threading.RLock()
+        self._start_lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._reset()
+
+    def _reset(self):
+        self._codes = {key: _Codes() for key in CATEGORIES}
+        self._partitions = {}      # "YYYY-MM" (or "unknown") -> _Partition
+        self._pending = []         # listener rows not yet seen by a sync
+        self._pending_part = None
+        self._watermark = None     # (created_at, id) of the newest synced row
+        self._recent_ids = {}      # id -> created_at, for rows inside the overlap window
+        self.synced_at = None
+        self.rebuilt_at = None
+
+    # ---------------------------
+    # Ingest
+    # ---------------------------
+    def _columns(self, rows):
+        """Typed columns for a list of assessment rows (EEG JSON decoded in bulk)."""
+        columns = {
+            "dates": np.array([_timestamp(row.get("assessment_date"))[:19] for row in rows], dtype="datetime64[s]"),
+            "prediction": self._codes["prediction"].encode([row.get("prediction") for row in rows]),
+            "risk_level": self._codes["risk_level"].encode([row.get("risk_level") for row in rows]),
+            "physician": self._codes["physician"].encode([row.get("referring_physician") for row in rows]),
+            "model_version": self._codes["model_version"].encode([row.get("model_version") for row in rows]),
+            "eeg": np.full((len(rows), len(eeg_columns)), np.nan, dtype=np.float32),
+        }
+        matrix, index = decode_eeg_blobs([row.get("eeg_data") for row in rows])
+        columns["eeg"][index] = matrix
+        return columns
+
+    def _append(self, rows):
+        columns = self._columns(rows)
+        months = np.where(np.isnat(columns["dates"]), "unknown",
+                          columns["dates"].astype("datetime64[M]").astype(str))
+        for month in np.unique(months):
+            selected = months == month
+            part = self._partitions.get(month)
+            if part is None:
+                part = self._partitions[month] = _Partition()
+            part.append({key: values[selected] for key, values in columns.items()})
+
+    def record(self, rows):
+        """Add newly inserted assessment rows (AssessmentWriter listener)."""
+        with self._lock:
+            self._pending.extend(rows)
+            self._pending_part = None
+
+    def _pending_partition(self):
+        if self._pending_part is None:
+            self._pending_part = _Partition(self._columns(self._pending) if self._pending else None)
+        return self._pending_part
+
+    # ---------------------------
+    # Database sync
+    # ---------------------------
+    def _fetch(self, client, since, after):
+        query = client.table(TABLE).select(FETCH_COLUMNS)
+        if after is not None:
+            created, row_id = after
+            query = query.or_(f"created_at.gt.{_quote(created)},"
+                              f"and(created_at.eq.{_quote(created)},id.gt.{_quote(row_id)})")
+        elif since is not None:
+            query = query.gte("created_at", since)
+        return query.order("created_at").order("id").limit(self.page_size).execute().data or []
+
+    def sync(self, client):
+        """Fetch rows created since the last sync; returns how many were added."""
+        added, fetched_keys = self._sync(client)
+        with self._lock:
+            self._drop_pending(fetched_keys)
+        if added:
+            self.save()
+        return added
+
+    def _drop_pending(self, fetched_keys):
+        if fetched_keys and self._pending:
+            self._pending = [row for row in self._pending if _row_key(row) not in fetched_keys]
+            self._pending_part = None
+
+    def _sync(self, client):
+        since = None
+        if self._watermark is not None:
+            newest = datetime.fromisoformat(_timestamp(self._watermark[0]))
+            since = (newest - timedelta(seconds=self.overlap)).isoformat()
+
+        added, after = 0, None
+        fetched_keys = set()
+        while True:
+            rows = self._fetch(client, since, after)
+            if not rows:
+                break
+            after = (rows[-1]["created_at"], rows[-1]["id"])
+            with self._lock:
+                new = [row for row in rows if row["id"] not in self._recent_ids]
+                if new:
+                    self._append(new)
+                    added += len(new)
+                for row in rows:
+                    self._recent_ids[row["id"]] = row["created_at"]
+                    fetched_keys.add(_row_key(row))
+                if self._watermark is None or (after[0], after[1]) > tuple(self._watermark):
+                    self._watermark = after
+            if len(rows) < self.page_size:
+                break
+
+        with self._lock:
+            if self._watermark is not None:
+                # Only ids inside the overlap window can be fetched again
+                horizon = (datetime.fromisoformat(_timestamp(self._watermark[0]))
+                           - timedelta(seconds=self.overlap)).isoformat()
+                self._recent_ids = {k: v for k, v in self._recent_ids.items() if _timestamp(v) >= horizon}
+            self.synced_at = datetime.now(timezone.utc).isoformat()
+        return added, fetched_keys
+
+    def rebuild(self, client):
+        """Drop the mirror and re-read the whole table (picks up updated rows)."""
+        fresh = AnalyticsStore(None, page_size=self.page_size, overlap=self.overlap)
+        _, fetched_keys = fresh._sync(client)
+        with self._lock:
+            for key in ("_codes", "_partitions", "_watermark", "_recent_ids", "synced_at"):
+                setattr(self, key, getattr(fresh, key))
+            # Listener rows the rebuild did not see yet stay pending
+            self._pending_part = None
+            self._drop_pending(fetched_keys)
+            self.rebuilt_at = datetime.now(timezone.utc).isoformat()
+        self.save()
+
+    def start(self, client_factory):
+        """Start the background thread (snapshot load, first sync, then periodic syncs) once per process."""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._thread = threading.Thread(target=self._loop, args=(client_factory,),
+                                            name="analytics-sync", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _loop(self, client_factory):
+        try:
+            self.load()
+            self.sync(client_factory())
+        except Exception as e:
+            print(f"[Analytics] Initial sync failed: {str(e)}")
+        last_rebuild = time.monotonic()
+        while True:
+            time.sleep(self.sync_interval)
+            try:
+                if self.rebuild_interval and time.monotonic() - last_rebuild >= self.rebuild_interval:
+                    self.rebuild(client_factory())
+                    last_rebuild = time.monotonic()
+                else:
+                    self.sync(client_factory())
+            except Exception as e:
+                print(f"[Analytics] Sync failed: {str(e)}")
+
+    # ---------------------------
+    # Snapshots
+    # ---------------------------
+    def save(self):
+        """Write a snapshot directory (unchanged months hard-linked) and point CURRENT at it."""
+        if not self.directory:
+            return
+        with self._save_lock:
+            # Copy references under the lock and write outside it; appends
+            # never modify the first ``n`` rows that a snapshot covers
+            with self._lock:
+                parts = [(month, part, part.columns(), part.dirty, part.saved_path)
+                         for month, part in self._partitions.items()]
+                meta = {"codes": {key: list(codes.values) for key, codes in self._codes.items()},
+                        "watermark": self._watermark, "recent_ids": dict(self._recent_ids),
+                        "synced_at": self.synced_at, "rebuilt_at": self.rebuilt_at}
+
+            os.makedirs(self.directory, exist_ok=True)
+            name = f"{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S-%f')}-{os.getpid()}"
+            snapshot = os.path.join(self.directory, name)
+            os.makedirs(snapshot)
+            for month, part, columns, dirty, saved_path in parts:
+                path = os.path.join(snapshot, f"{month}.npz")
+                linked = False
+                if not dirty and saved_path:
+                    try:
+                        os.link(saved_path, path)
+                        linked = True
+                    except OSError:
+                        # Pruned since, or no hard links on this filesystem
+                        pass
+                if not linked:
+                    with open(path, "wb") as f:
+                        np.savez(f, **columns)
+                with self._lock:
+                    if part.n == len(columns["dates"]):
+                        part.dirty, part.saved_path = False, path
+            with open(os.path.join(snapshot, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            tmp = os.path.join(self.directory, CURRENT_FILE + f".{os.getpid()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(name)
+            os.replace(tmp, os.path.join(self.directory, CURRENT_FILE))
+            self._prune(name)
+
+    def _prune(self, current):
+        """Drop this process's older snapshots and those of exited processes, never the CURRENT one."""
+        try:
+            with open(os.path.join(self.directory, CURRENT_FILE), "r", encoding="utf-8") as f:
+                pointed = f.read().strip()
+        except OSError:
+            pointed = None
+        mine, orphaned = [], []
+        for name in sorted(os.listdir(self.directory)):
+            pid = _snapshot_pid(name)
+            if pid is None or not os.path.isdir(os.path.join(self.directory, name)):
+                continue
+            if pid == os.getpid():
+                mine.append(name)
+            elif not _pid_alive(pid):
+                orphaned.append(name)
+        for old in mine[:-KEEP_SNAPSHOTS] + orphaned:
+            if old not in (current, pointed):
+                shutil.rmtree(os.path.join(self.directory, old), ignore_errors=True)
+
+    def load(self):
+        """Replace the in-memory mirror with the CURRENT snapshot, if there is one."""
+        if not self.directory:
+            return False
+        try:
+            with open(os.path.join(self.directory, CURRENT_FILE), "r", encoding="utf-8") as f:
+                snapshot = os.path.join(self.directory, f.read().strip())
+            with open(os.path.join(snapshot, "meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            partitions = {name[:-4]: _Partition.load(os.path.join(snapshot, name))
+                          for name in os.listdir(snapshot) if name.endswith(".npz")}
+        except (OSError, ValueError) as e:
+            print(f"[Analytics] No usable snapshot in {self.directory}: {str(e)}")
+            return False
+        with self._lock:
+            self._codes = {key: _Codes(meta["codes"].get(key, [])) for key in CATEGORIES}
+            self._partitions = partitions
+            self._watermark = meta["watermark"]
+            self._recent_ids = meta["recent_ids"]
+            self.synced_at = meta["synced_at"]
+            self.rebuilt_at = meta.get("rebuilt_at")
+        print(f"[Analytics] Loaded {self.total_rows} rows in {len(partitions)} partitions from {snapshot}")
+        return True
+
+    # ---------------------------
+    # Queries
+    # ---------------------------
+    @property
+    def total_rows(self):
+        return sum(part.n for part in self._partitions.values()) + len(self._pending)
+
+    def _scan(self, start, end, key, compute, combine):
+        """combine([compute(columns) per partition]) over rows with start <= day <= end.
+
+        Partitions wholly inside the range use their cached result; the two
+        boundary months (and listener rows) are filtered first.
+        """
+        lo = np.datetime64(start, "s") if start else None
+        hi = np.datetime64(end, "D") + np.timedelta64(1, "D") if end else None
+        first, last = (start or "")[:7], (end or "9999-12")[:7]
+        results = []
+        with self._lock:
+            parts = list(self._partitions.items()) + [("pending", self._pending_partition())]
+            for month, part in parts:
+                if not part.n:
+                    continue
+                inner = month not in ("pending", "unknown") and first < month < last
+                if month not in ("pending", "unknown") and (month < first or month > last):
+                    continue
+                if inner or (lo is None and hi is None and month != "pending"):
+                    results.append(part.cached(key, compute))
+                    continue
+                columns = part.columns()
+                mask = np.ones(part.n, dtype=bool)
+                if lo is not None:
+                    mask &= columns["dates"] >= lo
+                if hi is not None:
+                    mask &= columns["dates"] < hi
+                if mask.any():
+                    results.append(compute({k: v[mask] for k, v in columns.items()}))
+            return combine(results)
+
+    def channel_means(self, start=None, end=None, by="prediction"):
+        """Per-channel EEG means (and row counts) for each value of ``by``."""
+        if by not in CATEGORIES:
+            raise ValueError(f"'by' must be one of {list(CATEGORIES)}")
+
+        def compute(columns):
+            codes, eeg = columns[by], columns["eeg"]
+            present = ~np.isnan(eeg[:, 0])
+            out = {}
+            for code in np.unique(codes[present]):
+                rows = eeg[present & (codes == code)]
+                out[int(code)] = (len(rows), rows.sum(axis=0, dtype=np.float64))
+            return out
+
+        def combine(results):
+            totals = {}
+            for result in results:
+                for code, (n, sums) in result.items():
+                    count, acc = totals.get(code, (0, 0.0))
+                    totals[code] = (count + n, acc + sums)
+            names = self._codes[by].values
+            return {names[code]: {"count": n, "means": dict(zip(eeg_columns, np.round(sums / n, 4).tolist()))}
+                    for code, (n, sums) in sorted(totals.items())}
+
+        return self._scan(start, end, ("channel_means", by), compute, combine)
+
+    def risk_levels(self, start=None, end=None, bucket="month"):
+        """Risk-level counts per day, week (starting Monday) or month."""
+        if bucket not in BUCKETS:
+            raise ValueError(f"'bucket' must be one of {list(BUCKETS)}")
+
+        def compute(columns):
+            valid = ~np.isnat(columns["dates"])
+            risk = columns["risk_level"][valid].astype(np.int64)
+            width = int(risk.max()) + 1 if len(risk) else 1
+            keys, counts = np.unique(_bucket_index(columns["dates"][valid], bucket) * width + risk,
+                                     return_counts=True)
+            return list(zip(zip((keys // width).tolist(), (keys % width).tolist()), counts.tolist()))
+
+        def combine(results):
+            names = self._codes["risk_level"].values
+            periods = {}
+            for result in results:
+                for (period, code), n in result:
+                    b = periods.setdefault(period, {"period": _bucket_label(period, bucket), "total": 0,
+                                                    "risk_levels": {}})
+                    b["total"] += n
+                    b["risk_levels"][names[code]] = b["risk_levels"].get(names[code], 0) + n
+            return [periods[p] for p in sorted(periods)]
+
+        return self._scan(start, end, ("risk_levels", bucket), compute, combine)
+
+    def physician_counts(self, start=None, end=None, top=None):
+        """Assessments per referring physician, most first."""
+        def compute(columns):
+            return np.bincount(columns["physician"], minlength=len(self._codes["physician"].values))
+
+        def combine(results):
+            names = self._codes["physician"].values
+            totals = np.zeros(len(names), dtype=np.int64)
+            for counts in results:
+                totals[:len(counts)] += counts
+            order = np.argsort(-totals, kind="stable")
+            order = order[totals[order] > 0][:top]
+            return [{"referring_physician": names[i], "count": int(totals[i])} for i in order]
+
+        return self._scan(start, end, ("physicians",), compute, combine)
+
+    def status(self):
+        with self._lock:
+            return {"rows": self.total_rows, "pending_rows": len(self._pending),
+                    "partitions": sorted(self._partitions), "synced_at": self.synced_at,
+                    "rebuilt_at": self.rebuilt_at,
+                    "watermark": self._watermark[0] if self._watermark else None}
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build or refresh the local analytics mirror")
+    parser.add_argument("command", choices=["sync", "rebuild", "status"])
+    parser.add_argument("--dir", default=os.environ.get("ANALYTICS_DIR", "analytics"))
+    args = parser.parse_args(argv)
+
+    from supabase_config import get_supabase
+
+    store = AnalyticsStore(args.dir)
+    store.load()
+    t0 = time.perf_counter()
+    if args.command == "sync":
+        print(f"[Analytics] Added {store.sync(get_supabase())} rows in {time.perf_counter() - t0:.1f}s")
+    elif args.command == "rebuild":
+        store.rebuild(get_supabase())
+        print(f"[Analytics] Rebuilt {store.total_rows} rows in {time.perf_counter() - t0:.1f}s")
+    print(json.dumps(store.status(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
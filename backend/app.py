@@ -1,159 +1,1017 @@
-from flask import Flask, request, jsonify
+"""
+EEG-based ADHD prediction API.
+
+Use the application factory so models and the Supabase client are created
+lazily in each worker process rather than at import time:
+
+    gunicorn "app:create_app()"          # pre-fork production server
+    flask --app app run                  # development
+    python app.py                        # development (debug)
+"""
+
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+from flask import Blueprint, Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-import pandas as pd
-import joblib
+import numpy as np
 import warnings
 import json
+import os
+import atexit
+import threading
 from datetime import datetime
-from supabase_config import supabase
+from supabase_config import get_supabase
+from assessment_writer import AssessmentWriter
+from assessment_queries import parse_list_params, fetch_assessment_page
+from assessment_stats import AssessmentStats
+from analytics_store import AnalyticsStore, BUCKETS, CATEGORIES
+from similarity import SimilarityIndex, SOURCES
+from response_cache import ResponseCache, cached
+from features import eeg_columns, extractor, MissingChannelsError
+from model_registry import ModelRegistry, ModelValidationError
+from eeg_stream import iter_upload_chunks
+from session_scorer import parse_session_params, score_session
+from metrics import MetricsRegistry, SampledProfiler
+from prediction_memo import PredictionMemo
+from microbatch import MicroBatcher
+from binary_payload import decode_body, is_binary_content_type, UnsupportedPayloadError
+from fusion import FusionPredictor, FusionUnavailable
+from scoring import get_risk_level
+
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
 
 # Suppress scikit-learn version warnings
 warnings.filterwarnings('ignore', category=UserWarning)
 
-app = Flask(__name__)
-CORS(app)  # <--- Enable CORS for all routes
-
-# Load model and scaler
-model = joblib.load("models/eeg_only_model.pkl")
-scaler = joblib.load("models/eeg_scaler.pkl")
-
-eeg_columns = ['Fp1','Fp2','F3','F4','C3','C4','P3','P4','O1','O2',
-               'F7','F8','T7','T8','P7','P8','Fz','Cz','Pz']
-
-
-def get_risk_level(prediction):
-    """Determine risk level based on prediction."""
-    if prediction == 'ADHD':
-        return 'high'
-    elif prediction in ['ODD', 'ASD', 'Dyslexia']:
-        return 'moderate'
-    return 'low'
-
-
-def store_assessment_in_supabase(data, prediction):
-    """Store the complete assessment data in Supabase database."""
-    try:
-        user_info = data.get("user_info", {})
-        medical_history = data.get("medical_history", {})
-        questions = data.get("questions", [])
-        eeg_data = data.get("eeg", {})
-        risk_level = get_risk_level(prediction)
-
-        record = {
-            "patient_id": user_info.get("patientId", "UNKNOWN"),
-            "age": user_info.get("age", ""),
-            "gender": user_info.get("gender", ""),
-            "education": user_info.get("education", ""),
-            "occupation": user_info.get("occupation", ""),
-            "referring_physician": user_info.get("referringPhysician", ""),
-            "medical_history": json.dumps(medical_history) if isinstance(medical_history, dict) else medical_history,
-            "questionnaire_responses": json.dumps(questions) if isinstance(questions, list) else questions,
-            "eeg_data": json.dumps(eeg_data) if isinstance(eeg_data, dict) else eeg_data,
-            "prediction": prediction,
-            "risk_level": risk_level,
-            "assessment_date": datetime.utcnow().isoformat(),
-        }
+api = Blueprint("api", __name__)
+
+# Scaler + compiled forest, loaded on first use in each process. Prefers the
+# memory-mapped .forest artifact and falls back to compiling the pickle. New
+# versions published under MODEL_VERSIONS_DIR are validated and hot-swapped.
+registry = ModelRegistry(
+    forest_path=os.environ.get("EEG_FOREST_ARTIFACT", "models/eeg_only_model.forest"),
+    model_path="models/eeg_only_model.pkl",
+    scaler_path="models/eeg_scaler.pkl",
+    versions_dir=os.environ.get("MODEL_VERSIONS_DIR", "models/versions"),
+    poll_interval=float(os.environ.get("MODEL_POLL_SECONDS", "10")),
+)
+
+# EEG + questionnaire late fusion for /predict/fusion. Both models are scored
+# inline; a modality reached after FUSION_BUDGET_MS has been spent is dropped.
+def _observe_fusion(modality, seconds, outcome):
+    if outcome == "ok":
+        FUSION_MODALITY_SECONDS.labels(modality).observe(seconds)
+    else:
+        FUSION_DROPPED.labels(modality, outcome).inc()
+
+
+fusion = FusionPredictor(
+    eeg_source=lambda: registry.get(),
+    questionnaire_path=os.environ.get("QUESTIONNAIRE_MODEL", "questionnaire_model.pkl"),
+    calibration_path=os.environ.get("FUSION_CALIBRATION", "models/fusion_calibration.json"),
+    budget=float(os.environ.get("FUSION_BUDGET_MS", "50")) / 1000,
+    observer=_observe_fusion,
+    prior=float(os.environ.get("FUSION_PRIOR", "0.5")),
+)
+
+# Upper bound on rows accepted by /predict/batch in a single call
+BATCH_MAX_ROWS = 10000
+
+# Grouped assessment counters kept current by the insert path
+stats = AssessmentStats(reconcile_interval=float(os.environ.get("STATS_RECONCILE_SECONDS", "300")))
+
+# Month-partitioned columnar mirror of patient_assessments behind /analytics/*,
+# fed by the insert path and synced from the database in the background.
+# ANALYTICS_DIR="" keeps it in memory only.
+analytics = AnalyticsStore(
+    directory=os.environ.get("ANALYTICS_DIR", "analytics"),
+    sync_interval=float(os.environ.get("ANALYTICS_SYNC_SECONDS", "60")),
+    rebuild_interval=float(os.environ.get("ANALYTICS_REBUILD_SECONDS", "86400")),
+)
+
+# Exact nearest-neighbour search over scaled EEG vectors (dataset.csv plus
+# stored assessments) for /assessments/similar; SIMILARITY_DATASET="" leaves
+# out the training recordings.
+similarity = SimilarityIndex(
+    model_source=lambda: registry.get(),
+    dataset_path=os.environ.get("SIMILARITY_DATASET", "dataset.csv"),
+)
+SIMILAR_MAX_K = 100
+
+# Read-endpoint response cache, invalidated by inserts from this process
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get("RESPONSE_CACHE_ENTRIES", "256")),
+    max_bytes=int(os.environ.get("RESPONSE_CACHE_BYTES", str(8 * 1024 * 1024))),
+    ttl=float(os.environ.get("RESPONSE_CACHE_TTL", "30")),
+)
+
+# LRU of /predict results keyed on the scaled vector and the model that scored it.
+# PREDICTION_MEMO_ENTRIES=0 disables it; PREDICTION_MEMO_DECIMALS rounds the
+# scaled values before hashing so near-identical vectors share an entry.
+prediction_memo = PredictionMemo(
+    max_entries=int(os.environ.get("PREDICTION_MEMO_ENTRIES", "4096")),
+    decimals=int(os.environ["PREDICTION_MEMO_DECIMALS"]) if os.environ.get("PREDICTION_MEMO_DECIMALS") else None,
+)
+
+# Per-process Prometheus metrics (METRICS_ENABLED=0 turns them into no-ops) and
+# an optional cProfile dump of one request in every PROFILE_EVERY_N
+metrics = MetricsRegistry(enabled=os.environ.get("METRICS_ENABLED", "1") != "0")
+REQUEST_SECONDS = metrics.histogram("http_request_duration_seconds", "Request latency by endpoint", ("endpoint",))
+REQUESTS = metrics.counter("http_requests_total", "Requests by endpoint and status code", ("endpoint", "status"))
+IN_FLIGHT = metrics.gauge("http_requests_in_flight", "Requests currently being handled", ("endpoint",))
+PREDICT_STAGE_SECONDS = metrics.histogram("predict_stage_seconds", "Time spent in each /predict stage", ("stage",))
+DB_INSERT_SECONDS = metrics.histogram("db_insert_seconds", "Batched assessment insert latency", ("outcome",))
+DB_INSERT_ROWS = metrics.counter("db_insert_rows_total", "Assessment rows per insert outcome", ("outcome",))
+MICROBATCH_SIZE = metrics.histogram("predict_microbatch_size", "Rows per micro-batched forest call",
+                                    buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+MICROBATCH_QUEUE_SECONDS = metrics.histogram("predict_microbatch_queue_seconds",
+                                             "Delay between a /predict row being queued and its batch starting")
+FUSION_MODALITY_SECONDS = metrics.histogram("fusion_modality_seconds",
+                                            "Per-modality model time in /predict/fusion", ("modality",))
+FUSION_DROPPED = metrics.counter("fusion_modality_dropped_total",
+                                 "Modalities left out of a fused prediction", ("modality", "reason"))
+profiler = SampledProfiler(every=int(os.environ.get("PROFILE_EVERY_N", "0")),
+                           directory=os.environ.get("PROFILE_DIR", "profiles"))
+
+_startup = {"imports": IMPORT_SECONDS}
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """Return this process's background AssessmentWriter, starting it on first use.
+
+    Assessments are persisted in the background so /predict never waits on
+    Supabase. Starting the writer also replays any journaled records.
+    """
+    global _writer, _writer_pid
+    if _writer is None or _writer_pid != os.getpid():
+        with _writer_lock:
+            if _writer is None or _writer_pid != os.getpid():
+                t0 = time.perf_counter()
+                writer = AssessmentWriter(
+                    get_supabase(),
+                    journal_path=os.environ.get("ASSESSMENT_JOURNAL", "assessment_journal.jsonl"),
+                    max_queue=int(os.environ.get("ASSESSMENT_QUEUE_SIZE", "1000")),
+                    batch_size=int(os.environ.get("ASSESSMENT_BATCH_SIZE", "50")),
+                    observer=_observe_insert,
+                )
+                writer.add_listener(stats.record)
+                writer.add_listener(analytics.record)
+                writer.add_listener(similarity.record)
+                writer.add_listener(response_cache.invalidate_for_rows)
+                writer.start()
+                atexit.register(writer.stop)
+                _writer, _writer_pid = writer, os.getpid()
+                _startup["db_client"] = time.perf_counter() - t0
+    return _writer
+
+
+def _observe_insert(seconds, rows, ok):
+    outcome = "ok" if ok else "error"
+    DB_INSERT_SECONDS.labels(outcome).observe(seconds)
+    DB_INSERT_ROWS.labels(outcome).inc(rows)
 
-        response = supabase.table("patient_assessments").insert(record).execute()
-        print(f"[Supabase] Assessment stored successfully for patient: {record['patient_id']}")
-        return response.data
+
+def _collect_runtime_metrics():
+    """Scrape-time values owned by the writer, cache and registry."""
+    samples = [("model_loaded", "gauge", "1 if this worker has loaded the model", int(registry.loaded))]
+    if _writer is not None:
+        samples.append(("assessment_writer_queue_depth", "gauge",
+                        "Records waiting in the write-behind queue", _writer.queue_depth))
+        for key, value in sorted(_writer.stats.items()):
+            samples.append((f"assessment_writer_{key}_total", "counter",
+                            f"Assessment records {key.replace('_', ' ')}", value))
+    for key, value in sorted(predict_batcher.stats.items()):
+        kind = "gauge" if key == "max_batch_seen" else "counter"
+        samples.append((f"predict_microbatch_{key}" + ("_total" if kind == "counter" else ""), kind,
+                        f"Micro-batcher {key.replace('_', ' ')}", value))
+    memo = prediction_memo.stats()
+    cache = response_cache.stats()
+    samples.extend([
+        ("prediction_memo_hits_total", "counter", "Predictions served from the memo", memo["hits"]),
+        ("prediction_memo_misses_total", "counter", "Predictions that ran the forest", memo["misses"]),
+        ("prediction_memo_invalidations_total", "counter", "Serving-model changes seen by the memo",
+         memo["invalidations"]),
+        ("prediction_memo_entries", "gauge", "Memoized predictions", memo["entries"]),
+        ("response_cache_hits_total", "counter", "Read-endpoint cache hits", cache["hits"]),
+        ("response_cache_misses_total", "counter", "Read-endpoint cache misses", cache["misses"]),
+        ("response_cache_entries", "gauge", "Cached responses", cache["entries"]),
+        ("response_cache_bytes", "gauge", "Bytes of cached response bodies", cache["bytes"]),
+    ])
+    return samples
+
+
+metrics.add_collector(_collect_runtime_metrics)
+
+
+def startup_report():
+    """Seconds spent on imports, artifact loads, DB client setup and warm-up in this process."""
+    return {
+        "pid": os.getpid(),
+        "imports_seconds": round(_startup["imports"], 4),
+        "artifact_load_seconds": {k: round(v, 4) for k, v in registry.load_seconds.items()},
+        "db_client_seconds": round(_startup["db_client"], 4) if "db_client" in _startup else None,
+        "warm_up_seconds": round(_startup["warm_up"], 4) if "warm_up" in _startup else None,
+    }
+
+
+def create_app(warm_up=None):
+    """Build the Flask app.
+
+    With ``warm_up`` (default: the WARM_UP env var, on unless set to "0") the
+    model is loaded and one dummy prediction is run before the app is returned,
+    the background writer is started, and the analytics mirror and similarity
+    index begin loading, so the first request pays no initialization cost.
+    """
+    app = Flask(__name__)
+    CORS(app)  # <--- Enable CORS for all routes
+    app.register_blueprint(api)
+
+    if warm_up is None:
+        warm_up = os.environ.get("WARM_UP", "1") != "0"
+    if warm_up:
+        _startup["warm_up"] = registry.warm_up()
+        try:
+            fusion.warm_up()
+        except Exception as e:
+            # Only /predict/fusion depends on the questionnaire model; keep serving the rest
+            fusion.disabled = str(e)
+            print(f"[Startup] Fusion warm-up failed, /predict/fusion disabled: {str(e)}")
+        get_writer()
+        # Loads the analytics snapshot and syncs on its own thread
+        analytics.start(get_supabase)
+        # Builds the /assessments/similar index on its own thread
+        similarity.start(get_supabase)
+        print(f"[Startup] {startup_report()}")
+    return app
+
+
+def build_assessment_record(data, prediction, model_version=None):
+    """Build the patient_assessments row for one /predict request."""
+    user_info = data.get("user_info", {})
+    medical_history = data.get("medical_history", {})
+    questions = data.get("questions", [])
+    eeg_data = data.get("eeg", {})
+    risk_level = get_risk_level(prediction)
+
+    return {
+        "patient_id": user_info.get("patientId", "UNKNOWN"),
+        "age": user_info.get("age", ""),
+        "gender": user_info.get("gender", ""),
+        "education": user_info.get("education", ""),
+        "occupation": user_info.get("occupation", ""),
+        "referring_physician": user_info.get("referringPhysician", ""),
+        "medical_history": json.dumps(medical_history) if isinstance(medical_history, dict) else medical_history,
+        "questionnaire_responses": json.dumps(questions) if isinstance(questions, list) else questions,
+        "eeg_data": json.dumps(eeg_data) if isinstance(eeg_data, dict) else eeg_data,
+        "prediction": prediction,
+        "risk_level": risk_level,
+        "model_version": model_version,
+        "assessment_date": datetime.utcnow().isoformat(),
+    }
+
+
+def store_assessment_in_supabase(data, prediction, model_version=None):
+    """Hand the complete assessment to the background writer.
+
+    Returns ``"queued"`` or ``"journaled"``, or None if the record could not
+    be built or persisted at all.
+    """
+    try:
+        return get_writer().submit(build_assessment_record(data, prediction, model_version))
     except Exception as e:
         print(f"[Supabase] Error storing assessment: {str(e)}")
         return None
 
 
-@app.route("/predict", methods=["POST"])
+def _predict_scaled_rows(model, scaled):
+    """Prediction, risk level and confidence scores for each scaled row.
+
+    Rows the same model scored before are served from the prediction memo;
+    the rest go through the forest in one call. The returned dicts are shared
+    with the memo; copy them before modifying.
+    """
+    results = [None] * len(scaled)
+    keys = [None] * len(scaled)
+    if prediction_memo.enabled:
+        for i in range(len(scaled)):
+            keys[i] = prediction_memo.key(model, scaled[i:i + 1])
+            results[i] = prediction_memo.get(keys[i])
+    missing = [i for i, result in enumerate(results) if result is None]
+    if not missing:
+        return results
+
+    # Labels and confidence scores (probability for each class) in one pass
+    labels, probabilities = model.forest.predict(scaled[missing])
+    for row, i in enumerate(missing):
+        pred = str(labels[row])
+        confidence_scores = _confidence_scores(model.classes, probabilities[row])
+        results[i] = {
+            "prediction": pred,
+            "risk_level": get_risk_level(pred),
+            "confidence": confidence_scores.get(pred, 0),
+            "confidence_scores": confidence_scores,
+        }
+        if keys[i] is not None:
+            prediction_memo.put(keys[i], results[i])
+    return results
+
+
+def _predict_scaled_row(model, scaled):
+    """Prediction dict for a single scaled (1, n) row; see _predict_scaled_rows."""
+    return _predict_scaled_rows(model, scaled)[0]
+
+
+def _score_rows(model, rows):
+    """Scale raw EEG rows and score them with one forest call (the micro-batch step)."""
+    return _predict_scaled_rows(model, model.scaler.transform(np.vstack(rows)))
+
+
+def _observe_batch(size, queue_delays):
+    MICROBATCH_SIZE.labels().observe(size)
+    for delay in queue_delays:
+        MICROBATCH_QUEUE_SECONDS.labels().observe(delay)
+
+
+# Coalesces concurrent /predict rows into one scale + forest call: up to
+# MICROBATCH_MAX_BATCH rows, holding a batch open at most MICROBATCH_MAX_WAIT_MS
+# under concurrent load. MICROBATCH_MAX_BATCH=1 scores every request inline.
+predict_batcher = MicroBatcher(
+    _score_rows,
+    max_batch=int(os.environ.get("MICROBATCH_MAX_BATCH", "32")),
+    max_wait=float(os.environ.get("MICROBATCH_MAX_WAIT_MS", "2")) / 1000,
+    observer=_observe_batch,
+)
+
+
+# ---------------------------
+# Request instrumentation
+# ---------------------------
+@api.before_request
+def _start_request_metrics():
+    if not metrics.enabled and not profiler.every:
+        return
+    g.metrics_endpoint = request.endpoint or "unknown"
+    g.metrics_started = time.perf_counter()
+    IN_FLIGHT.labels(g.metrics_endpoint).inc()
+    g.profile = profiler.start()
+
+
+@api.after_request
+def _count_request(response):
+    if "metrics_endpoint" in g:
+        REQUESTS.labels(g.metrics_endpoint, str(response.status_code)).inc()
+    return response
+
+
+@api.teardown_request
+def _finish_request_metrics(exc):
+    # Runs after a streamed body has been fully sent, so streams are timed end to end
+    if "metrics_endpoint" not in g:
+        return
+    IN_FLIGHT.labels(g.metrics_endpoint).dec()
+    REQUEST_SECONDS.labels(g.metrics_endpoint).observe(time.perf_counter() - g.metrics_started)
+    if g.profile is not None:
+        profiler.stop(g.profile, g.metrics_endpoint.replace(".", "_"))
+
+
+@api.route("/predict", methods=["POST"])
 def predict():
-    data = request.get_json()
+    """Score one EEG record sent as JSON or as a binary payload (see binary_payload.py)."""
+    eeg_values = None
+    with PREDICT_STAGE_SECONDS.labels("parse").time():
+        if is_binary_content_type(request.content_type):
+            try:
+                data, eeg_values = decode_binary_prediction(request.content_type, request.get_data())
+            except UnsupportedPayloadError as e:
+                return jsonify({"error": str(e)}), 415
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        else:
+            data = request.get_json()
+    body, status = score_prediction_request(data, eeg_values)
+    return jsonify(body), status
+
+
+def decode_binary_prediction(content_type, body):
+    """Decode a binary /predict body into ``(data, eeg_values)`` for score_prediction_request.
+
+    The payload's meta object supplies user_info / medical_history /
+    questions. Raises ValueError (UnsupportedPayloadError for unknown formats).
+    """
+    payload = decode_body(content_type, body)
+    eeg_values = payload.model_rows()
+    if eeg_values.shape[0] != 1:
+        raise ValueError(f"/predict takes one EEG row, got {eeg_values.shape[0]}; use /predict/batch")
+    if not np.isfinite(eeg_values).all():
+        raise ValueError("EEG values must be finite")
+    # The stored assessment keeps EEG as a JSON object, as for JSON requests
+    data = {**payload.meta, "eeg": dict(zip(eeg_columns, eeg_values[0].tolist()))}
+    return data, eeg_values
+
+
+def score_prediction_request(data, eeg_values=None):
+    """Score one /predict body and queue its assessment; returns (body, status).
+
+    ``eeg_values`` is the already-decoded (1, n) row for binary bodies.
+    Shared by the Flask routes and the ASGI front end (asgi.py).
+    """
+    try:
+        eeg_values, error = prepare_prediction(data, eeg_values)
+        if error is not None:
+            return error
+
+        model = registry.get()
+
+        if predict_batcher.enabled:
+            # Queueing, scaling and inference happen in the shared batch
+            with PREDICT_STAGE_SECONDS.labels("batch").time():
+                result = predict_batcher(model, eeg_values[0])
+        else:
+            with PREDICT_STAGE_SECONDS.labels("scale").time():
+                scaled = model.scaler.transform(eeg_values)
+            with PREDICT_STAGE_SECONDS.labels("inference").time():
+                result = _predict_scaled_row(model, scaled)
+
+        return finish_prediction(data, model, result)
+
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+
+def prepare_prediction(data, eeg_values=None):
+    """Validate a /predict body and extract its EEG row (unless already decoded).
+
+    Returns ``(eeg_values, None)`` or ``(None, (error_body, status))``.
+    """
     if not data or "eeg" not in data:
-        return jsonify({"error": "No EEG data provided"}), 400
+        return None, ({"error": "No EEG data provided"}, 400)
+    if eeg_values is not None:
+        return eeg_values, None
+    try:
+        # Pack channels straight into a float64 row in model order
+        with PREDICT_STAGE_SECONDS.labels("extract").time():
+            return extractor.extract(data["eeg"]), None
+    except ValueError as e:
+        # MissingChannelsError / InvalidEEGError
+        return None, ({"error": str(e)}, 400)
+
+
+def finish_prediction(data, model, result):
+    """Queue the assessment for a scored /predict body and build the response."""
+    # Queue complete assessment for Supabase; the insert happens off the request path
+    with PREDICT_STAGE_SECONDS.labels("persist").time():
+        persistence = store_assessment_in_supabase(data, result["prediction"], model.version)
+
+    return {
+        **result,
+        "model_version": model.version,
+        "saved_to_database": persistence is not None,
+        "persistence": persistence
+    }, 200
+
+
+@api.route("/predict/fusion", methods=["POST"])
+def predict_fusion():
+    """Fuse the EEG model with the 30-answer questionnaire model (see fusion.py)."""
+    body, status = score_fusion_request(request.get_json(silent=True))
+    return jsonify(body), status
+
 
-    eeg_data = data["eeg"]
+def score_fusion_request(data):
+    """Score a /predict/fusion body and queue its assessment; returns (body, status).
+
+    Takes the /predict body; ``questions`` are the 30 questionnaire answers.
+    Either modality may be absent or invalid as long as the other is usable.
+    """
+    if fusion.disabled:
+        return {"error": f"Fusion is unavailable: {fusion.disabled}"}, 503
+    if not isinstance(data, dict):
+        return {"error": "Expected a JSON object"}, 400
     try:
-        df = pd.DataFrame([eeg_data])
-        missing = [col for col in eeg_columns if col not in df.columns]
+        eeg_row, invalid = None, {}
+        if data.get("eeg"):
+            try:
+                eeg_row = extractor.extract_row(data["eeg"])
+            except (MissingChannelsError, TypeError, ValueError) as e:
+                invalid["eeg"] = str(e)
+        try:
+            result = fusion.predict(eeg_row, data.get("questions"), invalid)
+        except FusionUnavailable as e:
+            return {"error": str(e), "dropped": e.reasons}, 400 if e.invalid_only else 503
+
+        version = f"fusion:{result['model_version'] or 'questionnaire'}"
+        persistence = store_assessment_in_supabase(data, result["prediction"], version)
+        return {
+            **result,
+            "risk_level": get_risk_level(result["prediction"]),
+            "model_version": version,
+            "saved_to_database": persistence is not None,
+            "persistence": persistence,
+        }, 200
+
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+
+def _batch_rows_from_payload(data):
+    """Turn a /predict/batch body into a list of (values, error) pairs in input order.
+
+    Accepts either ``{"records": [...]}`` where each record is an EEG dict (or an
+    object with an ``eeg`` key), or a columnar ``{"columns": [...], "rows": [[...]]}``
+    matrix. ``columns`` defaults to the standard 19-channel order. Non-numeric
+    and non-finite values give that row an error instead of a prediction.
+    """
+    if "records" in data:
+        records = data["records"]
+        if not isinstance(records, list):
+            raise ValueError("'records' must be a list")
+        parsed = []
+        for record in records:
+            if isinstance(record, dict) and isinstance(record.get("eeg"), dict):
+                record = record["eeg"]
+            if not isinstance(record, dict):
+                parsed.append((None, "Record must be an object of EEG channel values"))
+                continue
+            try:
+                parsed.append((extractor.extract_row(record), None))
+            except (TypeError, ValueError) as e:
+                parsed.append((None, str(e)))
+        return parsed
+
+    if "rows" in data:
+        columns = data.get("columns", eeg_columns)
+        rows = data["rows"]
+        if not isinstance(columns, list) or not isinstance(rows, list):
+            raise ValueError("'columns' and 'rows' must be lists")
+        missing = [col for col in eeg_columns if col not in columns]
         if missing:
-            return jsonify({"error": f"Missing EEG columns: {missing}"}), 400
+            raise ValueError(f"Missing EEG columns: {missing}")
+        positions = [columns.index(col) for col in eeg_columns]
+        parsed = []
+        for row in rows:
+            if not isinstance(row, list) or len(row) != len(columns):
+                parsed.append((None, f"Row must be a list of {len(columns)} values"))
+                continue
+            try:
+                values = [float(row[i]) for i in positions]
+            except (TypeError, ValueError) as e:
+                parsed.append((None, str(e)))
+                continue
+            if not np.isfinite(values).all():
+                parsed.append((None, "EEG values must be finite"))
+                continue
+            parsed.append((values, None))
+        return parsed
+
+    raise ValueError("Provide either 'records' or 'columns'/'rows'")
+
+
+@api.route("/predict/batch", methods=["POST"])
+def predict_batch():
+    """Score many EEG rows with a single scaler and compiled-forest pass.
 
-        # Extract EEG values as numpy array (avoids feature name warnings)
-        import numpy as np
-        eeg_values = df[eeg_columns].values.astype(np.float64)
-        eeg_scaled = scaler.transform(eeg_values)
-        pred = model.predict(eeg_scaled)[0]
+    Results are returned in input order; rows that fail validation carry an
+    ``error`` entry instead of failing the whole batch. Batch results are not
+    stored in Supabase. Accepts JSON or a binary payload (see binary_payload.py).
+    """
+    if is_binary_content_type(request.content_type):
+        body, status = score_binary_batch(request.content_type, request.get_data())
+    else:
+        body, status = score_batch_request(request.get_json(silent=True))
+    return jsonify(body), status
 
-        # Get confidence scores (probability for each class)
-        probabilities = model.predict_proba(eeg_scaled)[0]
-        class_labels = model.classes_.tolist()
-        confidence_scores = {label: round(float(prob) * 100, 2) for label, prob in zip(class_labels, probabilities)}
-        confidence = confidence_scores.get(pred, 0)
 
-        # Store complete assessment in Supabase
-        db_result = store_assessment_in_supabase(data, pred)
-        saved = db_result is not None
+def score_batch_request(data):
+    """Score one /predict/batch body; returns (body, status)."""
+    if not isinstance(data, dict):
+        return {"error": "No batch data provided"}, 400
 
+    # Check the size before parsing, so an oversized batch is not converted row by row
+    items = data.get("records", data.get("rows"))
+    if isinstance(items, list) and len(items) > BATCH_MAX_ROWS:
+        return {"error": f"Batch too large: {len(items)} rows (max {BATCH_MAX_ROWS})"}, 413
+    try:
+        parsed = _batch_rows_from_payload(data)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    valid_index = [i for i, (values, _) in enumerate(parsed) if values is not None]
+    results = [{"index": i, "error": err} for i, (_, err) in enumerate(parsed)]
+    eeg_values = np.array([parsed[i][0] for i in valid_index], dtype=np.float64)
+    return _score_batch_rows(results, valid_index, eeg_values)
+
+
+def score_binary_batch(content_type, body):
+    """Score a binary /predict/batch body (x-eeg-binary or Arrow); returns (body, status)."""
+    try:
+        values = decode_body(content_type, body).model_rows()
+    except UnsupportedPayloadError as e:
+        return {"error": str(e)}, 415
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    if len(values) > BATCH_MAX_ROWS:
+        return {"error": f"Batch too large: {len(values)} rows (max {BATCH_MAX_ROWS})"}, 413
+
+    finite = np.isfinite(values).all(axis=1)
+    if finite.all():
+        return _score_batch_rows([None] * len(values), range(len(values)), values)
+    results = [None if ok else {"index": i, "error": "EEG values must be finite"}
+               for i, ok in enumerate(finite.tolist())]
+    return _score_batch_rows(results, np.flatnonzero(finite).tolist(), values[finite])
+
+
+def _score_batch_rows(results, valid_index, eeg_values):
+    """Fill ``results`` at ``valid_index`` with predictions for the matching ``eeg_values`` rows."""
+    try:
+        if len(valid_index):
+            model = registry.get()
+            labels, probabilities = model.predict(eeg_values)
+            class_labels = model.classes
+
+            for row, i in enumerate(valid_index):
+                pred = str(labels[row])
+                confidence_scores = {label: round(float(prob) * 100, 2)
+                                     for label, prob in zip(class_labels, probabilities[row])}
+                results[i] = {
+                    "index": i,
+                    "prediction": pred,
+                    "risk_level": get_risk_level(pred),
+                    "confidence": confidence_scores.get(pred, 0),
+                    "confidence_scores": confidence_scores,
+                }
+
+        return {
+            "results": results,
+            "count": len(results),
+            "scored": len(valid_index),
+            "failed": len(results) - len(valid_index),
+            "model_version": model.version if len(valid_index) else None
+        }, 200
+
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+
+def _confidence_scores(class_labels, probabilities):
+    return {label: round(float(prob) * 100, 2) for label, prob in zip(class_labels, probabilities)}
+
+
+@api.route("/predict/stream", methods=["POST"])
+def predict_stream():
+    """Score a CSV or NDJSON recording as it is uploaded, streaming NDJSON results back.
+
+    The body is read in fixed-size blocks and scored ``chunk_rows`` rows at a
+    time, so memory stays flat regardless of file length. Emits one line per
+    row, or with ``?window=N`` one line per N consecutive rows (mean class
+    probabilities), followed by a final ``summary`` line. Unparseable rows
+    produce ``{"row": i, "error": ...}`` lines without stopping the stream.
+    """
+    try:
+        window = int(request.args.get("window", 0))
+        chunk_rows = int(request.args.get("chunk_rows", 1024))
+    except ValueError:
+        return jsonify({"error": "'window' and 'chunk_rows' must be integers"}), 400
+    if window < 0 or not 1 <= chunk_rows <= BATCH_MAX_ROWS:
+        return jsonify({"error": f"'window' must be >= 0 and 'chunk_rows' between 1 and {BATCH_MAX_ROWS}"}), 400
+
+    try:
+        # Reads only the header, so a bad header fails before any output is sent
+        chunks = iter_upload_chunks(request.stream, request.content_type, chunk_rows)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    model = registry.get()
+    class_labels = model.classes
+
+    def generate():
+        scored = failed = windows = 0
+        # Probabilities and row numbers of a window that spans chunk boundaries
+        pending = np.empty((0, len(class_labels)))
+        pending_rows = np.empty(0, dtype=np.int64)
+        for chunk in chunks:
+            lines = [{"row": n, "error": err} for n, err in chunk.errors]
+            failed += len(chunk.errors)
+            if len(chunk.values):
+                try:
+                    labels, probabilities = model.predict(chunk.values)
+                except Exception as e:
+                    # Report the chunk's rows and keep reading rather than cutting the response off
+                    lines.extend({"row": n, "error": str(e)} for n in chunk.row_numbers)
+                    failed += len(chunk.row_numbers)
+                    yield "".join(json.dumps(line) + "\n" for line in lines)
+                    continue
+                scored += len(labels)
+                if not window:
+                    for n, pred, proba in zip(chunk.row_numbers, labels, probabilities):
+                        pred = str(pred)
+                        lines.append({"row": n, "prediction": pred, "risk_level": get_risk_level(pred),
+                                      "confidence_scores": _confidence_scores(class_labels, proba)})
+                else:
+                    pending = np.concatenate([pending, probabilities])
+                    pending_rows = np.concatenate([pending_rows, chunk.row_numbers])
+                    while len(pending) >= window:
+                        lines.append(_window_line(class_labels, windows, pending_rows[:window], pending[:window]))
+                        windows += 1
+                        pending, pending_rows = pending[window:], pending_rows[window:]
+            if lines:
+                yield "".join(json.dumps(line) + "\n" for line in lines)
+
+        tail = []
+        if window and len(pending):
+            tail.append(_window_line(class_labels, windows, pending_rows, pending, partial=True))
+            windows += 1
+        tail.append({"summary": {"rows_scored": scored, "rows_failed": failed,
+                                 "windows": windows if window else None}})
+        yield "".join(json.dumps(line) + "\n" for line in tail)
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+@api.route("/predict/session", methods=["POST"])
+def predict_session():
+    """Score a whole CSV or NDJSON recording and return one recording-level verdict.
+
+    Rows (or ``?window=N&step=M`` sliding windows) are scored chunk by chunk
+    and aggregated into mean class probabilities with ``confidence``-level
+    intervals (default 0.95). See session_scorer.py.
+    """
+    try:
+        window, step, confidence = parse_session_params(request.args)
+        chunks = iter_upload_chunks(request.stream, request.content_type)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        model = registry.get()
+        result = score_session(model, chunks, window=window, step=step, confidence=confidence)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    result["risk_level"] = get_risk_level(result["prediction"])
+    result["model_version"] = model.version
+    return jsonify(result)
+
+
+def _window_line(class_labels, index, row_numbers, probabilities, partial=False):
+    mean = probabilities.mean(axis=0)
+    pred = class_labels[int(np.argmax(mean))]
+    line = {"window": index, "start_row": int(row_numbers[0]), "end_row": int(row_numbers[-1]),
+            "rows": len(probabilities),
+            "prediction": pred, "risk_level": get_risk_level(pred),
+            "confidence_scores": _confidence_scores(class_labels, mean)}
+    if partial:
+        line["partial"] = True
+    return line
+
+
+def _assessment_page(patient_id=None):
+    try:
+        params = parse_list_params(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        rows, next_cursor = fetch_assessment_page(get_supabase(), params, patient_id=patient_id)
         return jsonify({
-            "prediction": pred,
-            "risk_level": get_risk_level(pred),
-            "confidence": confidence,
-            "confidence_scores": confidence_scores,
-            "saved_to_database": saved
+            "assessments": rows,
+            "count": len(rows),
+            "next_cursor": next_cursor,
+            "has_more": next_cursor is not None
         })
-
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/assessments", methods=["GET"])
+@api.route("/assessments", methods=["GET"])
+@cached(response_cache, lambda: {"assessments"})
 def get_assessments():
-    """Fetch all stored patient assessments from Supabase."""
+    """Fetch one page of stored patient assessments, newest first.
+
+    Query parameters: ``limit``, ``cursor`` (``next_cursor`` from the previous
+    page), ``prediction``, ``risk_level``, ``patient_prefix``, and either
+    ``view=summary`` (no JSON blobs) or ``fields=a,b,c``.
+    """
+    return _assessment_page()
+
+
+@api.route("/assessments/<patient_id>", methods=["GET"])
+@cached(response_cache, lambda patient_id: {f"patient:{patient_id}"})
+def get_patient_assessments(patient_id):
+    """Fetch one page of assessments for a specific patient by patient ID."""
+    return _assessment_page(patient_id=patient_id)
+
+
+def parse_stats_params(args):
+    """(start, end, bucket) for /assessments/stats; raises ValueError on bad input."""
+    start = args.get("start") or None
+    end = args.get("end") or None
+    bucket = args.get("bucket") or None
+    if bucket not in (None, "day"):
+        raise ValueError("'bucket' must be 'day'")
+    for value in (start, end):
+        if value is not None:
+            try:
+                datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                raise ValueError("'start' and 'end' must be YYYY-MM-DD")
+    return start, end, bucket
+
+
+@api.route("/assessments/stats", methods=["GET"])
+@cached(response_cache, lambda: {"stats"})
+def get_assessment_stats():
+    """Get summary statistics of all assessments.
+
+    Served from in-process counters that the insert path keeps current and
+    that are periodically reconciled with a grouped count in the database.
+    Optional ``start``/``end`` (YYYY-MM-DD) restrict the range, and
+    ``bucket=day`` adds per-day counts.
+    """
+    try:
+        start, end, bucket = parse_stats_params(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     try:
-        response = supabase.table("patient_assessments") \
-            .select("*") \
-            .order("assessment_date", desc=True) \
-            .execute()
-        return jsonify({"assessments": response.data, "count": len(response.data)})
+        stats.start(get_supabase)
+        return jsonify(stats.snapshot(start=start, end=end, bucket=bucket))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/assessments/<patient_id>", methods=["GET"])
-def get_patient_assessments(patient_id):
-    """Fetch assessments for a specific patient by patient ID."""
-    try:
-        response = supabase.table("patient_assessments") \
-            .select("*") \
-            .eq("patient_id", patient_id) \
-            .order("assessment_date", desc=True) \
-            .execute()
-        return jsonify({"assessments": response.data, "count": len(response.data)})
+@api.route("/assessments/similar", methods=["POST"])
+def similar_assessments():
+    """Past assessments and dataset recordings with the nearest scaled EEG profile.
+
+    Body: ``{"eeg": {...19 channels...}, "k": 10, "source": "assessment"}``;
+    ``source`` ("assessment" or "dataset") is optional.
+    """
+    body, status = score_similarity_request(request.get_json(silent=True))
+    return jsonify(body), status
+
+
+def score_similarity_request(data):
+    """Top-k search for one /assessments/similar body; returns (body, status)."""
+    if not isinstance(data, dict) or "eeg" not in data:
+        return {"error": "No EEG data provided"}, 400
+    try:
+        k = int(data.get("k", 10))
+    except (TypeError, ValueError):
+        return {"error": "'k' must be an integer"}, 400
+    if not 1 <= k <= SIMILAR_MAX_K:
+        return {"error": f"'k' must be between 1 and {SIMILAR_MAX_K}"}, 400
+    source = data.get("source") or None
+    if source not in (None,) + SOURCES:
+        return {"error": f"'source' must be one of {list(SOURCES)}"}, 400
+    try:
+        eeg_row = extractor.extract_row(data["eeg"])
+    except (MissingChannelsError, TypeError, ValueError) as e:
+        return {"error": str(e)}, 400
+
+    # Non-blocking; until the stored assessments are indexed ``started`` is false
+    similarity.start(get_supabase)
+    try:
+        t0 = time.perf_counter()
+        neighbors = similarity.search(eeg_row, k=k, source=source)
+        return {"neighbors": neighbors, "index_size": similarity.n, "started": similarity.ready,
+                "model_version": registry.get().version,
+                "query_ms": round((time.perf_counter() - t0) * 1000, 3)}, 200
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+
+# ---------------------------
+# Analytics (local columnar mirror)
+# ---------------------------
+def parse_analytics_params(args):
+    """Validated query arguments shared by the /analytics endpoints; raises ValueError."""
+    start, end, _ = parse_stats_params({"start": args.get("start"), "end": args.get("end")})
+    bucket = args.get("bucket") or "month"
+    if bucket not in BUCKETS:
+        raise ValueError(f"'bucket' must be one of {list(BUCKETS)}")
+    by = args.get("by") or "prediction"
+    if by not in CATEGORIES:
+        raise ValueError(f"'by' must be one of {list(CATEGORIES)}")
+    try:
+        top = int(args["top"]) if args.get("top") else None
+    except ValueError:
+        raise ValueError("'top' must be an integer")
+    return {"start": start, "end": end, "bucket": bucket, "by": by, "top": top}
+
+
+ANALYTICS_QUERIES = ("eeg-means", "risk-levels", "physicians")
+
+
+def analytics_query(name, params):
+    """Run one /analytics query against the local mirror; returns (body, status).
+
+    The mirror is filled in the background; until its first sync ``synced_at`` is null.
+    """
+    analytics.start(get_supabase)
+    t0 = time.perf_counter()
+    if name == "eeg-means":
+        result = analytics.channel_means(params["start"], params["end"], by=params["by"])
+    elif name == "risk-levels":
+        result = analytics.risk_levels(params["start"], params["end"], bucket=params["bucket"])
+    else:
+        result = analytics.physician_counts(params["start"], params["end"], top=params["top"])
+    return {"result": result, "rows": analytics.total_rows, "synced_at": analytics.synced_at,
+            "query_ms": round((time.perf_counter() - t0) * 1000, 3)}, 200
+
+
+@api.route("/analytics/<any('eeg-means', 'risk-levels', 'physicians'):name>", methods=["GET"])
+def get_analytics(name):
+    """Per-channel EEG means by class, risk levels over time, or per-physician counts.
+
+    Answered from the local mirror (analytics_store.py); ``start``/``end``
+    (YYYY-MM-DD) restrict the range.
+    """
+    try:
+        params = parse_analytics_params(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        body, status = analytics_query(name, params)
+        return jsonify(body), status
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/assessments/stats", methods=["GET"])
-def get_assessment_stats():
-    """Get summary statistics of all assessments."""
+# ---------------------------
+# Model versions
+# ---------------------------
+def _admin_denied():
+    """403 response unless the request carries MODEL_ADMIN_TOKEN (when one is configured)."""
+    token = os.environ.get("MODEL_ADMIN_TOKEN")
+    if token and request.headers.get("X-Admin-Token") != token:
+        return jsonify({"error": "Admin token required"}), 403
+    return None
+
+
+@api.route("/models", methods=["GET"])
+def model_status():
+    """Serving, pinned, previous and available model versions in this worker."""
     try:
-        response = supabase.table("patient_assessments").select("*").execute()
-        assessments = response.data
+        registry.get()
+        return jsonify(registry.status())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        total = len(assessments)
-        predictions = {}
-        risk_levels = {}
-        for a in assessments:
-            pred = a.get("prediction", "Unknown")
-            risk = a.get("risk_level", "Unknown")
-            predictions[pred] = predictions.get(pred, 0) + 1
-            risk_levels[risk] = risk_levels.get(risk, 0) + 1
 
-        return jsonify({
-            "total_assessments": total,
-            "predictions_breakdown": predictions,
-            "risk_levels_breakdown": risk_levels
-        })
+def _switch_model(switch):
+    denied = _admin_denied()
+    if denied:
+        return denied
+    data = request.get_json(silent=True) or {}
+    try:
+        registry.get()
+        return jsonify(switch(data.get("version")))
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except ModelValidationError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@api.route("/models/activate", methods=["POST"])
+def activate_model():
+    """Validate and serve ``{"version": ...}``; other workers follow at their next poll."""
+    if not (request.get_json(silent=True) or {}).get("version"):
+        return jsonify({"error": "No version provided"}), 400
+    return _switch_model(registry.activate)
+
+
+@api.route("/models/rollback", methods=["POST"])
+def rollback_model():
+    """Return to the previously served version (or ``{"version": ...}``)."""
+    return _switch_model(registry.rollback)
+
+
+@api.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """This worker's metrics in the Prometheus text format."""
+    return Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def health_report():
+    """The /health body; shared with the ASGI front end so both servers report the same fields."""
+    return {"status": "ok", "model_loaded": registry.loaded,
+            "model_version": registry.get().version if registry.loaded else None,
+            "fusion_disabled": fusion.disabled,
+            "startup": startup_report()}
+
+
+@api.route("/health", methods=["GET"])
+def health():
+    """Liveness check with this worker's startup-time breakdown."""
+    return jsonify(health_report())
+
+
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,313 @@
+"""
+ASGI front end for the prediction API.
+
+Serves the same endpoints as the Flask app with the same logic (it imports
+the route helpers from app.py), but on an event loop:
+
+    uvicorn asgi:app --workers 4 --port 5000
+
+- Inference and request parsing run in a bounded thread pool
+  (ASGI_CPU_WORKERS, default: CPU count), so the loop never blocks on NumPy.
+  ASGI_CPU_WORKERS=0 runs them inline on the loop instead. With micro-batching
+  on (app.predict_batcher), /predict awaits its row's batch on the loop; the
+  batcher's dispatcher thread does the scaling and inference.
+- Reads go to PostgREST through a pooled async HTTP client
+  (postgrest_client.AsyncPostgrestClient, ASGI_DB_CONNECTIONS connections).
+  Assessment inserts keep using the write-behind AssessmentWriter, which is
+  already off the request path.
+- At most ASGI_MAX_CONCURRENCY requests are handled at once and at most
+  ASGI_MAX_QUEUE more may wait; beyond that requests get an immediate 503
+  with Retry-After instead of piling up.
+
+The upload endpoints (/predict/stream, /predict/session) and the model admin
+routes are only served by the Flask app.
+"""
+
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+import app as service
+from binary_payload import is_binary_content_type, UnsupportedPayloadError
+from assessment_queries import build_page_query, finish_page, parse_list_params
+from postgrest_client import AsyncPostgrestClient, ThreadedAsyncClient
+from response_cache import cache_key
+from supabase_config import SUPABASE_KEY, SUPABASE_URL, get_override, get_supabase
+
+MAX_CONCURRENCY = int(os.environ.get("ASGI_MAX_CONCURRENCY", "256"))
+MAX_QUEUE = int(os.environ.get("ASGI_MAX_QUEUE", "1024"))
+CPU_WORKERS = int(os.environ.get("ASGI_CPU_WORKERS", str(os.cpu_count() or 1)))
+DB_CONNECTIONS = int(os.environ.get("ASGI_DB_CONNECTIONS", "50"))
+
+REJECTED = service.metrics.counter("asgi_rejected_total", "Requests refused with 503 by the ASGI limiter")
+QUEUED = service.metrics.gauge("asgi_requests_waiting", "Requests waiting for an ASGI concurrency slot")
+
+
+class ConcurrencyLimit:
+    """ASGI middleware: bounded concurrency plus a bounded wait queue, then 503."""
+
+    def __init__(self, app, max_concurrency, max_queue, retry_after=1):
+        self.app = app
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._slots = None
+        self._waiting = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        if self._slots.locked() and self._waiting >= self.max_queue:
+            REJECTED.labels().inc()
+            response = JSONResponse({"error": "Server busy, retry later"}, status_code=503,
+                                    headers={"Retry-After": str(self.retry_after)})
+            return await response(scope, receive, send)
+
+        self._waiting += 1
+        QUEUED.labels().inc()
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+            QUEUED.labels().dec()
+
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self._slots.release()
+            endpoint = getattr(scope.get("endpoint"), "__name__", "unknown")
+            service.REQUEST_SECONDS.labels(f"asgi.{endpoint}").observe(time.perf_counter() - started)
+            service.REQUESTS.labels(f"asgi.{endpoint}", str(status["code"])).inc()
+
+
+# ---------------------------
+# Shared state
+# ---------------------------
+_cpu = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="asgi-cpu") if CPU_WORKERS else None
+_db = {}
+
+
+def _async_db():
+    """Pooled async PostgREST client, or a thread-pool facade over a set_supabase() client."""
+    override = get_override()
+    if override is None:
+        return AsyncPostgrestClient(SUPABASE_URL, SUPABASE_KEY, max_connections=DB_CONNECTIONS)
+    if hasattr(override, "async_client"):
+        return override.async_client()
+    return ThreadedAsyncClient(override)
+
+
+async def _run_cpu(fn, *args):
+    if _cpu is None:
+        return fn(*args)
+    return await asyncio.get_running_loop().run_in_executor(_cpu, fn, *args)
+
+
+async def _json_body(request):
+    body = await request.body()
+    if not body:
+        return None
+    try:
+        # Large batch bodies take milliseconds to decode; keep that off the loop
+        return await _run_cpu(json.loads, body)
+    except ValueError:
+        return None
+
+
+def _etag_matches(request, etag):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [t.strip().removeprefix("W/").strip('"') for t in header.split(",")]
+    return etag in tags or "*" in tags
+
+
+async def _cached(request, tags, produce):
+    """Serve from app.response_cache (shared with the Flask routes' tagging) with ETags."""
+    key = cache_key(request.url.path, request.query_params.multi_items())
+    entry = service.response_cache.get(key)
+    status = "HIT"
+    if entry is None:
+        generation = service.response_cache.generation(tags)
+        response = await produce()
+        if response.status_code != 200:
+            return response
+        entry = service.response_cache.put(key, response.body, response.media_type, tags, generation)
+        if entry is None:
+            return response
+        status = "MISS"
+    headers = {"ETag": f'"{entry.etag}"', "X-Cache": status}
+    if _etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type=entry.mimetype, headers=headers)
+
+
+# ---------------------------
+# Routes
+# ---------------------------
+async def predict(request):
+    content_type = request.headers.get("content-type")
+    eeg_values = None
+    if is_binary_content_type(content_type):
+        try:
+            data, eeg_values = service.decode_binary_prediction(content_type, await request.body())
+        except UnsupportedPayloadError as e:
+            return JSONResponse({"error": str(e)}, status_code=415)
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+    else:
+        data = await _json_body(request)
+    if not service.predict_batcher.enabled:
+        body, status = await _run_cpu(service.score_prediction_request, data, eeg_values)
+        return JSONResponse(body, status_code=status)
+
+    # Extraction takes microseconds and runs on the loop; the batch and the journal write are awaited
+    try:
+        eeg_values, error = service.prepare_prediction(data, eeg_values)
+        if error is not None:
+            return JSONResponse(error[0], status_code=error[1])
+        model = service.registry.get()
+        with service.PREDICT_STAGE_SECONDS.labels("batch").time():
+            # extract() reuses a per-thread buffer and every request here runs on the loop thread
+            row = eeg_values[0].copy()
+            result = await asyncio.wrap_future(service.predict_batcher.submit(model, row))
+        # Queueing the assessment appends to the journal and fsyncs it; keep that off the loop
+        body, status = await asyncio.to_thread(service.finish_prediction, data, model, result)
+    except Exception as e:
+        body, status = {"error": str(e)}, 500
+    return JSONResponse(body, status_code=status)
+
+
+async def predict_fusion(request):
+    data = await _json_body(request)
+    body, status = await _run_cpu(service.score_fusion_request, data)
+    return JSONResponse(body, status_code=status)
+
+
+async def similar_assessments(request):
+    data = await _json_body(request)
+    body, status = await _run_cpu(service.score_similarity_request, data)
+    return JSONResponse(body, status_code=status)
+
+
+async def get_analytics(request):
+    if request.path_params["name"] not in service.ANALYTICS_QUERIES:
+        return JSONResponse({"error": "Not found"}, status_code=404)
+    try:
+        params = service.parse_analytics_params(request.query_params)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    try:
+        body, status = await _run_cpu(service.analytics_query, request.path_params["name"], params)
+    except Exception as e:
+        body, status = {"error": str(e)}, 500
+    return JSONResponse(body, status_code=status)
+
+
+async def predict_batch(request):
+    content_type = request.headers.get("content-type")
+    if is_binary_content_type(content_type):
+        body, status = await _run_cpu(service.score_binary_batch, content_type, await request.body())
+    else:
+        data = await _json_body(request)
+        body, status = await _run_cpu(service.score_batch_request, data)
+    return JSONResponse(body, status_code=status)
+
+
+async def _assessment_page(request, patient_id=None):
+    try:
+        params = parse_list_params(request.query_params)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    try:
+        response = await build_page_query(_db["client"], params, patient_id=patient_id).execute()
+        rows, next_cursor = finish_page(response.data, params)
+        return JSONResponse({"assessments": rows, "count": len(rows),
+                             "next_cursor": next_cursor, "has_more": next_cursor is not None})
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+async def get_assessments(request):
+    return await _cached(request, {"assessments"}, lambda: _assessment_page(request))
+
+
+async def get_patient_assessments(request):
+    patient_id = request.path_params["patient_id"]
+    return await _cached(request, {f"patient:{patient_id}"},
+                         lambda: _assessment_page(request, patient_id=patient_id))
+
+
+async def get_assessment_stats(request):
+    try:
+        start, end, bucket = service.parse_stats_params(request.query_params)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    async def produce():
+        try:
+            # The first call reconciles with the database; later calls return at once
+            await _run_cpu(service.stats.start, get_supabase)
+            return JSONResponse(service.stats.snapshot(start=start, end=end, bucket=bucket))
+        except Exception as e:
+            return JSONResponse({"error": str(e)}, status_code=500)
+
+    return await _cached(request, {"stats"}, produce)
+
+
+async def health(request):
+    return JSONResponse(service.health_report())
+
+
+async def prometheus_metrics(request):
+    return Response(service.metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    await _run_cpu(service.create_app)  # loads the model and starts the writer (WARM_UP)
+    _db["client"] = _async_db()
+    try:
+        yield
+    finally:
+        await _db.pop("client").close()
+
+
+def create_asgi_app():
+    routes = [
+        Route("/predict", predict, methods=["POST"]),
+        Route("/predict/batch", predict_batch, methods=["POST"]),
+        Route("/predict/fusion", predict_fusion, methods=["POST"]),
+        Route("/assessments", get_assessments, methods=["GET"]),
+        Route("/assessments/stats", get_assessment_stats, methods=["GET"]),
+        Route("/assessments/similar", similar_assessments, methods=["POST"]),
+        Route("/assessments/{patient_id}", get_patient_assessments, methods=["GET"]),
+        Route("/analytics/{name:str}", get_analytics, methods=["GET"]),
+        Route("/health", health, methods=["GET"]),
+        Route("/metrics", prometheus_metrics, methods=["GET"]),
+    ]
+    cors = Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+    asgi_app = Starlette(routes=routes, middleware=[cors], lifespan=lifespan)
+    return ConcurrencyLimit(asgi_app, MAX_CONCURRENCY, MAX_QUEUE)
+
+
+app = create_asgi_app()
@@ -0,0 +1,129 @@
+"""
+Keyset-paginated, filtered reads of patient_assessments.
+
+Pages are ordered by ``assessment_date DESC, id DESC`` (served by
+idx_assessment_date) and continued with an opaque cursor holding the last
+row's (assessment_date, id), so each page costs the same no matter how deep
+the client has scrolled. Filters on prediction (idx_prediction), risk_level
+and patient ID prefix (idx_patient_id_prefix) are applied in the database,
+and list views can project away the large JSON columns.
+"""
+
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Columns returned by ?view=summary: everything except the JSON blobs
+SUMMARY_COLUMNS = ["id", "patient_id", "age", "gender", "education", "occupation",
+                   "referring_physician", "prediction", "risk_level", "confidence_score",
+                   "model_version", "assessment_date", "created_at"]
+BLOB_COLUMNS = ["medical_history", "questionnaire_responses", "eeg_data"]
+ALL_COLUMNS = SUMMARY_COLUMNS + BLOB_COLUMNS + ["updated_at"]
+
+
+def encode_cursor(row):
+    """Opaque continuation token for the page after ``row``."""
+    raw = json.dumps([row["assessment_date"], row["id"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(token):
+    """Inverse of encode_cursor; raises ValueError on a malformed token."""
+    try:
+        assessment_date, row_id = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return str(assessment_date), str(row_id)
+
+
+def _quote(value):
+    """Double-quote a value for a PostgREST logic filter (dates contain '.' and ':')."""
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def parse_list_params(args):
+    """Validate query-string arguments for the list endpoints.
+
+    Raises ValueError with a client-facing message on bad input.
+    """
+    try:
+        limit = int(args.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("'limit' must be an integer")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"'limit' must be between 1 and {MAX_PAGE_SIZE}")
+
+    if args.get("fields"):
+        columns = [c.strip() for c in args["fields"].split(",") if c.strip()]
+        unknown = [c for c in columns if c not in ALL_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {unknown}")
+    elif args.get("view") == "summary":
+        columns = list(SUMMARY_COLUMNS)
+    elif args.get("view", "full") == "full":
+        columns = None
+    else:
+        raise ValueError("'view' must be 'summary' or 'full'")
+
+    cursor = decode_cursor(args["cursor"]) if args.get("cursor") else None
+
+    return {
+        "limit": limit,
+        "columns": columns,
+        "cursor": cursor,
+        "prediction": args.get("prediction") or None,
+        "risk_level": args.get("risk_level") or None,
+        "patient_prefix": args.get("patient_prefix") or None,
+    }
+
+
+def build_page_query(client, params, patient_id=None):
+    """The un-executed keyset page query (one row more than the page size)."""
+    columns = params["columns"]
+    if columns is None:
+        projection = "*"
+    else:
+        # The cursor needs the sort key even if the caller did not ask for it
+        projection = ",".join(dict.fromkeys(columns + ["assessment_date", "id"]))
+
+    query = client.table("patient_assessments").select(projection)
+    if patient_id is not None:
+        query = query.eq("patient_id", patient_id)
+    if params["prediction"]:
+        query = query.eq("prediction", params["prediction"])
+    if params["risk_level"]:
+        query = query.eq("risk_level", params["risk_level"])
+    if params["patient_prefix"]:
+        query = query.like("patient_id", _escape_like(params["patient_prefix"]) + "%")
+    if params["cursor"]:
+        date, row_id = params["cursor"]
+        query = query.or_(f"assessment_date.lt.{_quote(date)},"
+                          f"and(assessment_date.eq.{_quote(date)},id.lt.{_quote(row_id)})")
+
+    # One extra row tells us whether another page exists
+    return query.order("assessment_date", desc=True) \
+        .order("id", desc=True) \
+        .limit(params["limit"] + 1)
+
+
+def finish_page(rows, params):
+    """Trim the look-ahead row and projection; return (rows, next_cursor)."""
+    columns = params["columns"]
+    next_cursor = None
+    if len(rows) > params["limit"]:
+        rows = rows[:params["limit"]]
+        next_cursor = encode_cursor(rows[-1])
+    if columns is not None:
+        rows = [{c: row.get(c) for c in columns} for row in rows]
+    return rows, next_cursor
+
+
+def fetch_assessment_page(client, params, patient_id=None):
+    """Run one keyset page query and return (rows, next_cursor)."""
+    return finish_page(build_page_query(client, params, patient_id).execute().data, params)
@@ -0,0 +1,158 @@
+"""
+Incrementally maintained assessment counts for /assessments/stats.
+
+Counts are kept per (day, prediction, risk_level) in memory. The write-behind
+insert path bumps them as rows are stored, and they are periodically
+reconciled with the database through the ``assessment_stats`` SQL function
+(a grouped count in Postgres, see supabase_schema.sql), so no request ever
+downloads the table. Each worker process keeps its own counters; between
+reconciliations a worker only sees the inserts it performed itself.
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+
+from assessment_queries import decode_cursor, fetch_assessment_page
+
+
+def _day(value):
+    return str(value or "")[:10] or "Unknown"
+
+
+class AssessmentStats:
+    """Thread-safe grouped counters with periodic reconciliation."""
+
+    def __init__(self, reconcile_interval=300.0):
+        self.reconcile_interval = reconcile_interval
+        self._lock = threading.Lock()
+        self._groups = {}        # (day, prediction, risk_level) -> count
+        self._predictions = {}
+        self._risk_levels = {}
+        self._total = 0
+        self.reconciled_at = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    # ---------------------------
+    # Updates
+    # ---------------------------
+    def _add(self, day, prediction, risk_level, n):
+        key = (day, prediction, risk_level)
+        self._groups[key] = self._groups.get(key, 0) + n
+        self._predictions[prediction] = self._predictions.get(prediction, 0) + n
+        self._risk_levels[risk_level] = self._risk_levels.get(risk_level, 0) + n
+        self._total += n
+
+    def record(self, rows):
+        """Count newly inserted assessment rows (AssessmentWriter listener)."""
+        with self._lock:
+            for row in rows:
+                self._add(_day(row.get("assessment_date")),
+                          row.get("prediction") or "Unknown",
+                          row.get("risk_level") or "Unknown", 1)
+
+    def reconcile(self, client):
+        """Replace the counters with grouped counts computed by the database."""
+        groups = fetch_grouped_counts(client)
+        with self._lock:
+            self._groups, self._predictions, self._risk_levels, self._total = {}, {}, {}, 0
+            for (day, prediction, risk_level), n in groups.items():
+                self._add(day, prediction, risk_level, n)
+            self.reconciled_at = datetime.now(timezone.utc).isoformat()
+
+    def start(self, client_factory):
+        """Reconcile now, then every ``reconcile_interval`` seconds in the background."""
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self.reconcile(client_factory())
+            self._thread = threading.Thread(target=self._loop, args=(client_factory,),
+                                            name="assessment-stats", daemon=True)
+            self._thread.start()
+
+    def _loop(self, client_factory):
+        while True:
+            time.sleep(self.reconcile_interval)
+            try:
+                self.reconcile(client_factory())
+            except Exception as e:
+                print(f"[Stats] Reconciliation failed: {str(e)}")
+
+
+    # ---------------------------
+    # Reads
+    # ---------------------------
+    def snapshot(self, start=None, end=None, bucket=None):
+        """Totals, optionally restricted to [start, end] days and bucketed per day.
+
+        Without a date range the totals are returned directly; ranges and
+        buckets scan the per-day groups, which grow with days, not rows.
+        """
+        with self._lock:
+            if start is None and end is None and bucket is None:
+                result = {
+                    "total_assessments": self._total,
+                    "predictions_breakdown": dict(self._predictions),
+                    "risk_levels_breakdown": dict(self._risk_levels),
+                }
+            else:
+                result = self._range_snapshot(start, end, bucket)
+            result["reconciled_at"] = self.reconciled_at
+            return result
+
+    def _range_snapshot(self, start, end, bucket):
+        predictions, risk_levels, days = {}, {}, {}
+        total = 0
+        for (day, prediction, risk_level), n in self._groups.items():
+            if (start and day < start) or (end and day > end):
+                continue
+            total += n
+            predictions[prediction] = predictions.get(prediction, 0) + n
+            risk_levels[risk_level] = risk_levels.get(risk_level, 0) + n
+            if bucket == "day":
+                b = days.setdefault(day, {"date": day, "total": 0, "predictions": {}, "risk_levels": {}})
+                b["total"] += n
+                b["predictions"][prediction] = b["predictions"].get(prediction, 0) + n
+                b["risk_levels"][risk_level] = b["risk_levels"].get(risk_level, 0) + n
+
+        result = {
+            "total_assessments": total,
+            "predictions_breakdown": predictions,
+            "risk_levels_breakdown": risk_levels,
+        }
+        if bucket == "day":
+            result["buckets"] = [days[d] for d in sorted(days)]
+        return result
+
+
+def fetch_grouped_counts(client, page_size=1000):
+    """Grouped (day, prediction, risk_level) counts from the database.
+
+    Uses the ``assessment_stats`` RPC; if that function has not been created
+    yet, falls back to paging through just the three grouping columns.
+    """
+    groups = {}
+    try:
+        rows = client.rpc("assessment_stats", {}).execute().data
+        for row in rows:
+            key = (_day(row.get("day")), row.get("prediction") or "Unknown",
+                   row.get("risk_level") or "Unknown")
+            groups[key] = groups.get(key, 0) + int(row["n"])
+        return groups
+    except Exception as e:
+        print(f"[Stats] assessment_stats RPC unavailable, counting by pages: {str(e)}")
+
+    params = {"limit": page_size, "columns": ["assessment_date", "prediction", "risk_level"],
+              "cursor": None, "prediction": None, "risk_level": None, "patient_prefix": None}
+    while True:
+        rows, next_cursor = fetch_assessment_page(client, params)
+        for row in rows:
+            key = (_day(row.get("assessment_date")), row.get("prediction") or "Unknown",
+                   row.get("risk_level") or "Unknown")
+            groups[key] = groups.get(key, 0) + 1
+        if next_cursor is None:
+            return groups
+        params["cursor"] = decode_cursor(next_cursor)
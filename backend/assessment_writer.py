@@ -0,0 +1,371 @@
+"""
+Write-behind persistence for patient assessments.
+
+/predict hands finished assessment records to an AssessmentWriter instead of
+inserting them itself. Worker threads drain a bounded in-process queue and
+insert records into Supabase in multi-row ``insert([...])`` calls. When the
+remote is unreachable (or the queue is full) records are appended to a local
+JSON-lines journal, which is replayed on the next start and whenever the
+remote recovers, so a database outage no longer loses assessments.
+
+The journal may be shared by the pre-fork workers of one server: appends
+and the hand-over to a replay take an exclusive ``flock`` on
+``<journal>.lock``, and only one process replays at a time
+(``<journal>.replay.lock``). A batch the database rejects because of its
+data (constraint or type errors) is split in halves until the offending
+rows are found; those are moved to ``<journal>.rejected`` with the error,
+and the rest are inserted.
+
+Every record gets a client-generated ``submission_id`` (a UUID, unique in
+the table) when it is submitted, before it can reach the journal, and rows
+are written with an upsert that ignores conflicts on it. A batch that was
+stored but then replayed anyway (a crash between the insert and the journal
+truncate, or an insert whose response was lost) is therefore not stored
+twice; the duplicates are counted and left out of the listener calls.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process dev server, the thread locks suffice
+    fcntl = None
+
+_STOP = object()
+IDEMPOTENCY_KEY = "submission_id"
+
+
+@contextmanager
+def _file_lock(path, blocking=True):
+    """Exclusive advisory lock on ``path``; yields False if ``blocking`` is off and it is held."""
+    if fcntl is None:
+        yield True
+        return
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _is_row_error(e):
+    """True if the database rejected the data (SQLSTATE 22/23, HTTP 4xx) rather than being unreachable."""
+    if isinstance(e, (TypeError, ValueError)):
+        return True
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    if status is not None:
+        return 400 <= status < 500 and status not in (401, 403, 408, 429)
+    return str(getattr(e, "code", "") or "")[:2] in ("22", "23")
+
+
+class AssessmentWriter:
+    """Bounded queue + worker threads that batch inserts into one table."""
+
+    def __init__(self, client, table="patient_assessments",
+                 journal_path="assessment_journal.jsonl", max_queue=1000,
+                 batch_size=50, flush_interval=0.25, workers=1, retry_after=5.0,
+                 observer=None):
+        self.client = client
+        self.table = table
+        self.journal_path = journal_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_after = retry_after
+        self.num_workers = workers
+        # Optional observer(seconds, rows, ok) called after every insert attempt
+        self.observer = observer
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._journal_lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._threads = []
+        self._listeners = []
+        self._remote_down_until = 0.0
+        self._journal_pending = False
+        self.stats = {"queued": 0, "inserted": 0, "journaled": 0,
+                      "replayed": 0, "duplicates": 0, "insert_errors": 0, "rejected": 0,
+                      "writer_errors": 0}
+
+    # ---------------------------
+    # Lifecycle
+    # ---------------------------
+    def start(self):
+        """Replay any journaled records, then start the worker threads."""
+        if self._threads:
+            return
+        self.replay_journal()
+        for i in range(self.num_workers):
+            t = threading.Thread(target=self._run, name=f"assessment-writer-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout=10.0):
+        """Drain the queue and stop the workers."""
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def flush(self):
+        """Block until every record submitted so far has been inserted or journaled."""
+        self._queue.join()
+
+    def add_listener(self, fn):
+        """Call ``fn(rows)`` after every successful insert (including journal replays).
+
+        Rows carry the database ``id`` when the insert response returned it.
+        """
+        self._listeners.append(fn)
+
+    def _notify(self, rows):
+        for fn in self._listeners:
+            try:
+                fn(rows)
+            except Exception as e:
+                print(f"[Supabase] Insert listener failed: {str(e)}")
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    # ---------------------------
+    # Producer side
+    # ---------------------------
+    def submit(self, record):
+        """Queue one record for insertion without waiting on the database.
+
+        Returns ``"queued"`` normally, or ``"journaled"`` when the queue is full
+        and the record was spilled straight to the local journal.
+        """
+        record.setdefault(IDEMPOTENCY_KEY, str(uuid.uuid4()))
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self._journal([record])
+            return "journaled"
+        self._count("queued")
+        return "queued"
+
+    # ---------------------------
+    # Worker side
+    # ---------------------------
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._queue.task_done()
+                return
+
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    nxt = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if nxt is _STOP:
+                    stop = True
+                    break
+                batch.append(nxt)
+
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                # Journal I/O or a listener bug must not kill the worker thread
+                self._count("writer_errors")
+                print(f"[Supabase] Writer failed on {len(batch)} assessment(s): {str(e)}")
+            finally:
+                for _ in range(len(batch) + (1 if stop else 0)):
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _write_batch(self, rows):
+        if time.monotonic() < self._remote_down_until:
+            self._journal(rows)
+            return
+        try:
+            stored = self._insert(rows)
+        except Exception as e:
+            self._count("insert_errors")
+            if not _is_row_error(e):
+                self._remote_failed(rows, e)
+                return
+            inserted, unsent, error = self._isolate(rows, e)
+            if inserted:
+                self._inserted(inserted)
+            if unsent:
+                self._remote_failed(unsent, error)
+            return
+        self._inserted(stored)
+
+    def _inserted(self, rows):
+        self._count("inserted", len(rows))
+        print(f"[Supabase] Stored {len(rows)} assessment(s)")
+        self._notify(rows)
+        if self._journal_pending:
+            self.replay_journal()
+
+    def _remote_failed(self, rows, error):
+        self._remote_down_until = time.monotonic() + self.retry_after
+        print(f"[Supabase] Batch insert of {len(rows)} assessments failed, journaling: {str(error)}")
+        self._journal(rows)
+
+    def _isolate(self, rows, error):
+        """Bisect a batch rejected with ``error``: insert what the database accepts, reject single bad rows.
+
+        Returns ``(inserted, unsent, remote_error)``; ``unsent`` is non-empty if
+        the remote became unreachable part-way through.
+        """
+        inserted = []
+        parts = [(rows, error)]
+        while parts:
+            part, error = parts.pop()
+            if error is None:
+                try:
+                    inserted.extend(self._insert(part))
+                    continue
+                except Exception as e:
+                    self._count("insert_errors")
+                    if not _is_row_error(e):
+                        return inserted, part + [row for rest, _ in reversed(parts) for row in rest], e
+                    error = e
+            if len(part) == 1:
+                self._reject(part[0], error)
+                continue
+            mid = len(part) // 2
+            parts += [(part[mid:], None), (part[:mid], None)]
+        return inserted, [], None
+
+    def _insert(self, rows):
+        """Store ``rows`` unless their submission_id is already in the table.
+
+        Returns the rows that were newly stored, with the ids the database
+        assigned, when it sends them back.
+        """
+        for row in rows:
+            row.setdefault(IDEMPOTENCY_KEY, str(uuid.uuid4()))
+        t0 = time.perf_counter()
+        ok = False
+        try:
+            response = (self.client.table(self.table)
+                        .upsert(rows, on_conflict=IDEMPOTENCY_KEY, ignore_duplicates=True).execute())
+            ok = True
+        finally:
+            if self.observer is not None:
+                self.observer(time.perf_counter() - t0, len(rows), ok)
+        stored = getattr(response, "data", None)
+        if not isinstance(stored, list):
+            return rows
+        # Conflicting (already stored) rows are not returned
+        ids = {saved.get(IDEMPOTENCY_KEY): saved.get("id") for saved in stored if isinstance(saved, dict)}
+        new = [{**row, "id": ids[row[IDEMPOTENCY_KEY]]} if ids[row[IDEMPOTENCY_KEY]] is not None else row
+               for row in rows if row[IDEMPOTENCY_KEY] in ids]
+        if len(new) < len(rows):
+            self._count("duplicates", len(rows) - len(new))
+        return new
+
+    # ---------------------------
+    # Journal
+    # ---------------------------
+    def _journal(self, rows):
+        with self._journal_lock, _file_lock(self.journal_path + ".lock"):
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                for row in rows:
+                    f.write(json.dumps(row) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._journal_pending = True
+        self._count("journaled", len(rows))
+
+    def _reject(self, row, error):
+        """Set aside a row the database will not accept, so it is neither retried nor lost."""
+        with self._journal_lock, _file_lock(self.journal_path + ".lock"):
+            with open(self.journal_path + ".rejected", "a", encoding="utf-8") as f:
+                f.write(json.dumps({"error": str(error), "record": row}) + "\n")
+        self._count("rejected")
+        print(f"[Supabase] Rejected assessment for patient {row.get('patient_id')}: {str(error)}")
+
+    def replay_journal(self):
+        """Insert journaled records; anything that still fails goes back to the journal."""
+        if not self._replay_lock.acquire(blocking=False):
+            return 0
+        try:
+            with _file_lock(self.journal_path + ".replay.lock", blocking=False) as locked:
+                # Another worker process is already replaying the shared journal
+                return self._replay() if locked else 0
+        except Exception as e:
+            self._count("writer_errors")
+            print(f"[Supabase] Journal replay failed: {str(e)}")
+            return 0
+        finally:
+            self._replay_lock.release()
+
+    def _replay(self):
+        replay_path = self.journal_path + ".replay"
+        with self._journal_lock, _file_lock(self.journal_path + ".lock"):
+            # A leftover .replay file means a previous replay was interrupted
+            if os.path.exists(self.journal_path):
+                with open(self.journal_path, "r", encoding="utf-8") as src, \
+                        open(replay_path, "a", encoding="utf-8") as dst:
+                    dst.write(src.read())
+                os.remove(self.journal_path)
+            self._journal_pending = False
+            if not os.path.exists(replay_path):
+                return 0
+
+            rows = []
+            with open(replay_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        try:
+                            rows.append(json.loads(line))
+                        except ValueError:
+                            # Torn final line from a crash mid-write
+                            print("[Supabase] Skipping corrupt journal line")
+
+        replayed = 0
+        for start in range(0, len(rows), self.batch_size):
+            batch, unsent = rows[start:start + self.batch_size], []
+            try:
+                batch = self._insert(batch)
+            except Exception as e:
+                self._count("insert_errors")
+                batch, unsent, error = self._isolate(batch, e) if _is_row_error(e) else ([], batch, e)
+            if batch:
+                replayed += len(batch)
+                self._notify(batch)
+            if unsent:
+                rest = unsent + rows[start + self.batch_size:]
+                self._remote_down_until = time.monotonic() + self.retry_after
+                print(f"[Supabase] Journal replay failed, keeping {len(rest)} record(s): {str(error)}")
+                self._journal(rest)
+                break
+
+        os.remove(replay_path)
+        if replayed:
+            self._count("replayed", replayed)
+            print(f"[Supabase] Replayed {replayed} journaled assessment(s)")
+        return replayed
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] += n
@@ -0,0 +1,10 @@
+"""
+Performance benchmarks for the ADHD detection backend.
+
+Run modules from the backend/ directory, e.g.
+    python -m benchmarks.forest_latency
+    python -m benchmarks.service_load
+    python -m benchmarks.asgi_concurrency
+    python -m benchmarks.payload_formats
+    python -m benchmarks.similarity_search
+"""
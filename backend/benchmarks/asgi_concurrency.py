@@ -0,0 +1,295 @@
+"""
+Flask (threaded WSGI dev server) vs ASGI (uvicorn) under 1..256 concurrent clients.
+
+Both servers run in subprocesses against the same fake PostgREST server,
+which answers from LocalSupabase tables after an ``asyncio.sleep`` of
+``--db-latency`` seconds, so database round trips cost wall time but no CPU.
+The response cache is disabled (TTL 0) so every read reaches the database.
+Load comes from an asyncio/httpx client holding ``concurrency`` requests in
+flight.
+
+Scenarios: ``assessments`` (GET /assessments?view=summary, database-bound)
+and ``predict`` (POST /predict, CPU-bound).
+
+Usage (from backend/):
+    python -m benchmarks.asgi_concurrency --levels 1,4,16,64,256 --requests 512
+
+The load generator shares the machine with the servers; on few cores the
+numbers are a lower bound for both.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.forest_latency import percentiles
+
+SAMPLE_EEG = os.path.join(os.path.dirname(__file__), "..", "..", "frontend", "public", "sample_eeg.json")
+
+
+# ---------------------------
+# Servers (run in subprocesses)
+# ---------------------------
+def fake_postgrest(latency, seed_rows):
+    """Starlette app speaking the PostgREST subset postgrest_client.py emits."""
+    from starlette.applications import Starlette
+    from starlette.responses import JSONResponse, Response
+    from starlette.routing import Route
+
+    from local_supabase import LocalSupabase
+
+    db = LocalSupabase()
+    for i in range(seed_rows):
+        db.table("patient_assessments").insert({
+            "patient_id": f"BENCH{i % 50:04d}", "prediction": ["ADHD", "Non_ADHD"][i % 2],
+            "risk_level": ["high", "low"][i % 2], "assessment_date": f"2026-01-{1 + i % 28:02d}T00:00:{i % 60:02d}",
+            "eeg_data": "{}", "questionnaire_responses": "[]", "medical_history": "{}",
+        }).execute()
+
+    async def table(request):
+        await asyncio.sleep(latency)
+        query = db.table(request.path_params["table"])
+        if request.method == "POST":
+            rows = json.loads(await request.body())
+            prefer = request.headers.get("prefer", "")
+            if "on_conflict" in request.query_params:
+                query.upsert(rows, on_conflict=request.query_params["on_conflict"],
+                             ignore_duplicates="resolution=ignore-duplicates" in prefer)
+            else:
+                query.insert(rows)
+            data = query.execute().data
+            if "return=representation" in prefer:
+                return JSONResponse(data, status_code=201)
+            return Response(status_code=201)
+        query.select(request.query_params.get("select", "*"))
+        for key, value in request.query_params.multi_items():
+            if key in ("select", "limit", "order"):
+                continue
+            if key == "or":
+                query.or_(value[1:-1])
+            else:
+                op, operand = value.split(".", 1)
+                getattr(query, op)(key, operand)
+        for term in filter(None, request.query_params.get("order", "").split(",")):
+            column, direction = term.rsplit(".", 1)
+            query.order(column, desc=direction == "desc")
+        if "limit" in request.query_params:
+            query.limit(int(request.query_params["limit"]))
+        return JSONResponse(query.execute().data)
+
+    async def rpc(request):
+        await asyncio.sleep(latency)
+        params = json.loads(await request.body() or b"{}")
+        return JSONResponse(db.rpc(request.path_params["name"], params).execute().data)
+
+    return Starlette(routes=[
+        Route("/rest/v1/rpc/{name}", rpc, methods=["POST"]),
+        Route("/rest/v1/{table}", table, methods=["GET", "POST"]),
+    ])
+
+
+def _use_fake_postgrest(db_url):
+    from postgrest_client import PostgrestClient
+    from supabase_config import set_supabase
+
+    set_supabase(PostgrestClient(db_url, "benchmark", max_connections=64))
+
+
+def serve(kind, port, db_url, latency, seed_rows):
+    import uvicorn
+
+    if kind == "postgrest":
+        uvicorn.run(fake_postgrest(latency, seed_rows), port=port, log_level="warning")
+    elif kind == "flask":
+        from werkzeug.serving import run_simple
+        import app
+
+        _use_fake_postgrest(db_url)
+        run_simple("127.0.0.1", port, app.create_app(), threaded=True)
+    elif kind == "asgi":
+        _use_fake_postgrest(db_url)
+        import asgi
+
+        uvicorn.run(asgi.app, port=port, log_level="warning")
+
+
+def start_server(kind, port, args, env):
+    cmd = [sys.executable, "-m", "benchmarks.asgi_concurrency", "--serve", kind, "--port", str(port),
+           "--db-url", f"http://127.0.0.1:{args.db_port}", "--db-latency", str(args.db_latency),
+           "--seed-rows", str(args.seed_rows)]
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    probe = "/rest/v1/patient_assessments?limit=1" if kind == "postgrest" else "/health"
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}{probe}", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{kind} server did not start on port {port}")
+
+
+# ---------------------------
+# Load generator
+# ---------------------------
+class _Connection:
+    """One keep-alive HTTP/1.1 connection on asyncio streams.
+
+    httpx's shared async pool costs more CPU than the servers under test at
+    high concurrency, so each worker drives its own socket instead.
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None):
+        payload = json.dumps(body).encode() if body is not None else b""
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n")
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(head.encode() + payload)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed")
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if "content-length" in headers:
+            await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            await self.reader.read()
+        if headers.get("connection", "").lower() == "close" or "content-length" not in headers:
+            self.close()
+        return int(status_line.split()[1])
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def run_level(base_url, make_request, concurrency, n_requests):
+    url = httpx.URL(base_url)
+    samples, statuses = [], {}
+    counter = iter(range(n_requests))
+
+    async def worker():
+        conn = _Connection(url.host, url.port)
+        for i in counter:
+            method, path, body = make_request(i)
+            t0 = time.perf_counter()
+            try:
+                status = await conn.request(method, path, body)
+            except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+                conn.close()
+                status = 599
+            samples.append(time.perf_counter() - t0)
+            statuses[status] = statuses.get(status, 0) + 1
+        conn.close()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - t0
+
+    result = percentiles(samples)
+    result["throughput_rps"] = n_requests / wall
+    result["errors"] = sum(n for status, n in statuses.items() if status >= 400)
+    result["rejected_503"] = statuses.get(503, 0)
+    return result
+
+
+def build_scenarios():
+    with open(SAMPLE_EEG, "r", encoding="utf-8") as f:
+        eeg = json.load(f)
+    return {
+        "assessments": lambda i: ("GET", "/assessments?view=summary&limit=50", None),
+        # Nudge the readings per request so the prediction memo does not short-circuit inference
+        "predict": lambda i: ("POST", "/predict",
+                              {"eeg": {ch: v + i * 1e-6 for ch, v in eeg.items()},
+                               "user_info": {"patientId": f"BENCH{i % 50:04d}"}}),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", default="1,4,16,64,256")
+    parser.add_argument("--requests", type=int, default=512, help="requests per scenario and level")
+    parser.add_argument("--scenarios", default="assessments,predict")
+    parser.add_argument("--servers", default="flask,asgi")
+    parser.add_argument("--db-latency", type=float, default=0.02, help="seconds per fake PostgREST call")
+    parser.add_argument("--seed-rows", type=int, default=500)
+    parser.add_argument("--db-port", type=int, default=54321)
+    parser.add_argument("--port", type=int, default=58000)
+    parser.add_argument("--out", help="write results JSON here")
+    # Internal: run one server in this process
+    parser.add_argument("--serve", choices=["postgrest", "flask", "asgi"], help=argparse.SUPPRESS)
+    parser.add_argument("--db-url", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve(args.serve, args.port, args.db_url, args.db_latency, args.seed_rows)
+        return 0
+
+    journal = os.path.join(tempfile.mkdtemp(prefix="asgi-bench-"), "journal.jsonl")
+    env = dict(os.environ, RESPONSE_CACHE_TTL="0", ASSESSMENT_JOURNAL=journal, MODEL_POLL_SECONDS="0")
+    scenarios = build_scenarios()
+    levels = [int(level) for level in args.levels.split(",")]
+    results = {"db_latency_seconds": args.db_latency, "cpu_count": os.cpu_count(), "servers": {}}
+
+    # Scenario-major order: reads run against the seeded table before predict inserts grow it
+    postgrest = start_server("postgrest", args.db_port, args, env)
+    try:
+        for name in args.scenarios.split(","):
+            for offset, kind in enumerate(args.servers.split(",")):
+                port = args.port + offset
+                base_url = f"http://127.0.0.1:{port}"
+                proc = start_server(kind, port, args, env)
+                results["servers"].setdefault(kind, {})[name] = {}
+                try:
+                    asyncio.run(run_level(base_url, scenarios[name], 4, 16))  # warm up
+                    for c in levels:
+                        r = asyncio.run(run_level(base_url, scenarios[name], c, args.requests))
+                        results["servers"][kind][name][f"c{c}"] = r
+                        print(f"{kind:<6}{name:<13}c={c:<5}{r['throughput_rps']:>9.1f} rps  "
+                              f"p50 {r['p50_us'] / 1e3:>8.1f}ms  p95 {r['p95_us'] / 1e3:>8.1f}ms  "
+                              f"p99 {r['p99_us'] / 1e3:>8.1f}ms  errors {r['errors']}", flush=True)
+                finally:
+                    proc.terminate()
+                    proc.wait()
+    finally:
+        postgrest.terminate()
+        postgrest.wait()
+
+    if "flask" in results["servers"] and "asgi" in results["servers"]:
+        print("\nThroughput ratio asgi / flask:")
+        for name in args.scenarios.split(","):
+            ratios = [f"c{c}: {results['servers']['asgi'][name][f'c{c}']['throughput_rps'] / results['servers']['flask'][name][f'c{c}']['throughput_rps']:.2f}x"
+                      for c in levels]
+            print(f"  {name:<13}" + "  ".join(ratios))
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
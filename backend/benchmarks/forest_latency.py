@@ -0,0 +1,82 @@
+"""
+Single-row inference latency: sklearn path vs the compiled forest.
+
+The "current" path is what /predict used to do per request
+(scaler.transform + model.predict + model.predict_proba); the "compiled" path
+is scaler.transform + CompiledForest.predict_one.
+
+Usage (from backend/):
+    python -m benchmarks.forest_latency --rows 200 --repeat 5
+"""
+
+import argparse
+import time
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from features import eeg_columns
+from forest_compiler import compile_forest
+
+warnings.filterwarnings('ignore', category=UserWarning)
+
+
+def percentiles(samples):
+    """p50/p95/p99/mean in microseconds for a list of second-valued samples."""
+    us = np.asarray(samples) * 1e6
+    return {"p50_us": float(np.percentile(us, 50)),
+            "p95_us": float(np.percentile(us, 95)),
+            "p99_us": float(np.percentile(us, 99)),
+            "mean_us": float(us.mean())}
+
+
+def time_path(fn, rows, repeat):
+    samples = []
+    for _ in range(repeat):
+        for row in rows:
+            t0 = time.perf_counter()
+            fn(row)
+            samples.append(time.perf_counter() - t0)
+    return percentiles(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="models/eeg_only_model.pkl")
+    parser.add_argument("--scaler", default="models/eeg_scaler.pkl")
+    parser.add_argument("--data", default="dataset.csv")
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    scaler = joblib.load(args.scaler)
+    forest = compile_forest(model)
+    rows = pd.read_csv(args.data)[eeg_columns].values[:args.rows].astype(np.float64)
+    rows = [r.reshape(1, -1) for r in rows]
+
+    def current(x):
+        scaled = scaler.transform(x)
+        model.predict(scaled)
+        model.predict_proba(scaled)
+
+    def compiled(x):
+        forest.predict_one(scaler.transform(x)[0])
+
+    # Warm both paths before timing
+    current(rows[0])
+    compiled(rows[0])
+
+    results = {"current": time_path(current, rows, args.repeat),
+               "compiled": time_path(compiled, rows, args.repeat)}
+    print(f"{'path':<10}{'p50 (us)':>12}{'p99 (us)':>12}{'mean (us)':>12}")
+    for name, r in results.items():
+        print(f"{name:<10}{r['p50_us']:>12.1f}{r['p99_us']:>12.1f}{r['mean_us']:>12.1f}")
+    print(f"p50 speedup: {results['current']['p50_us'] / results['compiled']['p50_us']:.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    main()
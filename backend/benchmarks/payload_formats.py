@@ -0,0 +1,103 @@
+"""
+/predict/batch payload formats: bytes on the wire and parse time.
+
+For each batch size the same rows are encoded as JSON records, JSON
+columnar rows, x-eeg-binary float32/float64 and (if pyarrow is installed)
+an Arrow IPC stream. Parse time covers body bytes -> float64 matrix in model
+order, i.e. what the endpoint does before scaling. With ``--end-to-end``
+the full request through the Flask test client is timed as well.
+
+Usage (from backend/):
+    python -m benchmarks.payload_formats --sizes 1,100,1000,10000
+"""
+
+import argparse
+import json
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import binary_payload
+from benchmarks.forest_latency import percentiles
+from features import eeg_columns
+
+warnings.filterwarnings('ignore', category=UserWarning)
+
+
+def _json_matrix(body):
+    # Mirrors app._batch_rows_from_payload + the stacking in score_batch_request
+    from app import _batch_rows_from_payload
+    parsed = _batch_rows_from_payload(json.loads(body))
+    return np.array([values for values, _ in parsed], dtype=np.float64)
+
+
+def formats(rows):
+    out = {
+        "json_records": (json.dumps({"records": [dict(zip(eeg_columns, r)) for r in rows.tolist()]}).encode(),
+                         "application/json", _json_matrix),
+        "json_rows": (json.dumps({"columns": eeg_columns, "rows": rows.tolist()}).encode(),
+                      "application/json", _json_matrix),
+        "eegb_f32": (binary_payload.encode(rows, dtype="float32"), binary_payload.BINARY_CONTENT_TYPE,
+                     lambda body: binary_payload.decode(body).model_rows()),
+        "eegb_f64": (binary_payload.encode(rows, dtype="float64"), binary_payload.BINARY_CONTENT_TYPE,
+                     lambda body: binary_payload.decode(body).model_rows()),
+    }
+    try:
+        out["arrow"] = (binary_payload.encode_arrow(rows), binary_payload.ARROW_CONTENT_TYPE,
+                        lambda body: binary_payload.decode_arrow(body).model_rows())
+    except binary_payload.UnsupportedPayloadError:
+        pass
+    return out
+
+
+def time_calls(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return percentiles(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default="dataset.csv")
+    parser.add_argument("--sizes", default="1,100,1000,10000")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--end-to-end", action="store_true", help="also time POST /predict/batch in-process")
+    args = parser.parse_args()
+
+    data = pd.read_csv(args.data)[eeg_columns].values.astype(np.float64)
+    client = None
+    if args.end_to_end:
+        from local_supabase import LocalSupabase
+        from supabase_config import set_supabase
+        set_supabase(LocalSupabase())
+        import app
+        client = app.create_app().test_client()
+
+    header = f"{'rows':>6}  {'format':<13}{'bytes':>11}{'vs json':>9}{'parse p50 (us)':>16}{'speedup':>9}"
+    if client is not None:
+        header += f"{'request p50 (us)':>18}"
+    print(header)
+    for size in [int(s) for s in args.sizes.split(",")]:
+        rows = np.resize(data, (size, data.shape[1]))
+        base_bytes = base_parse = None
+        for name, (body, content_type, parse) in formats(rows).items():
+            parse(body)  # warm up
+            r = time_calls(lambda: parse(body), args.repeat)
+            if base_bytes is None:
+                base_bytes, base_parse = len(body), r["p50_us"]
+            line = (f"{size:>6}  {name:<13}{len(body):>11}{len(body) / base_bytes:>8.2f}x"
+                    f"{r['p50_us']:>16.1f}{base_parse / r['p50_us']:>8.1f}x")
+            if client is not None:
+                post = lambda: client.post("/predict/batch", data=body, content_type=content_type)
+                assert post().status_code == 200
+                line += f"{time_calls(post, max(3, args.repeat // 4))['p50_us']:>18.1f}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+"""
+Load generator and regression gate for the Flask prediction service.
+
+Two kinds of measurements:
+
+* stages -- the pieces of a /predict request timed in isolation: feature
+  extraction, scaling, forest inference, and the per-record cost of the
+  write-behind DB path (submit + batched insert, drained with flush()).
+* scenarios -- whole requests (/predict, /predict/batch, /assessments,
+  /assessments/<patient_id>, /assessments/stats) issued from N concurrent
+  clients, reporting throughput and p50/p95/p99 latency per concurrency level.
+
+By default requests go through the Flask test client in this process, with
+Supabase replaced by LocalSupabase (``--db-latency`` seconds per round trip)
+and pre-seeded with assessments. With ``--url`` the scenarios are sent over
+HTTP to a running server instead, which uses whatever database it is
+configured with; stages are always timed in-process.
+
+Payloads come from frontend/public/sample_eeg.json and dataset.csv rows.
+
+    python -m benchmarks.service_load --save-baseline benchmarks/baseline.json
+    python -m benchmarks.service_load --baseline benchmarks/baseline.json --threshold 0.2
+
+With ``--baseline`` the run exits with status 1 if any stage or scenario p50
+is slower than the baseline by more than its threshold (``--threshold`` for
+all, ``--stage-threshold inference=0.5`` per stage or scenario).
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from benchmarks.forest_latency import percentiles
+from features import eeg_columns, extractor
+
+warnings.filterwarnings('ignore', category=UserWarning)
+
+SAMPLE_EEG = os.path.join(os.path.dirname(__file__), "..", "..", "frontend", "public", "sample_eeg.json")
+SEED_PATIENTS = 50
+
+
+# ---------------------------
+# Payloads
+# ---------------------------
+def load_eeg_records(data_path, n_rows):
+    """The sample EEG record followed by ``n_rows`` dataset rows, as channel dicts."""
+    records = []
+    if os.path.exists(SAMPLE_EEG):
+        with open(SAMPLE_EEG, "r", encoding="utf-8") as f:
+            records.append(json.load(f))
+    rows = pd.read_csv(data_path, usecols=eeg_columns, nrows=n_rows)
+    records.extend(rows.to_dict(orient="records"))
+    return records
+
+
+def predict_payload(eeg, i):
+    return {
+        "eeg": eeg,
+        "user_info": {"patientId": f"BENCH{i % SEED_PATIENTS:04d}", "age": "9",
+                      "gender": "male", "education": "primary"},
+        "medical_history": {},
+        "questions": [],
+    }
+
+
+def build_scenarios(records, batch_rows):
+    """name -> callable(i) returning (method, path, json body or None)."""
+    def predict(i):
+        return "POST", "/predict", predict_payload(records[i % len(records)], i)
+
+    def batch(i):
+        start = (i * batch_rows) % len(records)
+        rows = [records[(start + k) % len(records)] for k in range(batch_rows)]
+        return "POST", "/predict/batch", {"records": rows}
+
+    return {
+        "predict": predict,
+        "predict_batch": batch,
+        "assessments": lambda i: ("GET", "/assessments?view=summary&limit=100", None),
+        "patient_assessments": lambda i: ("GET", f"/assessments/BENCH{i % SEED_PATIENTS:04d}", None),
+        "stats": lambda i: ("GET", "/assessments/stats", None),
+    }
+
+
+# ---------------------------
+# Transports
+# ---------------------------
+class InProcessTransport:
+    """Flask test client per thread (test clients are not shared across threads)."""
+
+    def __init__(self, flask_app):
+        self.app = flask_app
+        self._local = threading.local()
+
+    def request(self, method, path, body):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        return response.status_code
+
+
+class HttpTransport:
+    def __init__(self, base_url, timeout=30.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def request(self, method, path, body):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+def run_level(transport, make_request, concurrency, n_requests):
+    """Issue ``n_requests`` from ``concurrency`` threads; latency percentiles and throughput."""
+    counter = iter(range(n_requests))
+    counter_lock = threading.Lock()
+    samples = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+
+    def client(slot):
+        while True:
+            with counter_lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            method, path, body = make_request(i)
+            t0 = time.perf_counter()
+            status = transport.request(method, path, body)
+            samples[slot].append(time.perf_counter() - t0)
+            if status >= 400:
+                errors[slot] += 1
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+    wall = time.perf_counter() - t0
+    result = percentiles([s for slot in samples for s in slot])
+    result["throughput_rps"] = n_requests / wall
+    result["errors"] = sum(errors)
+    return result
+
+
+# ---------------------------
+# Stages
+# ---------------------------
+def _time(fn, args_list):
+    samples = []
+    for args in args_list:
+        t0 = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - t0)
+    return percentiles(samples)
+
+
+def measure_stages(app_module, records, n_samples, db_batch=50):
+    model = app_module.registry.get()
+    records = [records[i % len(records)] for i in range(n_samples)]
+    # extract reuses one per-thread buffer; copy so each row keeps its own values
+    rows = [extractor.extract(r).copy() for r in records]
+    scaled = [model.scaler.transform(r) for r in rows]
+
+    stages = {
+        "extract": _time(extractor.extract, [(r,) for r in records]),
+        "scale": _time(model.scaler.transform, [(r,) for r in rows]),
+        "inference": _time(model.forest.predict, [(s,) for s in scaled]),
+    }
+
+    # Per-record cost of the write-behind path: submit a batch, wait for the insert
+    writer = app_module.get_writer()
+    samples = []
+    for start in range(0, n_samples, db_batch):
+        batch = records[start:start + db_batch]
+        t0 = time.perf_counter()
+        for i, eeg in enumerate(batch):
+            writer.submit(app_module.build_assessment_record(predict_payload(eeg, start + i), "ADHD"))
+        writer.flush()
+        samples.extend([(time.perf_counter() - t0) / len(batch)] * len(batch))
+    stages["db_write"] = percentiles(samples)
+    return stages
+
+
+# ---------------------------
+# Baselines
+# ---------------------------
+def compare(result, baseline, threshold, overrides, noise_floor_us):
+    """Human-readable regressions of p50 latency beyond the allowed ratio."""
+    regressions = []
+
+    def check(name, now, before):
+        limit = overrides.get(name.split("@")[0], threshold)
+        if now["p50_us"] > before["p50_us"] * (1 + limit) and now["p50_us"] - before["p50_us"] > noise_floor_us:
+            regressions.append(f"{name}: p50 {before['p50_us']:.1f}us -> {now['p50_us']:.1f}us "
+                               f"(+{now['p50_us'] / before['p50_us'] - 1:.0%}, allowed +{limit:.0%})")
+
+    for name, now in result.get("stages", {}).items():
+        if name in baseline.get("stages", {}):
+            check(name, now, baseline["stages"][name])
+    for name, levels in result.get("scenarios", {}).items():
+        for level, now in levels.items():
+            before = baseline.get("scenarios", {}).get(name, {}).get(level)
+            if before:
+                check(f"{name}@{level}", now, before)
+    return regressions
+
+
+def _parse_overrides(values):
+    overrides = {}
+    for value in values:
+        name, _, ratio = value.partition("=")
+        overrides[name] = float(ratio)
+    return overrides
+
+
+def setup_in_process(db_latency, seed_rows, records=()):
+    """Import the app against a seeded LocalSupabase and a throwaway journal.
+
+    Seeded rows carry EEG from ``records`` and the labels the model emits.
+    """
+    from local_supabase import LocalSupabase
+    from supabase_config import set_supabase
+
+    os.environ.setdefault("ASSESSMENT_JOURNAL", os.path.join(tempfile.mkdtemp(), "journal.jsonl"))
+    client = LocalSupabase()
+    import app as app_module
+    for i in range(seed_rows):
+        eeg = records[i % len(records)] if records else {}
+        record = app_module.build_assessment_record(predict_payload(eeg, i), ["ADHD", "Non_ADHD"][i % 2])
+        client.table("patient_assessments").insert(record).execute()
+    client.latency = db_latency
+    set_supabase(client)
+    return app_module, app_module.create_app(warm_up=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="benchmark a running server over HTTP instead of in-process")
+    parser.add_argument("--data", default="dataset.csv")
+    parser.add_argument("--payload-rows", type=int, default=500, help="dataset rows used as EEG payloads")
+    parser.add_argument("--batch-rows", type=int, default=100, help="rows per /predict/batch request")
+    parser.add_argument("--scenarios", default="predict,predict_batch,assessments,patient_assessments,stats")
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario and level")
+    parser.add_argument("--stage-samples", type=int, default=500)
+    parser.add_argument("--skip-stages", action="store_true")
+    parser.add_argument("--db-latency", type=float, default=0.005, help="seconds per LocalSupabase round trip")
+    parser.add_argument("--seed-rows", type=int, default=1000, help="assessments pre-loaded into LocalSupabase")
+    parser.add_argument("--save-baseline", help="write the results JSON here")
+    parser.add_argument("--baseline", help="compare against this results JSON and fail on regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p50 slowdown ratio")
+    parser.add_argument("--stage-threshold", action="append", default=[], metavar="NAME=RATIO")
+    parser.add_argument("--noise-floor-us", type=float, default=20.0,
+                        help="ignore p50 increases smaller than this")
+    args = parser.parse_args(argv)
+
+    records = load_eeg_records(args.data, args.payload_rows)
+    app_module, flask_app = setup_in_process(args.db_latency, args.seed_rows, records)
+    transport = HttpTransport(args.url) if args.url else InProcessTransport(flask_app)
+
+    result = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "mode": "http" if args.url else "in-process",
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "db_latency_seconds": None if args.url else args.db_latency,
+        "stages": {},
+        "scenarios": {},
+    }
+    if not args.skip_stages:
+        result["stages"] = measure_stages(app_module, records, args.stage_samples)
+        print(f"{'stage':<22}{'p50 (us)':>12}{'p95 (us)':>12}{'p99 (us)':>12}")
+        for name, r in result["stages"].items():
+            print(f"{name:<22}{r['p50_us']:>12.1f}{r['p95_us']:>12.1f}{r['p99_us']:>12.1f}")
+
+    scenarios = build_scenarios(records, args.batch_rows)
+    levels = [int(c) for c in args.concurrency.split(",")]
+    print(f"\n{'scenario':<22}{'conc':>6}{'rps':>10}{'p50 (ms)':>11}{'p95 (ms)':>11}{'p99 (ms)':>11}{'errors':>8}")
+    for name in args.scenarios.split(","):
+        make_request = scenarios[name]
+        run_level(transport, make_request, 1, min(5, args.requests))  # warm caches and connections
+        result["scenarios"][name] = {}
+        for c in levels:
+            r = run_level(transport, make_request, c, args.requests)
+            result["scenarios"][name][f"c{c}"] = r
+            print(f"{name:<22}{c:>6}{r['throughput_rps']:>10.1f}{r['p50_us'] / 1e3:>11.2f}"
+                  f"{r['p95_us'] / 1e3:>11.2f}{r['p99_us'] / 1e3:>11.2f}{r['errors']:>8}")
+
+    if not args.url:
+        app_module.get_writer().flush()
+        result["writer"] = dict(app_module.get_writer().stats)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.save_baseline) or ".", exist_ok=True)
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nSaved results to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold,
+                              _parse_overrides(args.stage_threshold), args.noise_floor_us)
+        if regressions:
+            print("\nRegressions against " + args.baseline + ":")
+            for line in regressions:
+                print("  " + line)
+            return 1
+        print(f"\nNo regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+Top-k EEG similarity search latency at increasing index sizes.
+
+Builds a similarity.SimilarityIndex from dataset.csv rows (jittered copies
+beyond the dataset size) and times single queries. With ``--trees`` the
+same data is also searched with scikit-learn's KDTree and BallTree for
+comparison (build time and query latency). Brute-force results are
+checked against a float64 reference.
+
+Usage (from backend/):
+    python -m benchmarks.similarity_search --sizes 10000,100000,1000000
+"""
+
+import argparse
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.forest_latency import percentiles
+from features import eeg_columns
+from similarity import SimilarityIndex
+
+warnings.filterwarnings('ignore', category=UserWarning)
+
+
+def build(model, data, size, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = np.resize(data, (size, data.shape[1]))
+    rows = rows + rng.normal(0, 1, rows.shape) * (np.arange(size) >= len(data))[:, None]
+    index = SimilarityIndex(lambda: model, dataset_path=None)
+    t0 = time.perf_counter()
+    for start in range(0, size, 100000):
+        chunk = rows[start:start + 100000]
+        index.add(chunk, "assessment", ["ADHD"] * len(chunk), [(None, None, None)] * len(chunk))
+    return index, rows, time.perf_counter() - t0
+
+
+def time_queries(fn, queries):
+    fn(queries[0])
+    samples = []
+    for q in queries:
+        t0 = time.perf_counter()
+        fn(q)
+        samples.append(time.perf_counter() - t0)
+    return percentiles(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default="dataset.csv")
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--trees", action="store_true", help="also time sklearn KDTree / BallTree")
+    args = parser.parse_args()
+
+    from model_registry import ModelRegistry
+    model = ModelRegistry().get()
+    data = pd.read_csv(args.data)[eeg_columns].values.astype(np.float64)
+    rng = np.random.default_rng(1)
+    queries = data[rng.integers(0, len(data), args.queries)] + rng.normal(0, 2, (args.queries, data.shape[1]))
+
+    print(f"{'size':>8}  {'method':<12}{'build (s)':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}  exact")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        index, rows, build_seconds = build(model, data, size)
+        r = time_queries(lambda q: index.search(q, k=args.k), queries)
+
+        # float64 reference for the first few queries
+        scaled = model.scaler.transform(rows)
+        exact = True
+        for q in queries[:5]:
+            qs = model.scaler.transform(q.reshape(1, -1))[0]
+            expected = np.sort(np.sqrt(((scaled - qs) ** 2).sum(axis=1)))[:args.k]
+            got = [hit["distance"] for hit in index.search(q, k=args.k)]
+            exact &= np.allclose(got, expected, atol=1e-4)
+        print(f"{size:>8}  {'brute f32':<12}{build_seconds:>10.2f}{r['p50_us'] / 1000:>10.2f}"
+              f"{r['p99_us'] / 1000:>10.2f}  {exact}")
+
+        if args.trees:
+            from sklearn.neighbors import BallTree, KDTree
+            scaled_queries = model.scaler.transform(queries)
+            for name, cls in (("kd-tree", KDTree), ("ball tree", BallTree)):
+                t0 = time.perf_counter()
+                tree = cls(scaled)
+                built = time.perf_counter() - t0
+                r = time_queries(lambda q: tree.query(q.reshape(1, -1), k=args.k), scaled_queries)
+                print(f"{size:>8}  {name:<12}{built:>10.2f}{r['p50_us'] / 1000:>10.2f}{r['p99_us'] / 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
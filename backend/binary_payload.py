@@ -0,0 +1,185 @@
+"""
+Compact binary EEG payloads for /predict and /predict/batch.
+
+Requests pick the format with Content-Type; JSON stays the default.
+
+``application/x-eeg-binary`` -- little-endian, fixed 16-byte header:
+
+    offset  size  field
+    0       4     magic b"EEGB"
+    4       1     format version (1)
+    5       1     value type: b"f" float32 or b"d" float64
+    6       2     n_channels (uint16)
+    8       4     n_rows (uint32)
+    12      4     meta_len (uint32), UTF-8 JSON object, 0 if absent
+    16      ...   channel names, each a uint8 length + UTF-8 bytes
+    ...     ...   meta JSON (e.g. user_info / medical_history / questions)
+    ...     ...   zero padding to a multiple of 8 bytes
+    ...     ...   n_rows x n_channels values, row-major
+
+The values are decoded with ``np.frombuffer`` as a view of the request body;
+a float64 payload already in model channel order reaches the scaler without
+a copy. Other layouts cost one reorder/convert pass.
+
+``application/vnd.apache.arrow.stream`` -- an Arrow IPC stream with one
+float column per channel and an optional ``meta`` schema metadata entry.
+Needs pyarrow, which is optional; without it these requests get 415.
+"""
+
+import json
+import struct
+
+import numpy as np
+
+from features import eeg_columns, MissingChannelsError
+
+BINARY_CONTENT_TYPE = "application/x-eeg-binary"
+ARROW_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+
+MAGIC = b"EEGB"
+VERSION = 1
+_HEADER = struct.Struct("<4sBcHII")
+_DTYPES = {b"f": np.dtype("<f4"), b"d": np.dtype("<f8")}
+_CODES = {np.dtype("<f4"): b"f", np.dtype("<f8"): b"d"}
+
+
+class UnsupportedPayloadError(ValueError):
+    """Raised for a payload format this server cannot decode (e.g. Arrow without pyarrow)."""
+
+
+class EEGPayload:
+    """Decoded payload: channel names, an (n_rows, n_channels) array and the meta dict."""
+
+    def __init__(self, columns, values, meta=None):
+        self.columns = list(columns)
+        self.values = values
+        self.meta = meta or {}
+
+    def model_rows(self, columns=eeg_columns):
+        """float64 (n_rows, len(columns)) matrix in model order; a view when no reorder is needed."""
+        if self.columns == list(columns):
+            return np.asarray(self.values, dtype=np.float64)
+        missing = [col for col in columns if col not in self.columns]
+        if missing:
+            raise MissingChannelsError(missing)
+        positions = [self.columns.index(col) for col in columns]
+        return np.asarray(self.values[:, positions], dtype=np.float64)
+
+
+def media_type(content_type):
+    return (content_type or "").split(";")[0].strip().lower()
+
+
+def is_binary_content_type(content_type):
+    """True for the Content-Types this module decodes."""
+    return media_type(content_type) in (BINARY_CONTENT_TYPE, ARROW_CONTENT_TYPE)
+
+
+# ---------------------------
+# application/x-eeg-binary
+# ---------------------------
+def encode(values, columns=eeg_columns, dtype="float32", meta=None):
+    """Encode an (n_rows, n_channels) array (or one row) as an x-eeg-binary body."""
+    dtype = np.dtype(dtype).newbyteorder("<")
+    if dtype not in _CODES:
+        raise ValueError("dtype must be float32 or float64")
+    values = np.ascontiguousarray(np.atleast_2d(values), dtype=dtype)
+    if values.shape[1] != len(columns):
+        raise ValueError(f"Expected {len(columns)} values per row, found {values.shape[1]}")
+
+    names = b"".join(bytes([len(col.encode())]) + col.encode() for col in columns)
+    meta_bytes = json.dumps(meta).encode() if meta else b""
+    head = _HEADER.pack(MAGIC, VERSION, _CODES[dtype], len(columns), values.shape[0], len(meta_bytes))
+    head += names + meta_bytes
+    return head + b"\0" * (-len(head) % 8) + values.tobytes()
+
+
+def decode(body):
+    """Decode an x-eeg-binary body; raises ValueError when it is malformed."""
+    body = memoryview(body)
+    if len(body) < _HEADER.size:
+        raise ValueError("Binary EEG payload is shorter than its header")
+    magic, version, code, n_channels, n_rows, meta_len = _HEADER.unpack_from(body)
+    if magic != MAGIC:
+        raise ValueError("Not an EEGB payload (bad magic)")
+    if version != VERSION:
+        raise ValueError(f"Unsupported EEGB version {version}")
+    if code not in _DTYPES:
+        raise ValueError(f"Unsupported EEGB value type {code!r}")
+
+    pos = _HEADER.size
+    columns = []
+    try:
+        for _ in range(n_channels):
+            size = body[pos]
+            columns.append(bytes(body[pos + 1:pos + 1 + size]).decode("utf-8"))
+            pos += 1 + size
+    except (IndexError, UnicodeDecodeError):
+        raise ValueError("Malformed EEGB channel names")
+
+    meta = None
+    if meta_len:
+        try:
+            meta = json.loads(bytes(body[pos:pos + meta_len]))
+        except ValueError:
+            raise ValueError("EEGB meta is not valid JSON")
+        if not isinstance(meta, dict):
+            raise ValueError("EEGB meta must be a JSON object")
+        pos += meta_len
+    pos += -pos % 8
+
+    dtype = _DTYPES[code]
+    expected = n_rows * n_channels * dtype.itemsize
+    if len(body) - pos != expected:
+        raise ValueError(f"EEGB body holds {len(body) - pos} value bytes, header implies {expected}")
+    values = np.frombuffer(body, dtype=dtype, count=n_rows * n_channels, offset=pos)
+    return EEGPayload(columns, values.reshape(n_rows, n_channels), meta)
+
+
+# ---------------------------
+# Arrow IPC stream (optional)
+# ---------------------------
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+    except ImportError:
+        raise UnsupportedPayloadError("Arrow payloads need pyarrow installed on the server")
+    return pyarrow
+
+
+def encode_arrow(values, columns=eeg_columns, meta=None):
+    pa = _pyarrow()
+    values = np.atleast_2d(values)
+    table = pa.table({col: values[:, i] for i, col in enumerate(columns)})
+    if meta:
+        table = table.replace_schema_metadata({"meta": json.dumps(meta)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def decode_arrow(body):
+    pa = _pyarrow()
+    try:
+        table = pa.ipc.open_stream(pa.py_buffer(body)).read_all()
+    except pa.ArrowInvalid as e:
+        raise ValueError(f"Malformed Arrow stream: {e}")
+    meta = None
+    if table.schema.metadata and b"meta" in table.schema.metadata:
+        meta = json.loads(table.schema.metadata[b"meta"])
+    # Arrow is columnar; the scaler wants rows, so one stacking copy is unavoidable
+    values = np.column_stack([table.column(i).to_numpy() for i in range(table.num_columns)]) \
+        if table.num_columns else np.empty((table.num_rows, 0))
+    return EEGPayload(table.column_names, values, meta)
+
+
+def decode_body(content_type, body):
+    """Decode a request body by Content-Type (see is_binary_content_type)."""
+    kind = media_type(content_type)
+    if kind == BINARY_CONTENT_TYPE:
+        return decode(body)
+    if kind == ARROW_CONTENT_TYPE:
+        return decode_arrow(body)
+    raise UnsupportedPayloadError(f"Unsupported Content-Type {kind!r}")
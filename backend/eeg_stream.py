@@ -0,0 +1,182 @@
+"""
+Incremental parsing of large CSV / NDJSON EEG uploads.
+
+Reads a binary stream (e.g. Flask's ``request.stream``) in fixed-size chunks
+and yields float64 matrices of at most ``chunk_rows`` rows in eeg_columns
+order, so a recording is scored chunk by chunk without ever holding the whole
+file in memory. Rows that cannot be parsed (bad UTF-8, non-numeric or
+non-finite values, over-long lines) are reported individually rather than
+aborting the stream.
+"""
+
+import csv
+import io
+import json
+
+import numpy as np
+
+from features import eeg_columns, extractor, MissingChannelsError
+
+READ_SIZE = 64 * 1024
+DEFAULT_CHUNK_ROWS = 1024
+# A 19-channel row is well under 1 KiB; anything this long has no newline to end it
+MAX_LINE_BYTES = 1024 * 1024
+
+
+class RowChunk:
+    """One parsed slice of a recording.
+
+    ``values`` holds the good rows; ``row_numbers`` gives each good row's
+    0-based data row index in the upload, and ``errors`` lists
+    (row_number, message) for rows that were skipped.
+    """
+
+    def __init__(self, values, row_numbers, errors):
+        self.values = values
+        self.row_numbers = row_numbers
+        self.errors = errors
+
+
+class BadLine:
+    """Stands in for a line that could not be read; ``error`` says why."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def _decode(line, max_line):
+    if len(line) > max_line:
+        return BadLine(f"Line longer than {max_line} bytes")
+    try:
+        return line.rstrip(b"\r").decode("utf-8")
+    except UnicodeDecodeError as e:
+        return BadLine(f"Line is not valid UTF-8: {e.reason} at byte {e.start}")
+
+
+def iter_lines(stream, read_size=READ_SIZE, max_line=MAX_LINE_BYTES):
+    """Yield decoded text lines from a binary stream, reading fixed-size blocks.
+
+    Lines that are not UTF-8 or longer than ``max_line`` bytes come out as a
+    BadLine instead; the rest of an over-long line is skipped unbuffered.
+    """
+    pending = b""
+    skipping = False
+    while True:
+        block = stream.read(read_size)
+        if not block:
+            break
+        pending += block
+        lines = pending.split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            if skipping:
+                # Tail of an over-long line that was already reported
+                skipping = False
+                continue
+            yield _decode(line, max_line)
+        if len(pending) > max_line:
+            if not skipping:
+                yield BadLine(f"Line longer than {max_line} bytes")
+                skipping = True
+            pending = b""
+    if pending and not skipping:
+        yield _decode(pending, max_line)
+
+
+def _chunks(parsed_rows, chunk_rows):
+    """Group (row_number, values | None, error | None) triples into RowChunks."""
+    buf = np.empty((chunk_rows, len(eeg_columns)), dtype=np.float64)
+    numbers, errors = [], []
+    n = 0
+    for row_number, values, error in parsed_rows:
+        if error is not None:
+            errors.append((row_number, error))
+            continue
+        buf[n] = values
+        numbers.append(row_number)
+        n += 1
+        if n == chunk_rows:
+            yield RowChunk(buf[:n].copy(), numbers, errors)
+            numbers, errors, n = [], [], 0
+    if n or errors:
+        yield RowChunk(buf[:n].copy(), numbers, errors)
+
+
+def iter_csv_chunks(stream, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Parse a CSV upload whose header must contain every EEG channel.
+
+    Extra columns (e.g. ``Class`` or ``ID``) are ignored. Raises
+    MissingChannelsError before any row is read if the header is incomplete.
+    """
+    lines = iter_lines(stream)
+    header_line = next((line for line in lines if isinstance(line, BadLine) or line.strip()), None)
+    if header_line is None:
+        raise ValueError("Empty CSV upload")
+    if isinstance(header_line, BadLine):
+        raise ValueError(f"Unreadable CSV header: {header_line.error}")
+    header = [h.strip() for h in next(csv.reader(io.StringIO(header_line)))]
+    missing = [col for col in eeg_columns if col not in header]
+    if missing:
+        raise MissingChannelsError(missing)
+    positions = [header.index(col) for col in eeg_columns]
+
+    def parsed():
+        row_number = 0
+        for line in lines:
+            if isinstance(line, BadLine):
+                yield row_number, None, line.error
+                row_number += 1
+                continue
+            if not line.strip():
+                continue
+            fields = line.split(",")
+            if len(fields) != len(header):
+                # Quoted fields are rare in EEG exports; fall back to the csv module
+                fields = next(csv.reader(io.StringIO(line)))
+            try:
+                if len(fields) != len(header):
+                    raise ValueError(f"Expected {len(header)} fields, found {len(fields)}")
+                values = [float(fields[i]) for i in positions]
+                if not np.isfinite(values).all():
+                    raise ValueError("EEG values must be finite")
+                yield row_number, values, None
+            except ValueError as e:
+                yield row_number, None, str(e)
+            row_number += 1
+
+    return _chunks(parsed(), chunk_rows)
+
+
+def iter_ndjson_chunks(stream, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Parse an NDJSON upload: one EEG object (or {"eeg": {...}}) per line."""
+    def parsed():
+        row_number = 0
+        for line in iter_lines(stream):
+            if isinstance(line, BadLine):
+                yield row_number, None, line.error
+                row_number += 1
+                continue
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if isinstance(record, dict) and isinstance(record.get("eeg"), dict):
+                    record = record["eeg"]
+                if not isinstance(record, dict):
+                    raise ValueError("Line must be a JSON object of EEG channel values")
+                yield row_number, extractor.extract_row(record), None
+            except (TypeError, ValueError) as e:
+                yield row_number, None, str(e)
+            row_number += 1
+
+    return _chunks(parsed(), chunk_rows)
+
+
+def iter_upload_chunks(stream, content_type, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Dispatch on the upload's Content-Type (text/csv or application/x-ndjson)."""
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type in ("text/csv", "application/csv"):
+        return iter_csv_chunks(stream, chunk_rows)
+    if content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        return iter_ndjson_chunks(stream, chunk_rows)
+    raise ValueError("Content-Type must be text/csv or application/x-ndjson")
@@ -0,0 +1,151 @@
+"""
+EEG feature extraction without pandas.
+
+Packs the 19-channel ``eeg`` dict from a request straight into a float64
+buffer in the fixed ``eeg_columns`` order. Used by the /predict hot path in
+app.py and by main.py's final_prediction, replacing the one-row DataFrame
+round trip.
+
+``decode_eeg_blobs`` is the bulk counterpart for stored assessments: it
+unpacks a page of ``eeg_data`` JSON values into one matrix.
+"""
+
+import json
+import operator
+import threading
+
+import numpy as np
+
+# EEG feature columns (19 channels - standard 10-20 system), in model order
+eeg_columns = ['Fp1', 'Fp2', 'F3', 'F4', 'C3', 'C4', 'P3', 'P4', 'O1', 'O2',
+               'F7', 'F8', 'T7', 'T8', 'P7', 'P8', 'Fz', 'Cz', 'Pz']
+
+
+class MissingChannelsError(ValueError):
+    """Raised when an EEG record lacks one or more required channels."""
+
+    def __init__(self, missing):
+        self.missing = missing
+        super().__init__(f"Missing EEG columns: {missing}")
+
+
+class InvalidEEGError(ValueError):
+    """Raised when an EEG record is not an object of finite numeric channel values."""
+
+
+class EEGFeatureExtractor:
+    """Validates EEG dicts and packs them into a reusable (1, n_channels) buffer.
+
+    Each thread gets its own preallocated buffer, so the array returned by
+    ``extract`` is only valid until the same thread calls ``extract`` again;
+    copy it if it must outlive the request.
+    """
+
+    def __init__(self, columns=eeg_columns):
+        self.columns = tuple(columns)
+        self._column_set = frozenset(self.columns)
+        self._local = threading.local()
+
+    def _buffer(self):
+        buf = getattr(self._local, "buf", None)
+        if buf is None:
+            buf = self._local.buf = np.empty((1, len(self.columns)), dtype=np.float64)
+        return buf
+
+    def missing(self, record):
+        """Channels absent from ``record``, in column order."""
+        if self._column_set.issubset(record.keys()):
+            return []
+        return [col for col in self.columns if col not in record]
+
+    def extract(self, record):
+        """Return a (1, n_channels) float64 view of ``record``.
+
+        Raises MissingChannelsError for absent channels and InvalidEEGError
+        for a non-dict record or non-numeric / non-finite values; both are
+        ValueErrors and map to 400.
+        """
+        if not isinstance(record, dict):
+            raise InvalidEEGError("EEG data must be an object of channel values")
+        missing = self.missing(record)
+        if missing:
+            raise MissingChannelsError(missing)
+        row = self._buffer()[0]
+        try:
+            for i, col in enumerate(self.columns):
+                row[i] = float(record[col])
+        except (TypeError, ValueError):
+            raise InvalidEEGError(f"EEG channel {col} must be a number, got {record[col]!r}") from None
+        if not np.isfinite(row).all():
+            bad = [c for c, v in zip(self.columns, row) if not np.isfinite(v)]
+            raise InvalidEEGError(f"EEG values must be finite: {bad}")
+        return self._local.buf
+
+    def extract_row(self, record):
+        """Like ``extract`` but returns a fresh 1-D array the caller owns."""
+        return self.extract(record)[0].copy()
+
+
+# Shared extractor for the standard channel layout
+extractor = EEGFeatureExtractor()
+
+
+# ---------------------------
+# Stored assessments
+# ---------------------------
+def _parse_blobs(blobs):
+    """Decode a page of eeg_data values (JSON text or already-decoded objects) in one pass."""
+    texts = [i for i, blob in enumerate(blobs) if isinstance(blob, str)]
+    decoded = list(blobs)
+    if not texts:
+        return decoded
+    try:
+        parsed = json.loads("[" + ",".join(blobs[i] for i in texts) + "]")
+        if len(parsed) != len(texts):
+            raise ValueError("eeg_data holds more than one JSON value")
+        for i, value in zip(texts, parsed):
+            decoded[i] = value
+    except ValueError:
+        # One bad blob spoils the joined document; fall back to row by row
+        for i in texts:
+            try:
+                decoded[i] = json.loads(blobs[i])
+            except ValueError:
+                decoded[i] = None
+    return decoded
+
+
+def decode_eeg_blobs(blobs, columns=eeg_columns):
+    """Bulk-decode stored ``eeg_data`` values into (matrix, index).
+
+    ``matrix`` holds float64 rows in ``columns`` order for the values that
+    have every channel as a finite number; ``index`` gives their positions in
+    ``blobs``.
+    """
+    channels = operator.itemgetter(*columns)
+    records = _parse_blobs(blobs)
+    values, index = [], []
+    for i, record in enumerate(records):
+        try:
+            values.append(channels(record))
+            index.append(i)
+        except (KeyError, TypeError):
+            continue
+    if not values:
+        return np.empty((0, len(columns))), []
+    try:
+        matrix = np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        # Non-numeric values somewhere in the page: convert row by row
+        good, kept = [], []
+        for i, row in zip(index, values):
+            try:
+                good.append([float(v) for v in row])
+                kept.append(i)
+            except (TypeError, ValueError):
+                continue
+        matrix, index = np.array(good, dtype=np.float64).reshape(-1, len(columns)), kept
+    finite = np.isfinite(matrix).all(axis=1)
+    if not finite.all():
+        matrix, index = matrix[finite], [i for i, ok in zip(index, finite) if ok]
+    return matrix, index
@@ -0,0 +1,282 @@
+"""
+Compile a fitted RandomForestClassifier into flat NumPy node arrays.
+
+All trees are concatenated into contiguous arrays (split feature, threshold,
+child pair and normalized leaf class distribution per node). The evaluator
+walks every tree at once, one depth level per step, and returns the label and
+the class probabilities from a single traversal instead of the separate
+``predict`` + ``predict_proba`` passes through sklearn's per-call validation.
+
+Probabilities are accumulated tree by tree in estimator order, exactly as
+sklearn does with ``n_jobs=1``, so the results are bit-for-bit identical.
+
+Compiled forests can be saved as a flat ``.forest`` artifact: a small header
+(magic, format version, JSON layout with a SHA-256 of the payload) followed
+by the raw, 64-byte aligned node arrays. ``load_forest`` memory-maps the file
+read-only, so every worker process serving the same artifact shares one
+page-cache copy and startup does no unpickling.
+
+Usage:
+    python forest_compiler.py models/eeg_only_model.pkl --out models/eeg_only_model.forest
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+ARTIFACT_MAGIC = b"ADHDFRST"
+ARTIFACT_VERSION = 1
+_PREAMBLE = struct.Struct("<8sII")  # magic, format version, header length
+_ALIGN = 64
+_ARRAYS = ("feature", "threshold", "children", "value", "roots")
+
+
+class ArtifactError(ValueError):
+    """Raised when a compiled forest artifact is corrupt or incompatible."""
+
+
+class CompiledForest:
+    """Array-based evaluator for a compiled random forest."""
+
+    def __init__(self, feature, threshold, children, value, roots, max_depth, classes, metadata=None):
+        self.feature = feature        # (n_nodes,) int32, 0 for leaves
+        self.threshold = threshold    # (n_nodes,) float64
+        self.children = children      # (n_nodes, 2) int32 [left, right]; leaves point at themselves
+        self.value = value            # (n_nodes, n_classes) float64 leaf class distributions
+        self.roots = roots            # (n_trees,) int32 root node of each tree
+        self.max_depth = int(max_depth)
+        self.classes_ = np.asarray(classes)
+        self.metadata = metadata or {}
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    def _leaves(self, X):
+        """Leaf index of every tree for every row: (n_rows, n_trees)."""
+        # sklearn evaluates trees on float32 inputs; match it so splits agree exactly
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        flat = X.ravel()
+        children = self.children.ravel()
+        if X.shape[0] == 1:
+            # Single-row fast path: 1-D node vector, no per-row offsets
+            node = self.roots
+            for _ in range(self.max_depth):
+                go_right = flat.take(self.feature.take(node)) > self.threshold.take(node)
+                node = children.take(2 * node + go_right)
+            return node[np.newaxis, :]
+
+        base = (np.arange(X.shape[0]) * X.shape[1])[:, np.newaxis]
+        node = np.broadcast_to(self.roots, (X.shape[0], self.n_trees))
+        for _ in range(self.max_depth):
+            go_right = flat.take(base + self.feature.take(node)) > self.threshold.take(node)
+            node = children.take(2 * node + go_right)
+        return node
+
+    def predict_proba(self, X, chunk_rows=1024):
+        """Class probabilities for a 2-D array of (already scaled) rows."""
+        X = np.asarray(X)
+        out = np.empty((X.shape[0], len(self.classes_)), dtype=np.float64)
+        for start in range(0, X.shape[0], chunk_rows):
+            leaves = self._leaves(X[start:start + chunk_rows])
+            # cumsum accumulates in tree order, matching sklearn's serial sum
+            total = np.cumsum(self.value.take(leaves, axis=0), axis=1)[:, -1]
+            out[start:start + chunk_rows] = total / self.n_trees
+        return out
+
+    def predict(self, X):
+        """Labels and probabilities for a 2-D array of rows in one traversal."""
+        proba = self.predict_proba(X)
+        return self.classes_.take(np.argmax(proba, axis=1)), proba
+
+    def predict_one(self, x):
+        """Label and probability vector for a single scaled row."""
+        labels, proba = self.predict(np.asarray(x).reshape(1, -1))
+        return labels[0], proba[0]
+
+
+def compile_forest(model):
+    """Flatten a fitted single-output RandomForestClassifier into a CompiledForest."""
+    if getattr(model, "n_outputs_", 1) != 1:
+        raise ValueError("Only single-output forests can be compiled")
+
+    n_classes = len(model.classes_)
+    trees = [est.tree_ for est in model.estimators_]
+    sizes = np.array([t.node_count for t in trees])
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    n_nodes = int(sizes.sum())
+
+    feature = np.zeros(n_nodes, dtype=np.int32)
+    threshold = np.zeros(n_nodes, dtype=np.float64)
+    children = np.empty((n_nodes, 2), dtype=np.int32)
+    value = np.empty((n_nodes, n_classes), dtype=np.float64)
+
+    for tree, off, size in zip(trees, offsets, sizes):
+        sl = slice(off, off + size)
+        left = tree.children_left
+        is_leaf = left == -1
+        own = np.arange(off, off + size)
+
+        feature[sl] = np.where(is_leaf, 0, tree.feature)
+        threshold[sl] = tree.threshold
+        children[sl, 0] = np.where(is_leaf, own, left + off)
+        children[sl, 1] = np.where(is_leaf, own, tree.children_right + off)
+
+        # Same normalization as DecisionTreeClassifier.predict_proba
+        proba = tree.value[:, 0, :n_classes].astype(np.float64)
+        normalizer = proba.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        value[sl] = proba / normalizer
+
+    max_depth = max(tree.max_depth for tree in trees)
+    return CompiledForest(feature, threshold, children, value,
+                          offsets.astype(np.int32), max_depth, model.classes_)
+
+
+def _aligned(n):
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def save_forest(forest, path, metadata=None):
+    """Write ``forest`` to ``path`` in the memory-mappable artifact format.
+
+    The file is written to a temporary name and renamed into place, so readers
+    never observe a half-written artifact.
+    """
+    arrays = {name: np.ascontiguousarray(getattr(forest, name)) for name in _ARRAYS}
+    layout = {}
+    offset = 0
+    for name, arr in arrays.items():
+        layout[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+        offset = _aligned(offset + arr.nbytes)
+    payload_size = offset
+
+    digest = hashlib.sha256()
+    for name, arr in arrays.items():
+        digest.update(arr.tobytes())
+        digest.update(b"\0" * (_aligned(arr.nbytes) - arr.nbytes))
+
+    header = json.dumps({
+        "classes": forest.classes_.tolist(),
+        "max_depth": forest.max_depth,
+        "arrays": layout,
+        "payload_size": payload_size,
+        "sha256": digest.hexdigest(),
+        "metadata": metadata or {},
+    }).encode("utf-8")
+    header_end = _aligned(_PREAMBLE.size + len(header))
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREAMBLE.pack(ARTIFACT_MAGIC, ARTIFACT_VERSION, len(header)))
+        f.write(header)
+        f.write(b"\0" * (header_end - _PREAMBLE.size - len(header)))
+        for arr in arrays.values():
+            f.write(arr.tobytes())
+            f.write(b"\0" * (_aligned(arr.nbytes) - arr.nbytes))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_artifact_header(path):
+    """Validate the preamble of an artifact and return (header dict, payload offset)."""
+    with open(path, "rb") as f:
+        preamble = f.read(_PREAMBLE.size)
+        if len(preamble) != _PREAMBLE.size:
+            raise ArtifactError(f"{path}: file too short to be a forest artifact")
+        magic, version, header_len = _PREAMBLE.unpack(preamble)
+        if magic != ARTIFACT_MAGIC:
+            raise ArtifactError(f"{path}: not a compiled forest artifact")
+        if version != ARTIFACT_VERSION:
+            raise ArtifactError(f"{path}: artifact format v{version}, expected v{ARTIFACT_VERSION}")
+        try:
+            header = json.loads(f.read(header_len).decode("utf-8"))
+        except ValueError:
+            raise ArtifactError(f"{path}: corrupt artifact header")
+    return header, _aligned(_PREAMBLE.size + header_len)
+
+
+def load_forest(path, verify=True):
+    """Memory-map a ``.forest`` artifact read-only and return a CompiledForest.
+
+    Fails fast with ArtifactError on a bad magic/version, a size mismatch or,
+    when ``verify`` is true, a payload checksum mismatch.
+    """
+    header, payload_start = read_artifact_header(path)
+    payload_size = header["payload_size"]
+    if os.path.getsize(path) != payload_start + payload_size:
+        raise ArtifactError(f"{path}: expected {payload_start + payload_size} bytes, "
+                            f"found {os.path.getsize(path)}")
+
+    mm = np.memmap(path, dtype=np.uint8, mode="r", offset=payload_start, shape=(payload_size,))
+    if verify and hashlib.sha256(mm).hexdigest() != header["sha256"]:
+        raise ArtifactError(f"{path}: payload checksum mismatch")
+
+    arrays = {}
+    for name in _ARRAYS:
+        spec = header["arrays"][name]
+        arrays[name] = np.ndarray(tuple(spec["shape"]), dtype=np.dtype(spec["dtype"]),
+                                  buffer=mm, offset=spec["offset"])
+    return CompiledForest(arrays["feature"], arrays["threshold"], arrays["children"],
+                          arrays["value"], arrays["roots"], header["max_depth"], header["classes"],
+                          metadata=header.get("metadata"))
+
+
+def verify(model, forest, X):
+    """Check the compiled forest reproduces sklearn's predict_proba and predict on X.
+
+    Returns the maximum absolute probability difference (0.0 when exact).
+    """
+    n_jobs = model.n_jobs
+    model.n_jobs = 1  # serial accumulation so sklearn's float sums are deterministic
+    try:
+        expected = model.predict_proba(X)
+        expected_labels = model.predict(X)
+    finally:
+        model.n_jobs = n_jobs
+    labels, proba = forest.predict(X)
+    if not np.array_equal(labels, expected_labels):
+        raise AssertionError("Compiled forest labels differ from sklearn predict")
+    return float(np.max(np.abs(proba - expected)))
+
+
+if __name__ == "__main__":
+    import joblib
+    import pandas as pd
+    from features import eeg_columns
+
+    parser = argparse.ArgumentParser(description="Compile and verify a RandomForest model")
+    parser.add_argument("model", nargs="?", default="models/eeg_only_model.pkl")
+    parser.add_argument("--scaler", default="models/eeg_scaler.pkl")
+    parser.add_argument("--verify", default="dataset.csv",
+                        help="CSV with eeg_columns to check parity on ('' to skip)")
+    parser.add_argument("--out", help="write a memory-mappable .forest artifact here")
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    forest = compile_forest(model)
+    print(f"Compiled {forest.n_trees} trees, {forest.n_nodes} nodes, max depth {forest.max_depth}")
+
+    if args.verify:
+        data = pd.read_csv(args.verify)
+        X = joblib.load(args.scaler).transform(data[eeg_columns].values)
+        diff = verify(model, forest, X)
+        print(f"Verified on {len(X)} rows from {args.verify}: max |proba diff| = {diff:g}")
+        if diff != 0.0:
+            raise SystemExit("Compiled forest does not match sklearn predict_proba exactly")
+
+    if args.out:
+        save_forest(forest, args.out, metadata={"source": os.path.basename(args.model)})
+        reloaded = load_forest(args.out)
+        if args.verify and not np.array_equal(reloaded.predict_proba(X), forest.predict_proba(X)):
+            raise SystemExit(f"Artifact {args.out} does not reproduce the compiled forest")
+        print(f"Artifact written to {args.out} ({os.path.getsize(args.out)} bytes)")
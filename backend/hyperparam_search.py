@@ -0,0 +1,284 @@
+"""
+Successive-halving hyperparameter search for the EEG RandomForest.
+
+Candidates are sampled from the ``search.space`` grid in train_config.json and
+evaluated with stratified CV on the training split (the test split stays
+untouched for train_pipeline.py). Every candidate starts with
+``min_estimators`` trees; after each rung only the best 1/eta survive and
+their fold models grow by a factor of eta with ``warm_start``, so trees fitted
+at earlier rungs are reused rather than refitted. Fold models are kept on
+disk between rungs, and all (candidate, fold) fits of a rung run in parallel
+on a process pool.
+
+The objective is not accuracy alone:
+
+    objective = cv_mean
+                - latency_weight * max(0, p99_us / latency_slo_us - 1)
+                - size_weight_per_mb * compiled_size_mb
+
+where p99_us is the single-row latency of the compiled forest (the scaler
+adds a fixed cost on top) and compiled_size_mb is the size of its node
+arrays. Every evaluated (candidate, n_estimators) pair is a trial; the best
+trial over all rungs wins, so the search also picks the tree count.
+
+Each finished trial is appended to a JSONL trial log. Re-running with the same
+config resumes: trials already in the log are not refitted.
+
+Usage:
+    python hyperparam_search.py --config train_config.json
+    python hyperparam_search.py --config train_config.json --apply
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import os
+import shutil
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import StratifiedKFold
+
+from benchmarks.forest_latency import time_path
+from forest_compiler import compile_forest
+from train_pipeline import _init_worker, _worker_data, load_config, load_dataset, split_and_scale
+
+DEFAULT_SEARCH = {
+    "n_candidates": 16,
+    "min_estimators": 25,
+    "max_estimators": 400,
+    "eta": 2,
+    "space": {
+        "max_depth": [None, 10, 15, 20, 30],
+        "min_samples_split": [2, 5, 10],
+        "min_samples_leaf": [1, 2, 4],
+        "max_features": ["sqrt", "log2", 0.5],
+    },
+    "latency_slo_us": 500.0,
+    "latency_weight": 0.05,
+    "size_weight_per_mb": 0.001,
+    "latency_rows": 200,
+    "trial_log": "models/search_trials.jsonl",
+    "work_dir": ".cache/search",
+}
+
+
+def search_settings(config):
+    """The search section of ``config`` merged over DEFAULT_SEARCH."""
+    settings = dict(DEFAULT_SEARCH)
+    settings.update(config.get("search") or {})
+    return settings
+
+
+def sample_candidates(space, n, random_state):
+    """Up to ``n`` distinct parameter dicts drawn from the grid ``space``."""
+    names = sorted(space)
+    grid = [dict(zip(names, values)) for values in itertools.product(*(space[k] for k in names))]
+    if len(grid) <= n:
+        return grid
+    picks = np.random.default_rng(random_state).choice(len(grid), size=n, replace=False)
+    return [grid[i] for i in sorted(picks)]
+
+
+def rung_sizes(settings):
+    """n_estimators per rung: min_estimators * eta**k, capped at max_estimators."""
+    sizes = []
+    n = settings["min_estimators"]
+    while n < settings["max_estimators"]:
+        sizes.append(n)
+        n *= settings["eta"]
+    sizes.append(settings["max_estimators"])
+    return sizes
+
+
+# ---------------------------
+# Trial log
+# ---------------------------
+def _fingerprint(config, settings, candidates):
+    # Everything that changes which model a (candidate, fold, rung) fit produces
+    key = {"dataset": os.path.abspath(config["dataset"]), "target": config["target"],
+           "test_size": config["test_size"], "random_state": config["random_state"],
+           "cv_folds": config["cv_folds"], "rungs": rung_sizes(settings),
+           "eta": settings["eta"], "candidates": candidates}
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def read_trial_log(path, fingerprint):
+    """Finished trials keyed by (candidate_id, n_estimators) from an existing log."""
+    trials = {}
+    if not os.path.exists(path):
+        return trials
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # torn last line from an interrupted run
+            if entry.get("event") == "search" and entry["fingerprint"] != fingerprint:
+                raise ValueError(f"{path} was written by a search with different settings; "
+                                 "use another 'trial_log' or delete it")
+            if entry.get("event") == "trial":
+                trials[(entry["candidate_id"], entry["n_estimators"])] = entry
+    return trials
+
+
+def _append(path, entry):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+# ---------------------------
+# Fold fits (pool workers)
+# ---------------------------
+def _grow_fold(candidate_id, params, fold, train_idx, val_idx, n_estimators, random_state, path):
+    X, y = _worker_data["X"], _worker_data["y"]
+    t0 = time.perf_counter()
+    if os.path.exists(path):
+        model = joblib.load(path)
+    else:
+        model = RandomForestClassifier(random_state=random_state, n_jobs=1, warm_start=True, **params)
+    # A model already at this size was saved by an interrupted run; just rescore it
+    if len(getattr(model, "estimators_", [])) < n_estimators:
+        model.set_params(n_estimators=n_estimators)
+        model.fit(X[train_idx], y[train_idx])
+        joblib.dump(model, path + ".tmp")
+        os.replace(path + ".tmp", path)
+    score = accuracy_score(y[val_idx], model.predict(X[val_idx]))
+    return candidate_id, fold, float(score), time.perf_counter() - t0
+
+
+def measure_forest(model, rows):
+    """p50/p99 single-row latency (us) and node-array bytes of the compiled model."""
+    forest = compile_forest(model)
+    latency = time_path(forest.predict_one, rows, repeat=3)
+    size = sum(getattr(forest, name).nbytes for name in ("feature", "threshold", "children", "value", "roots"))
+    return latency, int(size)
+
+
+def objective(cv_mean, p99_us, size_bytes, settings):
+    over_slo = max(0.0, p99_us / settings["latency_slo_us"] - 1.0)
+    return (cv_mean
+            - settings["latency_weight"] * over_slo
+            - settings["size_weight_per_mb"] * size_bytes / 1e6)
+
+
+# ---------------------------
+# Search
+# ---------------------------
+def run_search(config):
+    warnings.filterwarnings('ignore', category=UserWarning)
+    settings = search_settings(config)
+    candidates = sample_candidates(settings["space"], settings["n_candidates"], config["random_state"])
+    fingerprint = _fingerprint(config, settings, candidates)
+    trials = read_trial_log(settings["trial_log"], fingerprint)
+    if not trials:
+        os.makedirs(os.path.dirname(settings["trial_log"]) or ".", exist_ok=True)
+        _append(settings["trial_log"], {"event": "search", "fingerprint": fingerprint,
+                                        "settings": settings, "candidates": candidates})
+    else:
+        print(f"Resuming: {len(trials)} trials already in {settings['trial_log']}")
+
+    X, y, _ = load_dataset(config["dataset"], config["target"], config["cache_dir"])
+    X_train, _, y_train, _, _ = split_and_scale(X, y, config)
+    splits = list(StratifiedKFold(n_splits=config["cv_folds"], shuffle=True,
+                                  random_state=config["random_state"]).split(X_train, y_train))
+    rows = [r.reshape(1, -1) for r in X_train[:settings["latency_rows"]]]
+    work_dir = os.path.join(settings["work_dir"], fingerprint)
+    os.makedirs(work_dir, exist_ok=True)
+
+    def fold_path(candidate_id, fold):
+        return os.path.join(work_dir, f"c{candidate_id}-f{fold}.joblib")
+
+    alive = list(range(len(candidates)))
+    sizes = rung_sizes(settings)
+    with ProcessPoolExecutor(max_workers=config["n_workers"], initializer=_init_worker,
+                             initargs=(X_train, y_train)) as pool:
+        for rung, n_estimators in enumerate(sizes):
+            todo = [c for c in alive if (c, n_estimators) not in trials]
+            t0 = time.perf_counter()
+            futures = [pool.submit(_grow_fold, c, candidates[c], f, train_idx, val_idx, n_estimators,
+                                   config["random_state"], fold_path(c, f))
+                       for c in todo for f, (train_idx, val_idx) in enumerate(splits)]
+            fold_scores = {c: [None] * len(splits) for c in todo}
+            fit_seconds = {c: 0.0 for c in todo}
+            for future in futures:
+                c, f, score, seconds = future.result()
+                fold_scores[c][f] = score
+                fit_seconds[c] += seconds
+
+            # Latency is timed here, between rungs, so concurrent fits don't skew it
+            for c in todo:
+                latency, size = measure_forest(joblib.load(fold_path(c, 0)), rows)
+                cv_mean = float(np.mean(fold_scores[c]))
+                trial = {
+                    "event": "trial",
+                    "candidate_id": c,
+                    "params": candidates[c],
+                    "rung": rung,
+                    "n_estimators": n_estimators,
+                    "fold_scores": fold_scores[c],
+                    "cv_mean": cv_mean,
+                    "cv_std": float(np.std(fold_scores[c])),
+                    "latency_p50_us": round(latency["p50_us"], 1),
+                    "latency_p99_us": round(latency["p99_us"], 1),
+                    "compiled_bytes": size,
+                    "objective": objective(cv_mean, latency["p99_us"], size, settings),
+                    "fit_seconds": round(fit_seconds[c], 3),
+                    "finished_at": datetime.now(timezone.utc).isoformat(),
+                }
+                _append(settings["trial_log"], trial)
+                trials[(c, n_estimators)] = trial
+
+            ranked = sorted(alive, key=lambda c: trials[(c, n_estimators)]["objective"], reverse=True)
+            print(f"Rung {rung}: {len(alive)} candidates x {n_estimators} trees "
+                  f"({len(todo)} fitted, {time.perf_counter() - t0:.1f}s)")
+            for c in ranked:
+                t = trials[(c, n_estimators)]
+                print(f"  #{c} {t['params']}: CV {t['cv_mean']:.4f}  p99 {t['latency_p99_us']:.0f}us  "
+                      f"{t['compiled_bytes'] / 1e6:.1f}MB  objective {t['objective']:.4f}")
+
+            keep = ranked[:max(1, math.ceil(len(alive) / settings["eta"]))]
+            for c in set(alive) - set(keep):
+                for f in range(len(splits)):
+                    if os.path.exists(fold_path(c, f)):
+                        os.remove(fold_path(c, f))
+            alive = keep
+
+    best = max(trials.values(), key=lambda t: t["objective"])
+    shutil.rmtree(work_dir, ignore_errors=True)
+    print(f"Best: {best['params']} with {best['n_estimators']} trees "
+          f"(CV {best['cv_mean']:.4f}, p99 {best['latency_p99_us']:.0f}us, "
+          f"objective {best['objective']:.4f})")
+    return best
+
+
+def apply_best(config_path, best):
+    """Make the winning trial the only training candidate in ``config_path``."""
+    with open(config_path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    raw["candidates"] = [dict(best["params"], n_estimators=best["n_estimators"])]
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump(raw, f, indent=2)
+        f.write("\n")
+    print(f"Updated candidates in {config_path}; run train_pipeline.py to build the model")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Successive-halving search over RandomForest settings")
+    parser.add_argument("--config", default="train_config.json")
+    parser.add_argument("--apply", action="store_true",
+                        help="write the best parameters into the config's candidates")
+    args = parser.parse_args()
+    best = run_search(load_config(args.config))
+    if args.apply:
+        apply_best(args.config, best)
@@ -0,0 +1,272 @@
+"""
+In-process stand-in for the Supabase client.
+
+Implements the small part of the supabase-py query builder the backend uses
+(inserts, upserts, and selects with filters, ``or_`` logic trees, ordering and limits)
+over plain Python lists, so the persistence and API layers can be exercised
+without a network connection. Not intended for production use.
+"""
+
+import copy
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+
+
+def _like(pattern):
+    """Compile a SQL LIKE pattern (with backslash escapes) into a regex."""
+    out = []
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == "\\" and i + 1 < len(pattern):
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        out.append(".*" if ch == "%" else "." if ch == "_" else re.escape(ch))
+        i += 1
+    return re.compile("^" + "".join(out) + "$", re.S)
+
+
+_OPS = {
+    "eq": lambda a, b: a == b,
+    "neq": lambda a, b: a != b,
+    "lt": lambda a, b: a is not None and a < b,
+    "lte": lambda a, b: a is not None and a <= b,
+    "gt": lambda a, b: a is not None and a > b,
+    "gte": lambda a, b: a is not None and a >= b,
+    "like": lambda a, b: a is not None and _like(b).match(str(a)) is not None,
+}
+
+
+def _split_top_level(expr):
+    """Split a PostgREST logic expression on commas outside parentheses and quotes."""
+    parts, depth, quoted, start = [], 0, False, 0
+    i = 0
+    while i < len(expr):
+        ch = expr[i]
+        if ch == "\\" and quoted:
+            i += 2
+            continue
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and ch == ",":
+            parts.append(expr[start:i])
+            start = i + 1
+        i += 1
+    parts.append(expr[start:])
+    return parts
+
+
+def _parse_logic(expr):
+    """Parse the ``or=(...)`` subset used by the backend into a row predicate."""
+    expr = expr.strip()
+    for combinator, join in (("and(", all), ("or(", any)):
+        if expr.startswith(combinator) and expr.endswith(")"):
+            terms = [_parse_logic(t) for t in _split_top_level(expr[len(combinator):-1])]
+            return lambda row: join(t(row) for t in terms)
+    column, op, value = expr.split(".", 2)
+    if value.startswith('"') and value.endswith('"'):
+        value = re.sub(r"\\(.)", r"\1", value[1:-1])
+    return lambda row: _OPS[op](row.get(column), value)
+
+
+class LocalResponse:
+    """Mimics the ``.data`` / ``.count`` attributes of a PostgREST response."""
+
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class LocalQuery:
+    """Chainable query over one in-memory table."""
+
+    def __init__(self, client, table):
+        self._client = client
+        self._table = table
+        self._action = "select"
+        self._payload = None
+        self._columns = "*"
+        self._filters = []
+        self._order = []
+        self._limit = None
+        self._on_conflict = None
+        self._ignore_duplicates = False
+
+    # ---- actions ----
+    def select(self, columns="*", count=None):
+        self._action = "select"
+        self._columns = columns
+        return self
+
+    def insert(self, rows):
+        self._action = "insert"
+        self._payload = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, on_conflict="id", ignore_duplicates=False):
+        """Insert rows, or merge their columns into the existing row with the same ``on_conflict`` value.
+
+        With ``ignore_duplicates`` existing rows are left alone and not returned.
+        """
+        self._action = "upsert"
+        self._payload = rows if isinstance(rows, list) else [rows]
+        self._on_conflict = on_conflict
+        self._ignore_duplicates = ignore_duplicates
+        return self
+
+    # ---- filters ----
+    def _filter(self, op, column, value):
+        self._filters.append(lambda row: _OPS[op](row.get(column), value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter("eq", column, value)
+
+    def neq(self, column, value):
+        return self._filter("neq", column, value)
+
+    def lt(self, column, value):
+        return self._filter("lt", column, value)
+
+    def lte(self, column, value):
+        return self._filter("lte", column, value)
+
+    def gt(self, column, value):
+        return self._filter("gt", column, value)
+
+    def gte(self, column, value):
+        return self._filter("gte", column, value)
+
+    def like(self, column, pattern):
+        return self._filter("like", column, pattern)
+
+    def or_(self, filters):
+        self._filters.append(_parse_logic(f"or({filters})"))
+        return self
+
+    def order(self, column, desc=False):
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def execute(self):
+        return self._client._execute(self)
+
+
+class LocalRpc:
+    """Deferred stored-procedure call, executed like a query."""
+
+    def __init__(self, client, name, params):
+        self._client = client
+        self._name = name
+        self._params = params
+
+    def execute(self):
+        return self._client._execute_rpc(self._name, self._params)
+
+
+class LocalSupabase:
+    """Drop-in replacement for ``supabase.Client`` backed by Python lists.
+
+    ``latency`` adds a fixed sleep to every round trip and ``fail`` makes every
+    call raise, which is enough to simulate a slow or unreachable database.
+    """
+
+    def __init__(self, latency=0.0, fail=False):
+        self.latency = latency
+        self.fail = fail
+        self.tables = {}
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def table(self, name):
+        return LocalQuery(self, name)
+
+    def rpc(self, name, params=None):
+        """Call one of the SQL functions from supabase_schema.sql, emulated in Python."""
+        return LocalRpc(self, name, params or {})
+
+    def _rpc_assessment_stats(self, params):
+        groups = {}
+        for row in self.tables.get("patient_assessments", []):
+            day = str(row.get("assessment_date") or "")[:10]
+            if params.get("start_date") and day < params["start_date"]:
+                continue
+            if params.get("end_date") and day > params["end_date"]:
+                continue
+            key = (day, row.get("prediction"), row.get("risk_level"))
+            groups[key] = groups.get(key, 0) + 1
+        return [{"day": d, "prediction": p, "risk_level": r, "n": n}
+                for (d, p, r), n in groups.items()]
+
+    def _execute_rpc(self, name, params):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail:
+            raise ConnectionError("Local Supabase stand-in is unavailable")
+        handler = getattr(self, f"_rpc_{name}", None)
+        if handler is None:
+            raise LookupError(f"Unknown function: {name}")
+        with self._lock:
+            self.calls += 1
+            return LocalResponse(handler(params))
+
+    def _execute(self, query):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.fail:
+            raise ConnectionError("Local Supabase stand-in is unavailable")
+
+        with self._lock:
+            self.calls += 1
+            rows = self.tables.setdefault(query._table, [])
+
+            if query._action == "insert":
+                inserted = []
+                for row in query._payload:
+                    row = dict(row)
+                    row.setdefault("id", str(uuid.uuid4()))
+                    row.setdefault("created_at", datetime.utcnow().isoformat())
+                    rows.append(row)
+                    inserted.append(copy.deepcopy(row))
+                return LocalResponse(inserted)
+
+            if query._action == "upsert":
+                key = query._on_conflict
+                existing = {row.get(key): row for row in rows}
+                upserted = []
+                for row in query._payload:
+                    target = existing.get(row.get(key))
+                    if target is None:
+                        target = dict(row)
+                        target.setdefault("id", str(uuid.uuid4()))
+                        target.setdefault("created_at", datetime.utcnow().isoformat())
+                        rows.append(target)
+                        existing[target.get(key)] = target
+                    elif query._ignore_duplicates:
+                        continue
+                    else:
+                        target.update(row)
+                    upserted.append(copy.deepcopy(target))
+                return LocalResponse(upserted)
+
+            result = [row for row in rows if all(f(row) for f in query._filters)]
+            for column, desc in reversed(query._order):
+                result.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+            if query._limit is not None:
+                result = result[:query._limit]
+            if query._columns != "*":
+                wanted = [c.strip() for c in query._columns.split(",")]
+                result = [{c: row.get(c) for c in wanted} for row in result]
+            return LocalResponse(copy.deepcopy(result), count=len(result))
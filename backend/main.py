@@ -1,78 +1,56 @@
 # app.py
 from flask import Flask, request, jsonify
 from flask_cors import CORS   # ✅ Add CORS
-import pandas as pd
 import numpy as np
 import joblib
+from features import extractor, MissingChannelsError
+from forest_compiler import compile_forest
+from scoring import (encode_history, encode_responses, final_labels, model_inputs,
+                     possible_matrix, subscale_scores, N_MODEL_QUESTIONS)
 
 # ---------------------------
 # Load trained model and scaler
 # ---------------------------
 model = joblib.load("adhd_model_multimodal.pkl")
 scaler = joblib.load("scaler_eeg.pkl")
-
-# EEG columns
-eeg_columns = [
-    'Fp1','Fp2','F3','F4','C3','C4','P3','P4','O1','O2',
-    'F7','F8','T7','T8','P7','P8','Fz','Cz','Pz'
-]
+# Flat-array copy of the forest: one vectorized traversal per batch
+forest = compile_forest(model)
 
 # Question columns
 question_columns = [f'Q{i}' for i in range(1, 21)]
 
-# ---------------------------
-# Heuristic function for other disorders
-# ---------------------------
-def heuristic_flags_weighted(questionnaire, medical_history=None):
-    if medical_history is None:
-        medical_history = {}
-    flags = {}
-
-    # ODD (Q11-Q13)
-    odd_score = np.mean([questionnaire[i] for i in range(10, 13)]) if len(questionnaire) >= 13 else 0
-    if medical_history.get('family_adhd', 'No').lower() == 'yes':
-        odd_score = (odd_score + 1) / 2
-    flags['ODD'] = 'Possible' if odd_score >= 0.5 else 'Unlikely'
-
-    # Dyslexia (Q14-Q16)
-    dys_score = np.mean([questionnaire[i] for i in range(13, 16)]) if len(questionnaire) >= 16 else 0
-    if medical_history.get('family_learning_disorders', 'No').lower() == 'yes':
-        dys_score = (dys_score + 1) / 2
-    flags['Dyslexia'] = 'Possible' if dys_score >= 0.5 else 'Unlikely'
-
-    # ASD (Q17-Q20)
-    asd_score = np.mean([questionnaire[i] for i in range(16, 20)]) if len(questionnaire) >= 20 else 0
-    flags['ASD'] = 'Possible' if asd_score >= 0.5 else 'Unlikely'
-
-    return flags
-
 # ---------------------------
 # Final prediction logic
 # ---------------------------
-def final_prediction(eeg_features, questionnaire, medical_history=None):
-    # Normalize EEG features
-    eeg_scaled = scaler.transform([eeg_features])
+# heuristic_flags_weighted (ODD / Dyslexia / ASD) now lives in scoring.py
+def final_predictions(eeg_rows, questionnaires, medical_histories=None):
+    """Labels for N records: (N, 19) raw EEG rows, N answer lists, N history dicts.
 
-    # Normalize first 10 ADHD questions to 0-1
-    adhd_questions = np.array(questionnaire[:10])
-    adhd_questions = (adhd_questions - 1) / 4
+    Scaling, the forest and the questionnaire heuristics each run once over
+    the whole batch. Every questionnaire needs at least Q1..Q10.
+    """
+    if medical_histories is None:
+        medical_histories = [None] * len(questionnaires)
+    responses, counts = encode_responses(questionnaires)
+    if (counts < N_MODEL_QUESTIONS).any():
+        raise ValueError(f"Each questionnaire needs at least {N_MODEL_QUESTIONS} answers")
 
-    # Combine EEG + ADHD questions
-    model_input = np.concatenate([eeg_scaled.flatten(), adhd_questions]).reshape(1, -1)
+    # Normalize EEG features, then append Q1-Q10 normalized to 0-1
+    eeg_scaled = scaler.transform(np.asarray(eeg_rows, dtype=np.float64))
+    eeg_pred, _ = forest.predict(model_inputs(eeg_scaled, responses))
 
-    eeg_pred = model.predict(model_input)[0]
+    # ADHD from the model, otherwise the first possible other disorder
+    possible = possible_matrix(subscale_scores(responses, counts, encode_history(medical_histories)))
+    return final_labels(eeg_pred, possible)
 
-    if eeg_pred == "ADHD":
-        return "ADHD"
 
-    # Check other disorders
-    other_flags = heuristic_flags_weighted(questionnaire, medical_history)
-    possible_disorders = [k for k, v in other_flags.items() if v == "Possible"]
-
-    if possible_disorders:
-        return possible_disorders[0]  # return first possible disorder
+def final_prediction(eeg_features, questionnaire, medical_history=None):
+    # eeg_features is either the raw EEG dict or a sequence already in eeg_columns order
+    if isinstance(eeg_features, dict):
+        eeg_row = extractor.extract(eeg_features)
     else:
-        return "Healthy"
+        eeg_row = np.asarray(eeg_features, dtype=np.float64).reshape(1, -1)
+    return final_predictions(eeg_row, [questionnaire], [medical_history])[0]
 
 # ---------------------------
 # Flask App
@@ -93,14 +71,46 @@ def predict():
         questions = data['questions']   # list of 20 answers (1-5)
         medical_history = data.get('medical_history', {})  # optional dict
 
-        # Convert EEG dict to list in correct order
-        eeg_features = [eeg[col] for col in eeg_columns]
-
-        prediction = final_prediction(eeg_features, questions, medical_history)
+        # EEG dict is validated and packed in eeg_columns order by the shared extractor
+        prediction = final_prediction(eeg, questions, medical_history)
         return jsonify({"prediction": prediction})
 
     except Exception as e:
         return jsonify({"error": str(e)})
 
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """Score {"records": [{"eeg", "questions", "medical_history"}, ...]} in one pass.
+
+    Records that fail validation get an ``error`` entry; the rest are scored together.
+    """
+    try:
+        records = (request.get_json(silent=True) or {}).get('records')
+        if not isinstance(records, list):
+            return jsonify({"error": "'records' must be a list"}), 400
+
+        results = [None] * len(records)
+        rows, questionnaires, histories, index = [], [], [], []
+        for i, record in enumerate(records):
+            try:
+                questions = record['questions']
+                if len(questions) < N_MODEL_QUESTIONS:
+                    raise ValueError(f"Need at least {N_MODEL_QUESTIONS} answers")
+                rows.append(extractor.extract_row(record['eeg']))
+                questionnaires.append(questions)
+                histories.append(record.get('medical_history', {}))
+                index.append(i)
+            except (KeyError, TypeError, ValueError, MissingChannelsError) as e:
+                results[i] = {"index": i, "error": str(e)}
+
+        if index:
+            labels = final_predictions(np.array(rows), questionnaires, histories)
+            for i, label in zip(index, labels):
+                results[i] = {"index": i, "prediction": label}
+        return jsonify({"results": results, "count": len(results), "scored": len(index)})
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 if __name__ == '__main__':
     app.run(debug=True)
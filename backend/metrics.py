@@ -0,0 +1,258 @@
+"""
+Low-overhead in-process metrics with a Prometheus text exposition.
+
+Histograms, counters and gauges are plain Python objects guarded by a lock
+per child; observing a value is a bisect plus two additions. When the
+registry is created with ``enabled=False`` every ``labels()`` call returns a
+shared no-op child, so instrumented code pays one method call and nothing
+else.
+
+Values are per process. Under a pre-fork server each worker exposes its own
+series; scrape the workers individually or aggregate them in Prometheus.
+
+The optional sampled profiler runs cProfile over one request in every
+``every`` and writes ``.prof`` files readable with ``python -m pstats``.
+"""
+
+import cProfile
+import os
+import threading
+import time
+from bisect import bisect_left
+
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels_text(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class _Noop:
+    """Stand-in child (and timer) used when metrics are disabled."""
+
+    def observe(self, value):
+        pass
+
+    def inc(self, n=1):
+        pass
+
+    def dec(self, n=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def time(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _Noop()
+
+
+class _Timer:
+    __slots__ = ("child", "start")
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+
+class _ValueChild:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+
+    def dec(self, n=1):
+        with self._lock:
+            self.value -= n
+
+    def set(self, value):
+        self.value = value
+
+
+class _Family:
+    kind = None
+
+    def __init__(self, registry, name, help, labelnames):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        if not self.registry.enabled:
+            return _NOOP
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        return _ValueChild()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.append(f"{self.name}{_labels_text(self.labelnames, values)} {child.value}")
+        return lines
+
+
+class Counter(_Family):
+    kind = "counter"
+
+
+class Gauge(_Family):
+    kind = "gauge"
+
+
+class Histogram(_Family):
+    kind = "histogram"
+
+    def __init__(self, registry, name, help, labelnames, buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, child in sorted(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels_text(self.labelnames, values, ('le', le))} {cumulative}")
+            labels = _labels_text(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metric families plus scrape-time collectors."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._families = []
+        self._collectors = []
+
+    def _register(self, family):
+        self._families.append(family)
+        return family
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(self, name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._register(Gauge(self, name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, help, labelnames, buckets))
+
+    def add_collector(self, fn):
+        """Register ``fn() -> [(name, kind, help, value)]``, evaluated on every scrape.
+
+        For values that already live elsewhere (queue depth, writer and cache
+        counters) and only need reading when /metrics is requested.
+        """
+        self._collectors.append(fn)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for family in self._families:
+            lines.extend(family.render())
+        for fn in self._collectors:
+            try:
+                samples = fn()
+            except Exception as e:
+                print(f"[Metrics] Collector failed: {str(e)}")
+                continue
+            for name, kind, help, value in samples:
+                lines.extend([f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {value}"])
+        return "\n".join(lines) + "\n"
+
+
+class SampledProfiler:
+    """Profile one request in every ``every`` and dump the stats to ``directory``."""
+
+    def __init__(self, every=0, directory="profiles"):
+        self.every = every
+        self.directory = directory
+        self._count = 0
+        self._lock = threading.Lock()
+        self._active = False
+
+    def start(self):
+        """Return a running cProfile.Profile if this request is sampled, else None."""
+        if not self.every:
+            return None
+        with self._lock:
+            self._count += 1
+            # cProfile can only profile one request at a time
+            if self._count % self.every or self._active:
+                return None
+            self._active = True
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def stop(self, profile, name):
+        profile.disable()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{name}-{os.getpid()}-{int(time.time() * 1000)}.prof")
+            profile.dump_stats(path)
+        except OSError as e:
+            print(f"[Metrics] Could not write profile: {str(e)}")
+        finally:
+            with self._lock:
+                self._active = False
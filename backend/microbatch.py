@@ -0,0 +1,168 @@
+"""
+Dynamic micro-batching for single-row inference.
+
+Concurrent /predict requests each hand one EEG row to a MicroBatcher and
+block on a future. A dispatcher thread takes the first waiting row, gathers
+more until ``max_batch`` rows are collected or ``max_wait`` seconds have
+passed since the first one arrived, runs one vectorized call over the stacked
+rows and scatters the results back to the waiting requests.
+
+Waiting only pays off when other requests are in flight, so the dispatcher
+only holds a batch open for ``max_wait`` after the previous batch had more
+than one row. A lone request is dispatched at once; under load, rows that
+arrive while a batch is running form the next batch anyway.
+
+``stop()`` drains: rows queued before it (or while it runs) are still
+scored and their futures resolved before the dispatcher exits.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+_STOP = object()
+
+
+class _Item:
+    __slots__ = ("key", "row", "future", "enqueued")
+
+    def __init__(self, key, row):
+        self.key = key
+        self.row = row
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class MicroBatcher:
+    """Coalesces ``submit(key, row)`` calls into ``fn(key, rows)`` calls.
+
+    ``fn`` gets the rows of one batch that share ``key`` (e.g. the model
+    instance they must be scored by) and returns one result per row.
+    ``observer(batch_size, queue_delays)`` is called for every batch.
+    """
+
+    def __init__(self, fn, max_batch=32, max_wait=0.002, observer=None):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.observer = observer
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._last_batch_size = 0
+        self.stats = {"batches": 0, "rows": 0, "max_batch_seen": 0}
+
+    @property
+    def enabled(self):
+        return self.max_batch > 1
+
+    # ---------------------------
+    # Lifecycle
+    # ---------------------------
+    def start(self):
+        """Start the dispatcher thread (again after a fork)."""
+        with self._lock:
+            self._start_locked()
+
+    def _start_locked(self):
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="microbatch-dispatcher", daemon=True)
+        self._pid = os.getpid()
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Score every queued row, then end the dispatcher; a later submit starts a new one."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None and self._pid == os.getpid():
+                self._queue.put(_STOP)
+                thread.join(timeout)
+
+    # ---------------------------
+    # Producer side
+    # ---------------------------
+    def submit(self, key, row):
+        """Queue one row; returns a concurrent.futures.Future for its result."""
+        item = _Item(key, row)
+        # Under the lock, so a row never lands in the queue of a dispatcher that stop() ended
+        with self._lock:
+            self._start_locked()
+            self._queue.put(item)
+        return item.future
+
+    def __call__(self, key, row, timeout=None):
+        """Submit one row and wait for its result."""
+        return self.submit(key, row).result(timeout)
+
+    # ---------------------------
+    # Dispatcher
+    # ---------------------------
+    def _collect(self, first):
+        batch = [first]
+        # Only hold the batch open when the last one showed concurrent traffic
+        deadline = first.enqueued + (self.max_wait if self._last_batch_size > 1 else 0.0)
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                self._drain()
+                return
+            self._dispatch(self._collect(first))
+
+    def _drain(self):
+        """Score rows that were queued behind the stop marker."""
+        pending = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                pending.append(item)
+        for start in range(0, len(pending), self.max_batch):
+            self._dispatch(pending[start:start + self.max_batch])
+
+    def _dispatch(self, batch):
+        started = time.perf_counter()
+        self._last_batch_size = len(batch)
+
+        groups = {}
+        for item in batch:
+            groups.setdefault(id(item.key), []).append(item)
+        for items in groups.values():
+            try:
+                results = self.fn(items[0].key, [item.row for item in items])
+                if len(results) != len(items):
+                    raise RuntimeError(f"Batch function returned {len(results)} results for {len(items)} rows")
+            except Exception as e:
+                for item in items:
+                    item.future.set_exception(e)
+                continue
+            for item, result in zip(items, results):
+                item.future.set_result(result)
+
+        self.stats["batches"] += 1
+        self.stats["rows"] += len(batch)
+        self.stats["max_batch_seen"] = max(self.stats["max_batch_seen"], len(batch))
+        if self.observer is not None:
+            try:
+                self.observer(len(batch), [started - item.enqueued for item in batch])
+            except Exception as e:
+                print(f"[MicroBatch] Observer failed: {e}")
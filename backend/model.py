@@ -1,3 +1,4 @@
+import os
 import numpy as np
 import pandas as pd
 import joblib
@@ -9,7 +10,7 @@ from sklearn.metrics import accuracy_score, classification_report, confusion_mat
 # ---------------------------
 # Load EEG dataset
 # ---------------------------
-data = pd.read_csv(r"C:\Users\RITHESH\Downloads\major project fin\dataset.csv")  # Change path
+data = pd.read_csv(os.path.join(os.path.dirname(os.path.abspath(__file__)), "dataset.csv"))
 
 # EEG features
 eeg_columns = ['Fp1','Fp2','F3','F4','C3','C4','P3','P4','O1','O2',
@@ -0,0 +1,366 @@
+"""
+Lazy, per-process loading of the EEG model artifacts, with hot reload.
+
+Nothing is read from disk at import time. The first call to ``get()`` in a
+process loads the scaler and the compiled forest (memory-mapped ``.forest``
+artifact if present, otherwise the pickled RandomForest compiled in-process).
+The registry remembers the PID it loaded in, so a pre-fork server that
+imported or even warmed the app in its master process still gets a fresh,
+private load in each worker after ``fork()``.
+
+Versioned deployments live under ``versions_dir`` (``models/versions``), one
+directory per version holding the same file names as ``models/``:
+
+    models/versions/v20261017-120000/eeg_only_model.forest
+    models/versions/v20261017-120000/eeg_scaler.pkl
+    models/versions/ACTIVE            <- optional: name of the version to serve
+
+The version to serve is the one named in ACTIVE, otherwise the newest
+directory (by name), otherwise the unversioned ``models/`` files ("base").
+A watcher thread in every worker polls for a change, loads and validates the
+candidate in the background (smoke predictions on known dataset.csv rows),
+and then swaps it in with a single reference assignment. Requests never wait:
+each one keeps using the LoadedModel it obtained from ``get()``. Activating
+or rolling back a version rewrites ACTIVE, so every worker converges on it at
+its next poll.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+BASE_VERSION = "base"
+ACTIVE_FILE = "ACTIVE"
+
+
+class ModelValidationError(ValueError):
+    """Raised when a candidate model fails its smoke test."""
+
+
+class LoadedModel:
+    """Scaler + compiled forest pair used to score EEG rows."""
+
+    def __init__(self, scaler, forest, version):
+        self.scaler = scaler
+        self.forest = forest
+        self.version = version
+        self.loaded_at = datetime.now(timezone.utc).isoformat()
+        self.smoke_accuracy = None
+        self.load_seconds = {}
+
+    @property
+    def classes(self):
+        return self.forest.classes_.tolist()
+
+    def predict(self, eeg_values):
+        """Scale raw (n, 19) EEG rows and return (labels, probabilities).
+
+        Raises ValueError for NaN/inf: the compiled forest would route NaN
+        down the left branch and return a confident, meaningless label.
+        """
+        if not np.isfinite(eeg_values).all():
+            raise ValueError("EEG values must be finite")
+        return self.forest.predict(self.scaler.transform(eeg_values))
+
+
+class ModelRegistry:
+    """Loads the serving model on first use, once per process, and hot-swaps new versions."""
+
+    def __init__(self, forest_path="models/eeg_only_model.forest",
+                 model_path="models/eeg_only_model.pkl",
+                 scaler_path="models/eeg_scaler.pkl",
+                 versions_dir=None, poll_interval=10.0,
+                 smoke_data="dataset.csv", smoke_rows=200, smoke_min_accuracy=0.6,
+                 keep_previous=2):
+        self.forest_path = forest_path
+        self.model_path = model_path
+        self.scaler_path = scaler_path
+        self.versions_dir = versions_dir
+        self.poll_interval = poll_interval
+        self.smoke_data = smoke_data
+        self.smoke_rows = smoke_rows
+        self.smoke_min_accuracy = smoke_min_accuracy
+        self.keep_previous = keep_previous
+        self._lock = threading.Lock()
+        self._admin_lock = threading.Lock()
+        self._model = None
+        self._pid = None
+        self._previous = []       # recently replaced LoadedModels, oldest first
+        self._failed = {}         # version -> (directory mtime, error)
+        self._smoke = None
+        self._watcher_pid = None
+
+    @property
+    def loaded(self):
+        return self._model is not None and self._pid == os.getpid()
+
+    @property
+    def load_seconds(self):
+        """Artifact load timings of the model this process is serving (not of rejected candidates)."""
+        return self._model.load_seconds if self.loaded else {}
+
+    def get(self):
+        """Return the LoadedModel for this process, loading it if needed."""
+        if self.loaded:
+            return self._model
+        with self._lock:
+            if not self.loaded:
+                self._model = self._load_initial()
+                self._previous = []
+                self._pid = os.getpid()
+                self._start_watcher()
+        return self._model
+
+    # ---------------------------
+    # Versions on disk
+    # ---------------------------
+    def _version_paths(self, version):
+        if version == BASE_VERSION:
+            return self.forest_path, self.model_path, self.scaler_path
+        directory = os.path.join(self.versions_dir, version)
+        return tuple(os.path.join(directory, os.path.basename(p))
+                     for p in (self.forest_path, self.model_path, self.scaler_path))
+
+    def _complete(self, version):
+        forest_path, model_path, scaler_path = self._version_paths(version)
+        return os.path.exists(scaler_path) and (os.path.exists(forest_path) or os.path.exists(model_path))
+
+    def versions(self):
+        """Deployable version directories, oldest first."""
+        if not self.versions_dir or not os.path.isdir(self.versions_dir):
+            return []
+        # Dot-prefixed directories are versions still being published
+        return [name for name in sorted(os.listdir(self.versions_dir))
+                if not name.startswith(".") and os.path.isdir(os.path.join(self.versions_dir, name))
+                and self._complete(name)]
+
+    def _available(self):
+        return ([BASE_VERSION] if self._complete(BASE_VERSION) else []) + self.versions()
+
+    def _pinned_version(self):
+        if not self.versions_dir:
+            return None
+        try:
+            with open(os.path.join(self.versions_dir, ACTIVE_FILE), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def desired_version(self):
+        """ACTIVE if set and present, else the newest version directory, else base."""
+        available = self.versions()
+        pinned = self._pinned_version()
+        if pinned and (pinned in available or pinned == BASE_VERSION):
+            return pinned
+        return available[-1] if available else BASE_VERSION
+
+    def _write_pinned(self, version):
+        os.makedirs(self.versions_dir, exist_ok=True)
+        path = os.path.join(self.versions_dir, ACTIVE_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(version + "\n")
+        os.replace(path + ".tmp", path)
+
+    def _version_mtime(self, version):
+        try:
+            return os.path.getmtime(self._version_paths(version)[2])
+        except OSError:
+            return None
+
+    # ---------------------------
+    # Loading and validation
+    # ---------------------------
+    def _load(self, version=BASE_VERSION):
+        import joblib
+        from forest_compiler import compile_forest, load_forest
+
+        forest_path, model_path, scaler_path = self._version_paths(version)
+        timings = {}
+        t0 = time.perf_counter()
+        scaler = joblib.load(scaler_path)
+        timings["scaler"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        if os.path.exists(forest_path):
+            forest = load_forest(forest_path)
+            timings["forest_artifact"] = time.perf_counter() - t0
+        else:
+            forest = compile_forest(joblib.load(model_path))
+            timings["forest_pickle_compile"] = time.perf_counter() - t0
+
+        print(f"[Models] Loaded {version} in pid {os.getpid()} "
+              f"({sum(timings.values()):.3f}s)")
+        model = LoadedModel(scaler, forest, version)
+        model.load_seconds = timings
+        return model
+
+    def _smoke_set(self):
+        """(X, y) rows from ``smoke_data`` with known labels, read once per process."""
+        if self._smoke is None:
+            import csv
+            from itertools import islice
+            from features import eeg_columns
+
+            if self.smoke_data and os.path.exists(self.smoke_data):
+                with open(self.smoke_data, "r", encoding="utf-8", newline="") as f:
+                    rows = list(islice(csv.DictReader(f), self.smoke_rows))
+                X = np.array([[float(row[c]) for c in eeg_columns] for row in rows], dtype=np.float64)
+                labels = np.array([row["Class"] for row in rows]) if rows and "Class" in rows[0] else None
+                self._smoke = (X, labels)
+            else:
+                self._smoke = (np.zeros((1, len(eeg_columns))), None)
+        return self._smoke
+
+    def validate(self, model):
+        """Smoke-test a candidate; raises ModelValidationError, returns the smoke accuracy."""
+        from features import eeg_columns
+
+        if getattr(model.scaler, "n_features_in_", len(eeg_columns)) != len(eeg_columns):
+            raise ModelValidationError(f"{model.version}: scaler expects "
+                                       f"{model.scaler.n_features_in_} features, not {len(eeg_columns)}")
+        current = self._model if self.loaded else None
+        if current is not None and model.classes != current.classes:
+            raise ModelValidationError(f"{model.version}: classes {model.classes} differ from "
+                                       f"the serving model's {current.classes}")
+
+        X, y = self._smoke_set()
+        labels, probabilities = model.predict(X)
+        if probabilities.shape != (len(X), len(model.classes)) or not np.all(np.isfinite(probabilities)):
+            raise ModelValidationError(f"{model.version}: malformed probabilities")
+        if not np.allclose(probabilities.sum(axis=1), 1.0, atol=1e-6):
+            raise ModelValidationError(f"{model.version}: probabilities do not sum to 1")
+        if y is None:
+            return None
+        accuracy = float(np.mean(np.asarray(labels).astype(str) == y))
+        if accuracy < self.smoke_min_accuracy:
+            raise ModelValidationError(f"{model.version}: smoke accuracy {accuracy:.3f} "
+                                       f"below {self.smoke_min_accuracy}")
+        return accuracy
+
+    def _load_validated(self, version):
+        model = self._load(version)
+        model.smoke_accuracy = self.validate(model)
+        return model
+
+    def load(self, version):
+        """Load and validate ``version`` without serving it (for offline jobs)."""
+        return self._load_validated(version)
+
+    def _load_initial(self):
+        version = self.desired_version()
+        try:
+            return self._load_validated(version)
+        except Exception as e:
+            if version == BASE_VERSION:
+                raise
+            self._failed[version] = (self._version_mtime(version), str(e))
+            print(f"[Models] {version} failed to load, serving {BASE_VERSION}: {str(e)}")
+            return self._load_validated(BASE_VERSION)
+
+    # ---------------------------
+    # Hot swap
+    # ---------------------------
+    def _swap(self, model):
+        with self._lock:
+            old = self._model
+            self._model = model
+            if old is not None:
+                self._previous = [m for m in self._previous if m.version != model.version]
+                self._previous = (self._previous + [old])[-self.keep_previous:]
+        print(f"[Models] Now serving {model.version} in pid {os.getpid()}")
+
+    def _candidate(self, version):
+        """Previously served LoadedModel for ``version``, or a freshly loaded and validated one."""
+        for model in self._previous:
+            if model.version == version:
+                return model
+        return self._load_validated(version)
+
+    def check_for_update(self):
+        """Load, validate and swap in the desired version if it is not already serving.
+
+        Returns the version now serving. A version that fails validation is
+        skipped until its files change.
+        """
+        with self._admin_lock:
+            current = self.get()
+            version = self.desired_version()
+            if version == current.version:
+                return version
+            failed = self._failed.get(version)
+            if failed is not None and failed[0] == self._version_mtime(version):
+                return current.version
+            try:
+                self._swap(self._candidate(version))
+                self._failed.pop(version, None)
+            except Exception as e:
+                self._failed[version] = (self._version_mtime(version), str(e))
+                print(f"[Models] Rejected {version}: {str(e)}")
+            return self._model.version
+
+    def activate(self, version):
+        """Serve ``version`` in every worker: validate it here, swap, and pin it in ACTIVE."""
+        if not self.versions_dir:
+            raise LookupError("No versions directory configured")
+        if version not in self._available():
+            raise LookupError(f"Unknown model version: {version}")
+        with self._admin_lock:
+            model = self._candidate(version)
+            self._write_pinned(version)
+            if model is not self._model:
+                self._swap(model)
+            self._failed.pop(version, None)
+        return self.status()
+
+    def rollback(self, version=None):
+        """Go back to ``version``, or by default to the version served before the current one."""
+        if version is None:
+            current = self.get().version
+            previous = [m.version for m in self._previous if m.version != current]
+            if previous:
+                version = previous[-1]
+            else:
+                # Nothing swapped in this process yet: fall back to the version before on disk
+                available = self._available()
+                if current not in available or available.index(current) == 0:
+                    raise LookupError("No previous model version to roll back to")
+                version = available[available.index(current) - 1]
+        return self.activate(version)
+
+    def _start_watcher(self):
+        if not self.versions_dir or not self.poll_interval or self._watcher_pid == os.getpid():
+            return
+        self._watcher_pid = os.getpid()
+        threading.Thread(target=self._watch, name="model-watcher", daemon=True).start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.check_for_update()
+            except Exception as e:
+                print(f"[Models] Version check failed: {str(e)}")
+
+    def status(self):
+        model = self._model if self.loaded else None
+        return {
+            "serving": model.version if model else None,
+            "loaded_at": model.loaded_at if model else None,
+            "smoke_accuracy": model.smoke_accuracy if model else None,
+            "pinned": self._pinned_version(),
+            "desired": self.desired_version(),
+            "previous": [m.version for m in self._previous],
+            "available": self._available(),
+            "rejected": {v: err for v, (_, err) in self._failed.items()},
+        }
+
+    def warm_up(self):
+        """Load the model and run one dummy prediction so the first request is not penalized."""
+        model = self.get()
+        t0 = time.perf_counter()
+        dummy = np.zeros((1, model.scaler.n_features_in_), dtype=np.float64)
+        model.predict(dummy)
+        return time.perf_counter() - t0
@@ -13,7 +13,7 @@ from sklearn.preprocessing import LabelEncoder
 # ---------------------------
 # Load EEG dataset
 # ---------------------------
-data = pd.read_csv(r"C:\Users\RITHESH\Downloads\major project fin\dataset.csv")  # ✅ Update path if needed
+data = pd.read_csv(os.path.join(os.path.dirname(os.path.abspath(__file__)), "dataset.csv"))
 print("Columns found:", data.columns.tolist())
 
 # Automatically detect the class/target column
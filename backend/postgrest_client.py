@@ -0,0 +1,250 @@
+"""
+Minimal PostgREST clients over pooled HTTP connections (httpx).
+
+Implements the same query-builder subset as local_supabase.py (inserts,
+upserts, selects with eq/neq/lt/lte/gt/gte/like filters, ``or_`` logic trees,
+ordering, limits, and RPC calls), in a blocking flavour (PostgrestClient) and
+an asyncio flavour (AsyncPostgrestClient), so queries written once, e.g.
+assessment_queries.build_page_query, run against either. Each client keeps a
+bounded pool of keep-alive connections.
+
+ThreadedAsyncClient gives any blocking client (LocalSupabase, supabase-py)
+the async interface by running ``execute()`` in a thread pool.
+"""
+
+import asyncio
+
+import httpx
+
+
+class PostgrestResponse:
+    """Mimics the ``.data`` attribute of a supabase-py response."""
+
+    def __init__(self, data):
+        self.data = data
+
+
+class _Query:
+    """Chainable PostgREST request description; ``execute`` is supplied by subclasses."""
+
+    def __init__(self, client, table):
+        self._client = client
+        self._table = table
+        self._method = "GET"
+        self._params = []
+        self._json = None
+        self._order = []
+        self._prefer = "return=minimal"
+
+    # ---- actions ----
+    def select(self, columns="*", count=None):
+        self._method = "GET"
+        self._params.append(("select", columns))
+        return self
+
+    def insert(self, rows):
+        self._method = "POST"
+        self._json = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, on_conflict="id", ignore_duplicates=False):
+        self.insert(rows)
+        self._params.append(("on_conflict", on_conflict))
+        # Ignoring duplicates returns the rows actually inserted, so callers can tell them apart
+        self._prefer = ("resolution=ignore-duplicates,return=representation" if ignore_duplicates
+                        else "resolution=merge-duplicates,return=minimal")
+        return self
+
+    # ---- filters ----
+    def _filter(self, op, column, value):
+        self._params.append((column, f"{op}.{value}"))
+        return self
+
+    def eq(self, column, value):
+        return self._filter("eq", column, value)
+
+    def neq(self, column, value):
+        return self._filter("neq", column, value)
+
+    def lt(self, column, value):
+        return self._filter("lt", column, value)
+
+    def lte(self, column, value):
+        return self._filter("lte", column, value)
+
+    def gt(self, column, value):
+        return self._filter("gt", column, value)
+
+    def gte(self, column, value):
+        return self._filter("gte", column, value)
+
+    def like(self, column, pattern):
+        return self._filter("like", column, pattern)
+
+    def or_(self, filters):
+        self._params.append(("or", f"({filters})"))
+        return self
+
+    def order(self, column, desc=False):
+        self._order.append(f"{column}.{'desc' if desc else 'asc'}")
+        return self
+
+    def limit(self, count):
+        self._params.append(("limit", str(count)))
+        return self
+
+    def _request(self):
+        params = list(self._params)
+        if self._order:
+            params.append(("order", ",".join(self._order)))
+        headers = {"Prefer": self._prefer} if self._method == "POST" else {}
+        return {"method": self._method, "url": f"/{self._table}", "params": params,
+                "json": self._json, "headers": headers}
+
+
+def _response(response):
+    response.raise_for_status()
+    return PostgrestResponse(response.json() if response.content else [])
+
+
+class _SyncQuery(_Query):
+    def execute(self):
+        return _response(self._client.http.request(**self._request()))
+
+
+class _AsyncQuery(_Query):
+    async def execute(self):
+        return await self._client.send(self._request())
+
+
+class _Rpc:
+    def __init__(self, client, name, params):
+        self._client = client
+        self._name = name
+        self._params = params
+
+    def _request(self):
+        return {"method": "POST", "url": f"/rpc/{self._name}", "json": self._params}
+
+
+class _SyncRpc(_Rpc):
+    def execute(self):
+        return _response(self._client.http.request(**self._request()))
+
+
+class _AsyncRpc(_Rpc):
+    async def execute(self):
+        return await self._client.send(self._request())
+
+
+def _http_options(url, key, max_connections, timeout):
+    return {
+        "base_url": url.rstrip("/") + "/rest/v1",
+        "headers": {"apikey": key, "Authorization": f"Bearer {key}"},
+        "limits": httpx.Limits(max_connections=max_connections,
+                               max_keepalive_connections=max_connections),
+        "timeout": timeout,
+    }
+
+
+class PostgrestClient:
+    """Blocking client with a pooled ``httpx.Client``; drop-in for the subset the backend uses."""
+
+    def __init__(self, url, key, max_connections=20, timeout=10.0):
+        self.url = url
+        self.key = key
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.http = httpx.Client(**_http_options(url, key, max_connections, timeout))
+
+    def table(self, name):
+        return _SyncQuery(self, name)
+
+    def rpc(self, name, params=None):
+        return _SyncRpc(self, name, params or {})
+
+    def async_client(self):
+        """An AsyncPostgrestClient for the same server."""
+        return AsyncPostgrestClient(self.url, self.key, self.max_connections, self.timeout)
+
+    def close(self):
+        self.http.close()
+
+
+class AsyncPostgrestClient:
+    """asyncio client over pooled ``httpx.AsyncClient``s; ``await query.execute()``.
+
+    httpcore's async pool scans every connection (with a readability syscall
+    each) whenever it hands out a connection, and every waiting request on top,
+    so one big pool spends more CPU on bookkeeping than on requests. The
+    connections are therefore split over small pools of ``shard_size``;
+    requests go to the least busy one and wait on a semaphore, never inside
+    httpcore.
+    """
+
+    def __init__(self, url, key, max_connections=100, timeout=10.0, shard_size=8):
+        shards = max(1, -(-max_connections // shard_size))
+        per_shard = -(-max_connections // shards)
+        self._pools = [httpx.AsyncClient(**_http_options(url, key, per_shard, timeout))
+                       for _ in range(shards)]
+        self._busy = [0] * shards
+        self._slots = asyncio.Semaphore(shards * per_shard)
+
+    def table(self, name):
+        return _AsyncQuery(self, name)
+
+    def rpc(self, name, params=None):
+        return _AsyncRpc(self, name, params or {})
+
+    async def send(self, request):
+        async with self._slots:
+            shard = min(range(len(self._busy)), key=self._busy.__getitem__)
+            self._busy[shard] += 1
+            try:
+                return _response(await self._pools[shard].request(**request))
+            finally:
+                self._busy[shard] -= 1
+
+    async def close(self):
+        for pool in self._pools:
+            await pool.aclose()
+
+
+class _ThreadedQuery:
+    """Records builder calls and replays them on the blocking client in a worker thread."""
+
+    def __init__(self, owner, start):
+        self._owner = owner
+        self._calls = [start]
+
+    def __getattr__(self, name):
+        def record(*args, **kwargs):
+            self._calls.append((name, args, kwargs))
+            return self
+        return record
+
+    def _run(self):
+        target = self._owner.client
+        for name, args, kwargs in self._calls:
+            target = getattr(target, name)(*args, **kwargs)
+        return target.execute()
+
+    async def execute(self):
+        return await asyncio.get_running_loop().run_in_executor(self._owner.executor, self._run)
+
+
+class ThreadedAsyncClient:
+    """Async facade over a blocking client (LocalSupabase, supabase-py)."""
+
+    def __init__(self, client, executor=None):
+        self.client = client
+        self.executor = executor
+
+    def table(self, name):
+        return _ThreadedQuery(self, ("table", (name,), {}))
+
+    def rpc(self, name, params=None):
+        return _ThreadedQuery(self, ("rpc", (name, params or {}), {}))
+
+    async def close(self):
+        pass
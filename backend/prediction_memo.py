@@ -0,0 +1,90 @@
+"""
+Bounded LRU memo of /predict results keyed on the scaled EEG vector.
+
+Repeated submissions of the same 19-channel vector (retries, re-submits, the
+demo sample_eeg.json, re-scoring of archived records) skip the forest and
+reuse the stored prediction, confidence scores and risk level.
+
+The key is a BLAKE2 digest of the scaled row, optionally rounded to
+``decimals`` places first. Scaled values are in standard-deviation units, so
+one ``decimals`` setting means the same tolerance on every channel; with
+rounding, vectors that agree to that many decimals share a result. Without
+it, only bit-identical vectors do.
+
+Every key starts with a tag for the LoadedModel object that scored it, so a
+result is only ever served for the model that produced it. During a
+hot-swap, requests still holding the old model and requests on the new one
+keep separate entries side by side instead of flushing each other's;
+entries of a replaced model are evicted by the LRU once they go unused.
+"""
+
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+
+class PredictionMemo:
+    """Thread-safe LRU of prediction results, keyed per serving model."""
+
+    def __init__(self, max_entries=4096, decimals=None):
+        self.max_entries = max_entries
+        self.decimals = decimals
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # LoadedModel -> tag; weak, so a retired model's id cannot be reused for a new one
+        self._model_tags = weakref.WeakKeyDictionary()
+        self._next_tag = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _model_tag(self, model):
+        with self._lock:
+            tag = self._model_tags.get(model)
+            if tag is None:
+                tag = self._model_tags[model] = self._next_tag
+                if self._next_tag:
+                    self.invalidations += 1
+                self._next_tag += 1
+            return tag
+
+    def key(self, model, scaled_row):
+        row = np.asarray(scaled_row, dtype=np.float64).ravel()
+        if self.decimals is not None:
+            # + 0.0 folds -0.0 into 0.0 so both round to the same bytes
+            row = np.round(row, self.decimals) + 0.0
+        return (f"{self._model_tag(model)}:{model.version}:"
+                + hashlib.blake2b(row.tobytes(), digest_size=16).hexdigest())
+
+    def get(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits,
+                    "misses": self.misses, "invalidations": self.invalidations}
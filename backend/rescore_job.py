@@ -0,0 +1,273 @@
+"""
+Offline re-scoring of stored patient_assessments with a new EEG model.
+
+Walks the table in primary-key order with keyset pagination
+(``id > last_id ORDER BY id LIMIT page_size``), so every page costs the same
+however far the job has got. Each page is handled in bulk:
+
+- the ``eeg_data`` JSON of the whole page is decoded with one ``json.loads``
+  and packed into an (n, 19) float64 matrix;
+- the page is scaled and scored with one ``predict_proba`` call on the
+  compiled forest;
+- rows whose prediction, risk level or model version changed are written
+  back with one upsert on ``id``. The API leaves ``confidence_score``
+  unset, so it is neither compared nor written.
+
+The next page is fetched in the background while the current one is being
+scored and written. After each page is written, a checkpoint file records
+the last id and the running counts, so a crashed or interrupted job resumes
+after the last completed page. Re-running a page is harmless, because the
+upsert is idempotent. Rows scored by /predict/fusion, and rows whose EEG is
+missing or malformed, are left as they are and counted.
+
+Usage (from backend/):
+    python rescore_job.py                          # Supabase, version the API would serve
+    python rescore_job.py --version v20261017-120000 --page-size 2000
+    python rescore_job.py --local 50000            # seeded in-process stand-in (local_supabase.py)
+    python rescore_job.py --postgrest-url http://localhost:54321  # local Supabase stack
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from features import eeg_columns, decode_eeg_blobs
+from scoring import get_risk_level
+
+TABLE = "patient_assessments"
+READ_COLUMNS = "id,patient_id,eeg_data,prediction,risk_level,model_version"
+DEFAULT_PAGE_SIZE = 1000
+
+
+# ---------------------------
+# Checkpoint
+# ---------------------------
+class Checkpoint:
+    """Job progress in a small JSON file, replaced atomically after every page."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return None
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, state):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+# ---------------------------
+# Job
+# ---------------------------
+class RescoreJob:
+    """Re-scores every assessment with ``model`` (a model_registry.LoadedModel)."""
+
+    COUNTERS = ("pages", "rows_read", "scored", "updated", "unchanged", "skipped_eeg", "skipped_fusion")
+    STAGES = ("fetch", "decode", "score", "write")
+
+    def __init__(self, client, model, page_size=DEFAULT_PAGE_SIZE, checkpoint_path="rescore_checkpoint.json",
+                 dry_run=False, max_pages=None, report_every=5.0):
+        self.client = client
+        self.model = model
+        self.page_size = page_size
+        self.checkpoint = Checkpoint(checkpoint_path)
+        self.dry_run = dry_run
+        self.max_pages = max_pages
+        self.report_every = report_every
+        self.state = None
+
+    def _fresh_state(self):
+        return {"model_version": self.model.version, "last_id": None, "done": False,
+                "started_at": datetime.utcnow().isoformat(), "elapsed_seconds": 0.0,
+                **{key: 0 for key in self.COUNTERS},
+                "stage_seconds": {stage: 0.0 for stage in self.STAGES}}
+
+    def _resume(self, restart):
+        state = None if restart else self.checkpoint.load()
+        if state is not None and state.get("model_version") != self.model.version:
+            print(f"[Rescore] Checkpoint is for {state.get('model_version')}, "
+                  f"starting over for {self.model.version}")
+            state = None
+        if state is None:
+            return self._fresh_state()
+        if not state["done"]:
+            print(f"[Rescore] Resuming after id {state['last_id']} ({state['rows_read']} rows done)")
+        return state
+
+    def _fetch(self, after_id):
+        query = self.client.table(TABLE).select(READ_COLUMNS)
+        if after_id is not None:
+            query = query.gt("id", after_id)
+        return query.order("id").limit(self.page_size).execute().data or []
+
+    def _score(self, rows):
+        """Upsert payload for the rows of one page whose stored result changed."""
+        state = self.state
+        t0 = time.perf_counter()
+        candidates = []
+        for row in rows:
+            if str(row.get("model_version") or "").startswith("fusion:"):
+                state["skipped_fusion"] += 1
+            else:
+                candidates.append(row)
+        matrix, index = decode_eeg_blobs([row.get("eeg_data") for row in candidates])
+        state["skipped_eeg"] += len(candidates) - len(index)
+        t1 = time.perf_counter()
+        state["stage_seconds"]["decode"] += t1 - t0
+
+        updates = []
+        if index:
+            labels, _ = self.model.predict(matrix)
+            now = datetime.utcnow().isoformat()
+            for i, label in zip(index, labels.tolist()):
+                row = candidates[i]
+                label = str(label)
+                # Only the fields scoring recomputes; anything else on the row is left alone
+                result = {"prediction": label, "risk_level": get_risk_level(label),
+                          "model_version": self.model.version}
+                if all(row.get(k) == v for k, v in result.items()):
+                    state["unchanged"] += 1
+                    continue
+                # patient_id is NOT NULL, so PostgREST needs it even when the row already exists
+                updates.append({"id": row["id"], "patient_id": row["patient_id"], **result, "updated_at": now})
+            state["scored"] += len(index)
+        state["stage_seconds"]["score"] += time.perf_counter() - t1
+        return updates
+
+    def _write(self, updates):
+        t0 = time.perf_counter()
+        if updates and not self.dry_run:
+            self.client.table(TABLE).upsert(updates, on_conflict="id").execute()
+        self.state["updated"] += len(updates)
+        self.state["stage_seconds"]["write"] += time.perf_counter() - t0
+
+    def run(self, restart=False):
+        """Re-score from the checkpoint (or the start) to the end of the table; returns the final state."""
+        self.state = state = self._resume(restart)
+        if state["done"]:
+            print(f"[Rescore] Already complete for {state['model_version']}; use --restart to run again")
+            return state
+
+        started = time.perf_counter() - state["elapsed_seconds"]
+        last_report = time.perf_counter()
+        pages_this_run = 0
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="rescore-fetch") as fetcher:
+            pending = fetcher.submit(self._fetch, state["last_id"])
+            while True:
+                t0 = time.perf_counter()
+                rows = pending.result()
+                state["stage_seconds"]["fetch"] += time.perf_counter() - t0
+                if not rows:
+                    state["done"] = True
+                    break
+                # Keyset: the next page only needs this page's last id, so read it while we score
+                more = len(rows) == self.page_size and (self.max_pages is None or pages_this_run + 1 < self.max_pages)
+                if more:
+                    pending = fetcher.submit(self._fetch, rows[-1]["id"])
+
+                self._write(self._score(rows))
+                state["pages"] += 1
+                state["rows_read"] += len(rows)
+                state["last_id"] = rows[-1]["id"]
+                state["elapsed_seconds"] = time.perf_counter() - started
+                pages_this_run += 1
+                if not self.dry_run:
+                    self.checkpoint.save(state)
+
+                if time.perf_counter() - last_report >= self.report_every:
+                    last_report = time.perf_counter()
+                    print(f"[Rescore] {state['rows_read']} rows, {state['updated']} updated, "
+                          f"{state['rows_read'] / state['elapsed_seconds']:.0f} rows/s")
+                if not more:
+                    state["done"] = len(rows) < self.page_size
+                    break
+
+        state["elapsed_seconds"] = time.perf_counter() - started
+        if not self.dry_run:
+            self.checkpoint.save(state)
+        self.report()
+        return state
+
+    def report(self):
+        state = self.state
+        elapsed = max(state["elapsed_seconds"], 1e-9)
+        stages = ", ".join(f"{k} {v:.2f}s" for k, v in state["stage_seconds"].items())
+        print(f"[Rescore] {'Done' if state['done'] else 'Stopped'}: {state['rows_read']} rows in "
+              f"{state['pages']} pages, {elapsed:.2f}s ({state['rows_read'] / elapsed:.0f} rows/s)")
+        print(f"[Rescore] scored {state['scored']}, updated {state['updated']}, unchanged {state['unchanged']}, "
+              f"skipped {state['skipped_eeg']} without usable EEG and {state['skipped_fusion']} fusion rows")
+        print(f"[Rescore] stage time: {stages}")
+
+
+# ---------------------------
+# CLI
+# ---------------------------
+def seed_local(client, n, path="dataset.csv", seed=0):
+    """Fill a LocalSupabase with ``n`` assessments built from dataset.csv rows, as the API stores them."""
+    import pandas as pd
+
+    data = pd.read_csv(path)[eeg_columns].values
+    rng = np.random.default_rng(seed)
+    picks = data[rng.integers(0, len(data), size=n)].tolist()
+    rows = [{"patient_id": f"P{i:07d}", "eeg_data": json.dumps(dict(zip(eeg_columns, values))),
+             "prediction": "ADHD", "risk_level": "high", "model_version": "old",
+             "assessment_date": datetime.utcnow().isoformat()} for i, values in enumerate(picks)]
+    for start in range(0, n, 10000):
+        client.table(TABLE).insert(rows[start:start + 10000]).execute()
+    return client
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--version", help="model version under models/versions (default: the one the API serves)")
+    parser.add_argument("--versions-dir", default=os.environ.get("MODEL_VERSIONS_DIR", "models/versions"))
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument("--checkpoint", default="rescore_checkpoint.json")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the first row")
+    parser.add_argument("--dry-run", action="store_true", help="score but do not write rows or the checkpoint")
+    parser.add_argument("--max-pages", type=int, help="stop after this many pages (resume later)")
+    parser.add_argument("--local", type=int, metavar="N", help="run against a LocalSupabase seeded with N rows")
+    parser.add_argument("--postgrest-url",
+                        help="base URL of another Supabase stack, e.g. a local `supabase start` (key from SUPABASE_KEY)")
+    args = parser.parse_args(argv)
+
+    from model_registry import ModelRegistry
+
+    registry = ModelRegistry(versions_dir=args.versions_dir, poll_interval=0)
+    model = registry.load(args.version or registry.desired_version())
+
+    if args.local:
+        from local_supabase import LocalSupabase
+        client = seed_local(LocalSupabase(), args.local)
+    elif args.postgrest_url:
+        from postgrest_client import PostgrestClient
+        from supabase_config import SUPABASE_KEY
+        client = PostgrestClient(args.postgrest_url, SUPABASE_KEY)
+    else:
+        from supabase_config import get_supabase
+        client = get_supabase()
+
+    # A seeded stand-in does not outlive the run, so neither should its checkpoint
+    checkpoint = None if args.local else args.checkpoint
+    job = RescoreJob(client, model, page_size=args.page_size, checkpoint_path=checkpoint,
+                     dry_run=args.dry_run, max_pages=args.max_pages)
+    state = job.run(restart=args.restart)
+    return 0 if state["done"] or args.max_pages else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,161 @@
+"""
+LRU + TTL response cache for the read-only assessment endpoints.
+
+Entries are keyed by route path and sorted query string, bounded by entry
+count and total body bytes, and expire after ``ttl`` seconds. Each entry
+carries tags (e.g. ``"assessments"``, ``"patient:P001"``, ``"stats"``) so the
+insert path can drop exactly the entries a new assessment makes stale. Every
+cached response gets a strong ETag, and a matching If-None-Match is answered
+with an empty 304.
+
+Every tag also has a generation counter that ``invalidate`` bumps. A
+response is stored only if none of its tags were invalidated while it was
+being built, so a read that raced an insert cannot re-cache stale data.
+
+The cache is per process: inserts made by another worker are only picked up
+here once the TTL expires.
+"""
+
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from flask import Response, request
+
+
+class _Entry:
+    __slots__ = ("body", "etag", "mimetype", "tags", "expires")
+
+    def __init__(self, body, etag, mimetype, tags, expires):
+        self.body = body
+        self.etag = etag
+        self.mimetype = mimetype
+        self.tags = tags
+        self.expires = expires
+
+
+class ResponseCache:
+    """Thread-safe, size-capped LRU of response bodies with TTL and tag invalidation."""
+
+    def __init__(self, max_entries=256, max_bytes=8 * 1024 * 1024, ttl=30.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._generations = {}   # tag -> number of invalidations
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def generation(self, tags):
+        """Snapshot of ``tags``' invalidation counters, taken before building a response."""
+        with self._lock:
+            return {tag: self._generations.get(tag, 0) for tag in tags}
+
+    def put(self, key, body, mimetype, tags, generation=None):
+        """Store a response; skipped (None) if too big or a tag changed since ``generation``."""
+        if len(body) > self.max_bytes:
+            return None
+        etag = hashlib.sha1(body).hexdigest()
+        entry = _Entry(body, etag, mimetype, frozenset(tags), time.monotonic() + self.ttl)
+        with self._lock:
+            if generation is not None and any(
+                    self._generations.get(tag, 0) != seen for tag, seen in generation.items()):
+                return None
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+        return entry
+
+    def invalidate(self, *tags):
+        """Drop every entry carrying any of ``tags``."""
+        tags = set(tags)
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+            for key in [k for k, e in self._entries.items() if e.tags & tags]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+    def invalidate_for_rows(self, rows):
+        """AssessmentWriter listener: new rows change list pages, stats and their patients' pages."""
+        tags = {"assessments", "stats"}
+        tags.update(f"patient:{row.get('patient_id')}" for row in rows)
+        self.invalidate(*tags)
+
+
+def cache_key(path, items):
+    """Entry key for a route path and its (name, value) query pairs, in a canonical order."""
+    return path + "?" + urlencode(sorted(items))
+
+
+def _not_modified(etag):
+    return etag in request.if_none_match
+
+
+def cached(cache, tags):
+    """Cache a view's 200 responses in ``cache``.
+
+    ``tags`` is a callable receiving the view's keyword arguments and
+    returning the entry's invalidation tags.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = cache_key(request.path, request.args.items(multi=True))
+            entry = cache.get(key)
+            if entry is None:
+                entry_tags = tags(**kwargs)
+                generation = cache.generation(entry_tags)
+                rv = view(*args, **kwargs)
+                response = rv if isinstance(rv, Response) else None
+                if response is None or response.status_code != 200:
+                    return rv
+                entry = cache.put(key, response.get_data(), response.mimetype, entry_tags, generation)
+                if entry is None:
+                    return response
+                status = "MISS"
+            else:
+                status = "HIT"
+
+            if _not_modified(entry.etag):
+                response = Response(status=304)
+            else:
+                response = Response(entry.body, mimetype=entry.mimetype)
+            response.set_etag(entry.etag)
+            response.headers["X-Cache"] = status
+            return response
+        return wrapper
+    return decorator
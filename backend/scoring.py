@@ -0,0 +1,137 @@
+"""
+Vectorized questionnaire + heuristic scoring for the multimodal model.
+
+Replaces the per-row ``heuristic_flags_weighted`` / ``final_prediction``
+logic in main.py. Everything works on an
+(N, 20) float matrix of Q1..Q20 answers (NaN past the end of a short
+questionnaire) plus per-row answer counts and an (N, 2) matrix of
+medical-history flags, so a batch is scored in a few NumPy passes:
+
+- ODD (Q11-Q13), Dyslexia (Q14-Q16) and ASD (Q17-Q20) subscale means, each
+  0 when the questionnaire is too short to contain the subscale, and pulled
+  halfway to 1 by the matching family-history flag;
+- a subscale is "Possible" at a score >= 0.5;
+- the multimodal model input: scaled EEG followed by Q1..Q10 mapped from
+  1-5 to 0-1.
+
+``get_risk_level`` maps a final label to the stored risk level; the API and
+the offline re-scoring job (rescore_job.py) both use it.
+
+The rules are unchanged from the per-row code, including the 0.5 threshold
+being applied to raw 1-5 answers. tests/test_scoring.py checks parity
+against the original per-row functions.
+"""
+
+import numpy as np
+
+N_QUESTIONS = 20
+N_MODEL_QUESTIONS = 10
+
+# name -> (first question index, end index, medical_history key or None)
+SUBSCALES = {
+    "ODD": (10, 13, "family_adhd"),
+    "Dyslexia": (13, 16, "family_learning_disorders"),
+    "ASD": (16, 20, None),
+}
+SUBSCALE_NAMES = tuple(SUBSCALES)
+HISTORY_KEYS = tuple(key for _, _, key in SUBSCALES.values() if key)
+POSSIBLE_THRESHOLD = 0.5
+
+
+# ---------------------------
+# Encoding
+# ---------------------------
+def encode_responses(questionnaires):
+    """Pack answer lists into an (N, 20) float matrix (NaN-padded) and (N,) answer counts."""
+    responses = np.full((len(questionnaires), N_QUESTIONS), np.nan)
+    counts = np.empty(len(questionnaires), dtype=np.int64)
+    for i, answers in enumerate(questionnaires):
+        answers = list(answers)
+        counts[i] = len(answers)
+        if answers:
+            responses[i, :min(len(answers), N_QUESTIONS)] = answers[:N_QUESTIONS]
+    return responses, counts
+
+
+def encode_history(histories):
+    """(N, len(HISTORY_KEYS)) bool matrix: True where the history answer is "yes" (any case)."""
+    flags = np.zeros((len(histories), len(HISTORY_KEYS)), dtype=bool)
+    for i, history in enumerate(histories):
+        history = history or {}
+        for j, key in enumerate(HISTORY_KEYS):
+            flags[i, j] = str(history.get(key, "No")).lower() == "yes"
+    return flags
+
+
+# ---------------------------
+# Scoring
+# ---------------------------
+def subscale_scores(responses, counts, history):
+    """Dict of subscale name -> (N,) weighted score."""
+    scores = {}
+    with np.errstate(invalid="ignore"):
+        for name, (start, end, key) in SUBSCALES.items():
+            answered = counts >= end
+            score = np.where(answered, responses[:, start:end].mean(axis=1), 0.0)
+            if key is not None:
+                family = history[:, HISTORY_KEYS.index(key)]
+                score = np.where(family, (score + 1) / 2, score)
+            scores[name] = score
+    return scores
+
+
+def possible_matrix(scores):
+    """(N, 3) bool matrix of "Possible" flags in SUBSCALE_NAMES order."""
+    return np.column_stack([scores[name] >= POSSIBLE_THRESHOLD for name in SUBSCALE_NAMES])
+
+
+def flags_from_possible(possible_row):
+    return {name: "Possible" if flag else "Unlikely" for name, flag in zip(SUBSCALE_NAMES, possible_row)}
+
+
+def normalize_answers(answers):
+    """Map 1-5 answers to 0-1."""
+    return (np.asarray(answers, dtype=np.float64) - 1) / 4
+
+
+def model_inputs(eeg_scaled, responses):
+    """(N, n_eeg + 10) multimodal model input: scaled EEG then normalized Q1..Q10."""
+    return np.hstack([eeg_scaled, normalize_answers(responses[:, :N_MODEL_QUESTIONS])])
+
+
+def final_labels(eeg_predictions, possible):
+    """"ADHD" where the model says so, else the first possible subscale, else "Healthy"."""
+    names = np.array(SUBSCALE_NAMES + ("Healthy",), dtype=object)
+    first = np.where(possible.any(axis=1), possible.argmax(axis=1), len(SUBSCALE_NAMES))
+    labels = names[first]
+    return np.where(np.asarray(eeg_predictions) == "ADHD", "ADHD", labels).tolist()
+
+
+# ---------------------------
+# Single-row helpers (previous per-row API)
+# ---------------------------
+def heuristic_flags_weighted(questionnaire, medical_history=None):
+    """{"ODD": ..., "Dyslexia": ..., "ASD": ...} flags for one questionnaire."""
+    responses, counts = encode_responses([questionnaire])
+    possible = possible_matrix(subscale_scores(responses, counts, encode_history([medical_history])))
+    return flags_from_possible(possible[0])
+
+
+def final_label(eeg_pred, question_flags):
+    """Combine one model prediction with its heuristic flags dict."""
+    if eeg_pred == "ADHD":
+        return "ADHD"
+    possible = [name for name, flag in question_flags.items() if flag == "Possible"]
+    return possible[0] if possible else "Healthy"
+
+
+# ---------------------------
+# Risk level
+# ---------------------------
+def get_risk_level(prediction):
+    """Determine risk level based on prediction."""
+    if prediction == 'ADHD':
+        return 'high'
+    elif prediction in ['ODD', 'ASD', 'Dyslexia']:
+        return 'moderate'
+    return 'low'
@@ -0,0 +1,160 @@
+"""
+Recording-level scoring: one verdict per EEG session instead of per sample.
+
+Rows are scored chunk by chunk with the same scaler and compiled forest that
+serve /predict, optionally averaged over sliding windows, and folded into
+running sums so a recording of any length is aggregated in constant memory.
+The result is the mean class probability over all rows (or windows) with a
+normal-approximation confidence interval, plus the per-unit vote split.
+
+The interval treats units as independent; consecutive EEG samples are
+correlated, so read it as a lower bound on the true uncertainty. Overlapping
+windows are accounted for by shrinking the effective sample size by
+step / window.
+
+Usage:
+    python session_scorer.py ADHD_Unlabeled_EEG_2500.csv --window 250 --step 125
+"""
+
+import argparse
+import json
+from statistics import NormalDist
+
+import numpy as np
+
+
+class SessionAccumulator:
+    """Streaming aggregate of per-row class probabilities for one recording."""
+
+    def __init__(self, classes, window=None, step=None):
+        if window is not None and window < 1:
+            raise ValueError("'window' must be a positive number of rows")
+        self.classes = list(classes)
+        self.window = window
+        self.step = step or window
+        if self.step is not None and self.step < 1:
+            raise ValueError("'step' must be a positive number of rows")
+        n_classes = len(self.classes)
+        self.rows = 0
+        self.units = 0
+        self._sum = np.zeros(n_classes)
+        self._sumsq = np.zeros(n_classes)
+        self._votes = np.zeros(n_classes, dtype=np.int64)
+        # Sliding-window state: rows not yet covered by a complete window
+        self._carry = np.empty((0, n_classes))
+        self._carry_start = 0       # row index of _carry[0]
+        self._next_start = 0        # row index where the next window begins
+
+    def add(self, probabilities):
+        """Fold in the class probabilities of the next rows of the recording."""
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+        self.rows += len(probabilities)
+        if self.window is None:
+            self._fold(probabilities)
+            return
+
+        buf = np.concatenate([self._carry, probabilities])
+        first = self._next_start - self._carry_start
+        last = len(buf) - self.window
+        if last >= first:
+            starts = np.arange(first, last + 1, self.step)
+            cumulative = np.concatenate([np.zeros((1, buf.shape[1])), np.cumsum(buf, axis=0)])
+            self._fold((cumulative[starts + self.window] - cumulative[starts]) / self.window)
+            self._next_start = self._carry_start + int(starts[-1]) + self.step
+        drop = min(self._next_start - self._carry_start, len(buf))
+        self._carry = buf[drop:]
+        self._carry_start += drop
+
+    def _fold(self, units):
+        if not len(units):
+            return
+        self.units += len(units)
+        self._sum += units.sum(axis=0)
+        self._sumsq += np.square(units).sum(axis=0)
+        self._votes += np.bincount(np.argmax(units, axis=1), minlength=len(self.classes))
+
+    def result(self, confidence=0.95):
+        """Recording-level probabilities, confidence intervals and vote split."""
+        if self.units == 0:
+            raise ValueError("Recording has too few valid rows to score"
+                             + (f" (window={self.window})" if self.window else ""))
+        n = self.units
+        mean = self._sum / n
+        var = np.maximum(self._sumsq / n - np.square(mean), 0.0) * (n / (n - 1) if n > 1 else 0.0)
+        n_eff = n * (min(self.step, self.window) / self.window) if self.window else n
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        half = z * np.sqrt(var / max(n_eff, 1.0))
+
+        verdict = self.classes[int(np.argmax(mean))]
+        return {
+            "prediction": verdict,
+            "probabilities": {c: round(float(p), 4) for c, p in zip(self.classes, mean)},
+            "confidence_intervals": {
+                c: [round(float(max(m - h, 0.0)), 4), round(float(min(m + h, 1.0)), 4)]
+                for c, m, h in zip(self.classes, mean, half)
+            },
+            "confidence_level": confidence,
+            "vote_fraction": {c: round(float(v) / n, 4) for c, v in zip(self.classes, self._votes)},
+            "rows_scored": self.rows,
+            "units": n,
+            "unit": "window" if self.window else "row",
+            "window": self.window,
+            "step": self.step,
+        }
+
+
+def score_session(model, chunks, window=None, step=None, confidence=0.95, max_errors=20):
+    """Score a whole recording given eeg_stream RowChunks and a LoadedModel."""
+    acc = SessionAccumulator(model.classes, window=window, step=step)
+    failed = 0
+    errors = []
+    for chunk in chunks:
+        failed += len(chunk.errors)
+        errors.extend({"row": n, "error": e} for n, e in chunk.errors[:max_errors - len(errors)])
+        if len(chunk.values):
+            _, probabilities = model.predict(chunk.values)
+            acc.add(probabilities)
+    result = acc.result(confidence)
+    result["rows_failed"] = failed
+    result["errors"] = errors
+    return result
+
+
+def parse_session_params(args):
+    """window / step / confidence from a query-string-like mapping."""
+    try:
+        window = int(args["window"]) if args.get("window") else None
+        step = int(args["step"]) if args.get("step") else None
+        confidence = float(args.get("confidence", 0.95))
+    except ValueError:
+        raise ValueError("'window' and 'step' must be integers and 'confidence' a number")
+    if not 0 < confidence < 1:
+        raise ValueError("'confidence' must be between 0 and 1")
+    if step is not None and window is None:
+        raise ValueError("'step' requires 'window'")
+    return window, step, confidence
+
+
+if __name__ == "__main__":
+    import warnings
+
+    from eeg_stream import iter_csv_chunks
+    from model_registry import ModelRegistry
+
+    warnings.filterwarnings('ignore', category=UserWarning)
+
+    parser = argparse.ArgumentParser(description="Score whole EEG recordings from local CSV files")
+    parser.add_argument("csv", nargs="+", help="CSV files with the 19 EEG channel columns")
+    parser.add_argument("--window", type=int, help="rows per sliding window (default: per-row)")
+    parser.add_argument("--step", type=int, help="rows between window starts (default: window)")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--chunk-rows", type=int, default=4096)
+    args = parser.parse_args()
+
+    model = ModelRegistry().get()
+    for path in args.csv:
+        with open(path, "rb") as f:
+            result = score_session(model, iter_csv_chunks(f, args.chunk_rows),
+                                   window=args.window, step=args.step, confidence=args.confidence)
+        result["file"] = path
+        print(json.dumps(result))
@@ -0,0 +1,265 @@
+"""
+Nearest-neighbour search over scaled 19-channel EEG vectors.
+
+The index holds the dataset.csv recordings and every stored assessment as
+one contiguous float32 matrix in the serving model's scaled space. A
+query is an exact brute-force search:
+
+    d^2 = |x|^2 - 2 x.q + |q|^2
+
+Squared norms are kept up to date on insert, so a search costs one float32
+matrix-vector product (BLAS), an ``argpartition`` for the top k and an exact
+float64 re-check of those k. The scaled matrix is stored channel-major,
+(19, n). A (n, 19) layout hands BLAS a million 19-element dot products and
+runs about 3x slower. At 10^6 vectors a search takes about 8 ms on one
+core (``python -m benchmarks.similarity_search --trees``). On tightly
+clustered data a KD-tree answers faster. But it has to be rebuilt to take
+new rows, which costs seconds at that size, while appends to the flat
+matrix are free and the scan is always exact.
+
+New assessments are appended as the write-behind writer stores them
+(``record`` is an AssessmentWriter listener). Raw vectors are kept next to the
+scaled ones, so when the registry swaps in a model with a different scaler,
+the index is re-scaled on the next search.
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+
+from features import eeg_columns, decode_eeg_blobs
+
+TABLE = "patient_assessments"
+FETCH_COLUMNS = "id,patient_id,prediction,assessment_date,eeg_data"
+SOURCES = ("dataset", "assessment")
+
+
+class SimilarityIndex:
+    """Append-only float32 EEG matrix with exact top-k search.
+
+    ``model_source`` returns the serving model_registry.LoadedModel; its
+    scaler defines the space the distances are measured in.
+    """
+
+    def __init__(self, model_source, dataset_path="dataset.csv", page_size=1000, retry_interval=30):
+        self.model_source = model_source
+        self.dataset_path = dataset_path or None
+        self.page_size = page_size
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._dataset_rows = None    # rows indexed from dataset.csv once it has been read
+        self._accepting = False      # listener rows are appended while/after the table scan
+        self.ready = False
+        self.n = 0
+        dim = len(eeg_columns)
+        self._raw = np.empty((0, dim), dtype=np.float32)
+        self._scaled = np.empty((dim, 0), dtype=np.float32)   # channel-major
+        self._norms = np.empty(0, dtype=np.float32)
+        self._source = np.empty(0, dtype=np.int8)
+        self._label = np.empty(0, dtype=np.int32)
+        self._labels = []          # label code -> prediction / dataset class
+        self._label_codes = {}
+        self._refs = []            # per row: dataset row number, or (id, patient_id, assessment_date)
+        self._scaler = None
+
+    # ---------------------------
+    # Inserts
+    # ---------------------------
+    def _label_code(self, label):
+        label = label or "Unknown"
+        code = self._label_codes.get(label)
+        if code is None:
+            code = self._label_codes[label] = len(self._labels)
+            self._labels.append(label)
+        return code
+
+    def _grow(self, m):
+        if self.n + m <= len(self._raw):
+            return
+        capacity = max(1024, 2 * (self.n + m))
+        scaled = np.empty((self._scaled.shape[0], capacity), dtype=np.float32)
+        scaled[:, :self.n] = self._scaled[:, :self.n]
+        self._scaled = scaled
+        for name in ("_raw", "_norms", "_source", "_label"):
+            array = getattr(self, name)
+            grown = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:self.n] = array[:self.n]
+            setattr(self, name, grown)
+
+    def add(self, raw, source, labels, refs):
+        """Append (m, 19) raw EEG rows with their source ("dataset"/"assessment"), labels and refs."""
+        raw = np.asarray(raw, dtype=np.float32).reshape(-1, len(eeg_columns))
+        if not len(raw):
+            return 0
+        model = self.model_source()
+        scaled = model.scaler.transform(raw.astype(np.float64)).astype(np.float32)
+        with self._lock:
+            if self._scaler is not None and self._scaler is not model.scaler:
+                self._rescale(model.scaler)
+            self._scaler = model.scaler
+            self._grow(len(raw))
+            end = self.n + len(raw)
+            self._raw[self.n:end] = raw
+            self._scaled[:, self.n:end] = scaled.T
+            self._norms[self.n:end] = np.einsum("ij,ij->i", scaled, scaled)
+            self._source[self.n:end] = SOURCES.index(source)
+            self._label[self.n:end] = [self._label_code(label) for label in labels]
+            # Refs past ``n`` belong to a rolled-back scan (kept so searches holding the list stay valid)
+            del self._refs[self.n:]
+            self._refs.extend(refs)
+            # Publish the rows only once they are fully written
+            self.n = end
+        return len(raw)
+
+    def add_assessments(self, rows):
+        """Append stored or just-inserted assessment rows; rows without usable EEG are skipped."""
+        matrix, index = decode_eeg_blobs([row.get("eeg_data") for row in rows])
+        kept = [rows[i] for i in index]
+        return self.add(matrix, "assessment", [row.get("prediction") for row in kept],
+                        [(row.get("id"), row.get("patient_id"), row.get("assessment_date")) for row in kept])
+
+    def record(self, rows):
+        """AssessmentWriter listener; a no-op until the table scan has begun."""
+        if self._accepting:
+            self.add_assessments(rows)
+
+    def _rescale(self, scaler):
+        """Re-scale every row into new arrays (caller holds the lock).
+
+        Searches that already took views of the old arrays keep reading
+        consistent data; the new arrays are published by reference swap.
+        """
+        scaled = scaler.transform(self._raw[:self.n].astype(np.float64)).astype(np.float32)
+        fresh = np.empty_like(self._scaled)
+        fresh[:, :self.n] = scaled.T
+        norms = np.empty_like(self._norms)
+        norms[:self.n] = np.einsum("ij,ij->i", scaled, scaled)
+        self._scaled, self._norms, self._scaler = fresh, norms, scaler
+
+    # ---------------------------
+    # Loading
+    # ---------------------------
+    def load_dataset(self):
+        import pandas as pd
+
+        data = pd.read_csv(self.dataset_path)
+        labels = data["Class"].astype(str).tolist() if "Class" in data else [None] * len(data)
+        return self.add(data[eeg_columns].values, "dataset", labels, list(range(len(data))))
+
+    def load_assessments(self, client):
+        """Add every stored assessment, reading the table in id-keyed pages."""
+        added, after = 0, None
+        while True:
+            query = client.table(TABLE).select(FETCH_COLUMNS)
+            if after is not None:
+                query = query.gt("id", after)
+            rows = query.order("id").limit(self.page_size).execute().data or []
+            if not rows:
+                break
+            added += self.add_assessments(rows)
+            after = rows[-1]["id"]
+            if len(rows) < self.page_size:
+                break
+        return added
+
+    def load(self, client_factory):
+        """Index dataset.csv (once) and the stored assessments; sets ``ready``.
+
+        A failed table scan is rolled back to the dataset rows and re-raised,
+        so a retry starts from a clean index.
+        """
+        if self.ready:
+            return
+        t0 = time.perf_counter()
+        if self._dataset_rows is None:
+            try:
+                self._dataset_rows = self.load_dataset() if self.dataset_path else 0
+            except Exception as e:
+                # A missing or unreadable dataset will not fix itself; index assessments only
+                print(f"[Similarity] Dataset not indexed: {str(e)}")
+                self._dataset_rows = 0
+        mark = self.n
+        # Listener rows from here on are appended and the page scan covers the
+        # rest; a row stored while the scan runs can be indexed twice
+        self._accepting = True
+        try:
+            stored = self.load_assessments(client_factory())
+        except Exception:
+            with self._lock:
+                self._accepting = False
+                self.n = mark
+            raise
+        self.ready = True
+        print(f"[Similarity] Indexed {self._dataset_rows} dataset rows and {stored} assessments "
+              f"in {time.perf_counter() - t0:.2f}s")
+
+    def start(self, client_factory):
+        """Build the index on a background thread once per process, retrying a failed load."""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._thread = threading.Thread(target=self._loop, args=(client_factory,),
+                                            name="similarity-load", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _loop(self, client_factory):
+        while not self.ready:
+            try:
+                self.load(client_factory)
+            except Exception as e:
+                print(f"[Similarity] Load failed, retrying in {self.retry_interval}s: {str(e)}")
+                time.sleep(self.retry_interval)
+
+    # ---------------------------
+    # Search
+    # ---------------------------
+    def search(self, eeg_values, k=10, source=None):
+        """The ``k`` nearest rows to a raw (19,) EEG vector, nearest first.
+
+        ``source`` ("dataset" or "assessment") restricts the candidates.
+        """
+        model = self.model_source()
+        query = model.scaler.transform(np.asarray(eeg_values, dtype=np.float64).reshape(1, -1))[0]
+        with self._lock:
+            if self._scaler is not None and self._scaler is not model.scaler:
+                self._rescale(model.scaler)
+            n = self.n
+            scaled, norms, sources = self._scaled[:, :n], self._norms[:n], self._source[:n]
+            labels, refs, names = self._label[:n], self._refs, list(self._labels)
+
+        # |x|^2 - 2 x.q; |q|^2 is the same for every row and does not change the ranking
+        distances = (-2 * query.astype(np.float32)) @ scaled
+        distances += norms
+        if source is not None:
+            distances = np.where(sources == SOURCES.index(source), distances, np.inf)
+        k = min(k, n)
+        if k <= 0:
+            return []
+        top = np.argpartition(distances, k - 1)[:k] if k < n else np.arange(n)
+        top = top[np.isfinite(distances[top])]
+        # Exact distances for the winners only
+        exact = np.sqrt(((scaled[:, top].T.astype(np.float64) - query) ** 2).sum(axis=1))
+        order = np.argsort(exact, kind="stable")
+
+        results = []
+        for i, distance in zip(top[order].tolist(), exact[order].tolist()):
+            hit = {"source": SOURCES[sources[i]], "distance": round(distance, 6), "prediction": names[labels[i]]}
+            if sources[i] == 0:
+                hit["dataset_row"] = refs[i]
+            else:
+                hit["assessment_id"], hit["patient_id"], hit["assessment_date"] = refs[i]
+            results.append(hit)
+        return results
+
+    def status(self):
+        sources = self._source[:self.n]
+        return {"size": self.n, "dataset_rows": int((sources == 0).sum()),
+                "assessment_rows": int((sources == 1).sum()), "started": self.ready}
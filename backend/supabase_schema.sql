@@ -31,6 +31,11 @@ CREATE TABLE IF NOT EXISTS patient_assessments (
     prediction TEXT NOT NULL,
     risk_level TEXT,
     confidence_score FLOAT,
+    model_version TEXT,
+    
+    -- Client-generated idempotency key: the API's write-behind writer upserts
+    -- on it, so a replayed journal never stores an assessment twice
+    submission_id UUID UNIQUE,
     
     -- Metadata
     assessment_date TIMESTAMPTZ DEFAULT NOW(),
@@ -57,7 +62,39 @@ CREATE POLICY "Allow anonymous update" ON patient_assessments
     USING (true)
     WITH CHECK (true);
 
+-- Existing deployments: record which model version produced each assessment
+ALTER TABLE patient_assessments ADD COLUMN IF NOT EXISTS model_version TEXT;
+
+-- Existing deployments: idempotency key for the write-behind writer (see assessment_writer.py)
+ALTER TABLE patient_assessments ADD COLUMN IF NOT EXISTS submission_id UUID UNIQUE;
+
 -- Index for faster lookups
 CREATE INDEX idx_patient_id ON patient_assessments(patient_id);
 CREATE INDEX idx_assessment_date ON patient_assessments(assessment_date DESC);
 CREATE INDEX idx_prediction ON patient_assessments(prediction);
+
+-- Patient ID prefix search (patient_id LIKE 'ABC%') used by GET /assessments?patient_prefix=
+CREATE INDEX IF NOT EXISTS idx_patient_id_prefix ON patient_assessments(patient_id text_pattern_ops);
+
+-- Keyset pagination orders by (assessment_date DESC, id DESC); the id tie-breaker
+-- keeps pages stable when several assessments share a timestamp
+CREATE INDEX IF NOT EXISTS idx_assessment_date_id ON patient_assessments(assessment_date DESC, id DESC);
+
+-- Grouped counts for GET /assessments/stats, computed in the database so the
+-- API never downloads rows. Called as supabase.rpc('assessment_stats', {...}).
+CREATE OR REPLACE FUNCTION assessment_stats(
+    start_date DATE DEFAULT NULL,
+    end_date DATE DEFAULT NULL
+)
+RETURNS TABLE (day DATE, prediction TEXT, risk_level TEXT, n BIGINT)
+LANGUAGE sql STABLE
+AS $$
+    SELECT (assessment_date AT TIME ZONE 'UTC')::date AS day,
+           prediction,
+           risk_level,
+           COUNT(*) AS n
+    FROM patient_assessments
+    WHERE (start_date IS NULL OR assessment_date >= start_date)
+      AND (end_date IS NULL OR assessment_date < end_date + 1)
+    GROUP BY 1, 2, 3;
+$$;
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The app loads models/ and dataset.csv relative to backend/
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+os.chdir(BACKEND)
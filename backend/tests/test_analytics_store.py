@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+import time
+
+from analytics_store import AnalyticsStore, CURRENT_FILE, KEEP_SNAPSHOTS
+from local_supabase import LocalSupabase
+from rescore_job import seed_local
+
+
+def test_prune_keeps_other_live_workers_snapshots(tmp_path):
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    other = os.getppid()
+    for name in (f"20260101-000000-000000-{other}", f"20260101-000001-000000-{exited.pid}",
+                 *(f"20260101-00000{i}-000000-{os.getpid()}" for i in range(2, 7))):
+        os.makedirs(tmp_path / name)
+
+    store = AnalyticsStore(str(tmp_path))
+    store.save()
+    remaining = sorted(d for d in os.listdir(tmp_path) if d != CURRENT_FILE)
+    assert f"20260101-000000-000000-{other}" in remaining
+    assert f"20260101-000001-000000-{exited.pid}" not in remaining
+    assert sum(d.endswith(f"-{os.getpid()}") for d in remaining) == KEEP_SNAPSHOTS
+    assert (tmp_path / CURRENT_FILE).read_text() in remaining
+
+
+def test_start_syncs_in_the_background(tmp_path):
+    client = seed_local(LocalSupabase(), 50)
+    client.latency = 0.3
+    store = AnalyticsStore(str(tmp_path), sync_interval=3600)
+
+    t0 = time.perf_counter()
+    store.start(lambda: client)
+    assert time.perf_counter() - t0 < 0.1
+    assert store.synced_at is None
+
+    deadline = time.monotonic() + 5
+    while store.synced_at is None and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert store.total_rows == 50
@@ -0,0 +1,33 @@
+import asyncio
+
+from starlette.testclient import TestClient
+
+import app as service
+import asgi
+from features import eeg_columns
+
+
+def test_health_matches_the_flask_app():
+    flask_body = service.create_app(warm_up=False).test_client().get("/health").get_json()
+    # No lifespan: the app is not warmed up, which /health reports the same way
+    asgi_body = TestClient(asgi.create_asgi_app()).get("/health").json()
+    assert asgi_body.keys() == flask_body.keys()
+    assert asgi_body["fusion_disabled"] == flask_body["fusion_disabled"]
+
+
+def test_batched_predict_queues_the_assessment_off_the_event_loop(monkeypatch):
+    on_loop = []
+
+    def store(data, prediction, version=None):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        return "queued"
+
+    monkeypatch.setattr(service, "store_assessment_in_supabase", store)
+    assert service.predict_batcher.enabled
+    response = TestClient(asgi.create_asgi_app()).post("/predict", json={"eeg": {col: 10.0 for col in eeg_columns}})
+    assert response.status_code == 200 and response.json()["persistence"] == "queued"
+    assert on_loop == [False]
@@ -0,0 +1,149 @@
+import json
+
+from assessment_writer import AssessmentWriter
+
+
+class CheckViolation(Exception):
+    code = "23514"
+
+
+class Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeClient:
+    """Rejects any write containing a row with ``bad`` set; raises ConnectionError while ``down``.
+
+    Upserts behave like PostgREST with ``resolution=ignore-duplicates``: rows
+    whose ``on_conflict`` value is already stored are skipped and not returned.
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.down = False
+
+    def table(self, name):
+        return self
+
+    def upsert(self, rows, on_conflict, ignore_duplicates):
+        assert ignore_duplicates
+        self._pending, self._key = rows, on_conflict
+        return self
+
+    def execute(self):
+        if self.down:
+            raise ConnectionError("unreachable")
+        if any(row.get("bad") for row in self._pending):
+            raise CheckViolation("violates check constraint")
+        stored = {row[self._key] for row in self.rows}
+        new = [dict(row, id=len(self.rows) + i) for i, row in enumerate(
+            row for row in self._pending if row[self._key] not in stored)]
+        self.rows.extend(new)
+        return Response(new)
+
+
+def records(n, bad=()):
+    return [{"patient_id": f"P{i}", "bad": i in bad} for i in range(n)]
+
+
+def test_bad_rows_are_isolated_and_rejected(tmp_path):
+    client = FakeClient()
+    writer = AssessmentWriter(client, journal_path=str(tmp_path / "journal.jsonl"))
+    writer._write_batch(records(10, bad={3, 7}))
+
+    assert sorted(row["patient_id"] for row in client.rows) == [f"P{i}" for i in range(10) if i not in (3, 7)]
+    rejected = [json.loads(line) for line in open(tmp_path / "journal.jsonl.rejected")]
+    assert sorted(r["record"]["patient_id"] for r in rejected) == ["P3", "P7"]
+    assert writer.stats["rejected"] == 2 and writer.stats["inserted"] == 8
+    # A data error says nothing about the remote being down
+    assert writer._remote_down_until == 0.0
+    assert not (tmp_path / "journal.jsonl").exists()
+
+
+def test_outage_journals_and_replay_isolates_bad_rows(tmp_path):
+    client = FakeClient()
+    writer = AssessmentWriter(client, journal_path=str(tmp_path / "journal.jsonl"), retry_after=0)
+    client.down = True
+    writer._write_batch(records(6, bad={4}))
+    assert writer.stats["journaled"] == 6 and client.rows == []
+
+    client.down = False
+    assert writer.replay_journal() == 5
+    assert len(client.rows) == 5 and writer.stats["rejected"] == 1
+    assert not (tmp_path / "journal.jsonl").exists()
+
+
+def test_shared_journal_is_replayed_once(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    client = FakeClient()
+    first, second = AssessmentWriter(client, journal_path=path), AssessmentWriter(client, journal_path=path)
+    first._journal(records(3))
+    second._journal(records(2))
+
+    # While one writer holds the replay lock the other backs off instead of racing on the files
+    started = []
+    execute = client.execute
+
+    def execute_during_replay():
+        started.append(second.replay_journal())
+        execute()
+
+    client.execute = execute_during_replay
+    assert first.replay_journal() == 5
+    assert started == [0] and len(client.rows) == 5
+    assert second.replay_journal() == 0
+
+
+def test_worker_survives_a_failing_batch(tmp_path):
+    client = FakeClient()
+    writer = AssessmentWriter(client, journal_path=str(tmp_path / "journal.jsonl"), flush_interval=0.01)
+    writer.add_listener(lambda rows: None)
+    calls = []
+
+    def flaky(rows):
+        calls.append(len(rows))
+        if len(calls) == 1:
+            raise OSError("disk full")
+        client.rows.extend(rows)
+
+    writer._write_batch = flaky
+    writer.start()
+    writer.submit({"patient_id": "P0"})
+    writer.flush()
+    writer.submit({"patient_id": "P1"})
+    writer.flush()
+    writer.stop()
+    assert [row["patient_id"] for row in client.rows] == ["P1"]
+    assert writer.stats["writer_errors"] == 1
+
+
+def test_replay_after_a_crash_does_not_store_rows_twice(tmp_path):
+    client = FakeClient()
+    journal = tmp_path / "journal.jsonl"
+    writer = AssessmentWriter(client, journal_path=str(journal), retry_after=0)
+    client.down = True
+    writer._write_batch(records(5))
+    client.down = False
+
+    # Crash after the replay's insert, before it removed the .replay file
+    journal.rename(str(journal) + ".replay")
+    rows = [json.loads(line) for line in open(str(journal) + ".replay")]
+    assert len({row["submission_id"] for row in rows}) == 5
+    client.upsert(rows, on_conflict="submission_id", ignore_duplicates=True).execute()
+
+    notified = []
+    restarted = AssessmentWriter(client, journal_path=str(journal))
+    restarted.add_listener(notified.extend)
+    assert restarted.replay_journal() == 0
+    assert len(client.rows) == 5 and notified == []
+    assert restarted.stats["duplicates"] == 5
+    assert not (tmp_path / "journal.jsonl.replay").exists()
+
+
+def test_submit_keys_each_record_before_it_can_be_journaled(tmp_path):
+    writer = AssessmentWriter(FakeClient(), journal_path=str(tmp_path / "journal.jsonl"), max_queue=1)
+    assert writer.submit({"patient_id": "P0"}) == "queued"
+    assert writer.submit({"patient_id": "P1"}) == "journaled"
+    journaled = json.loads(open(tmp_path / "journal.jsonl").readline())
+    assert journaled["patient_id"] == "P1" and journaled["submission_id"]
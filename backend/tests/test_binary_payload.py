@@ -0,0 +1,135 @@
+import struct
+import sys
+
+import numpy as np
+import pytest
+
+import app as service
+from binary_payload import ARROW_CONTENT_TYPE, BINARY_CONTENT_TYPE, decode, encode
+from features import eeg_columns
+
+ROW = np.arange(10.0, 10.0 + len(eeg_columns))
+META = {"user_info": {"patientId": "P1"}, "questions": [3] * 20}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    stored = []
+    monkeypatch.setattr(service, "store_assessment_in_supabase",
+                        lambda data, prediction, version=None: stored.append(data) or "queued")
+    client = service.create_app(warm_up=False).test_client()
+    client.stored = stored
+    return client
+
+
+def post(client, path, body, content_type=BINARY_CONTENT_TYPE):
+    return client.post(path, data=bytes(body), content_type=content_type)
+
+
+# ---------------------------
+# Decoder
+# ---------------------------
+@pytest.mark.parametrize("dtype", ["float32", "float64"])
+def test_round_trip(dtype):
+    values = np.vstack([ROW, ROW * 2])
+    payload = decode(encode(values, dtype=dtype, meta=META))
+    assert payload.columns == list(eeg_columns) and payload.meta == META
+    assert payload.values.dtype == np.dtype(dtype)
+    assert np.array_equal(payload.model_rows(), values)
+
+
+def test_float64_in_model_order_is_not_copied():
+    body = encode(ROW, dtype="float64")
+    rows = decode(body).model_rows()
+    assert not rows.flags.owndata and np.shares_memory(rows, np.frombuffer(body, dtype=np.uint8))
+
+
+def test_channel_order_follows_the_header():
+    reordered = list(reversed(eeg_columns))
+    payload = decode(encode(ROW[::-1], columns=reordered))
+    assert np.array_equal(payload.model_rows(), ROW[np.newaxis])
+
+
+def corrupt(body, offset, value):
+    body = bytearray(body)
+    body[offset:offset + len(value)] = value
+    return bytes(body)
+
+
+GOOD_BODY = encode(ROW, meta=META)
+MALFORMED = {
+    "bad magic": (corrupt(GOOD_BODY, 0, b"JSON"), "bad magic"),
+    "bad version": (corrupt(GOOD_BODY, 4, b"\x02"), "Unsupported EEGB version 2"),
+    "bad value type": (corrupt(GOOD_BODY, 5, b"i"), "value type"),
+    "shorter than header": (GOOD_BODY[:10], "shorter than its header"),
+    "truncated names": (GOOD_BODY[:20], "channel names"),
+    "truncated values": (GOOD_BODY[:-4], "value bytes"),
+    "extra values": (GOOD_BODY + b"\0" * 4, "value bytes"),
+    "more rows than values": (corrupt(GOOD_BODY, 8, struct.pack("<I", 2)), "value bytes"),
+    "meta not JSON": (encode(ROW)[:12] + struct.pack("<I", 2) + encode(ROW)[16:], "meta"),
+}
+
+
+@pytest.mark.parametrize("case", list(MALFORMED))
+def test_malformed_bodies_raise_value_error(case):
+    body, message = MALFORMED[case]
+    with pytest.raises(ValueError, match=message):
+        decode(body)
+
+
+# ---------------------------
+# Endpoints
+# ---------------------------
+def test_predict_accepts_binary_and_stores_the_meta(client):
+    response = post(client, "/predict", encode(ROW, meta=META))
+    as_json = client.post("/predict", json={"eeg": dict(zip(eeg_columns, ROW.tolist()))})
+    assert response.status_code == 200
+    assert response.get_json()["confidence_scores"] == as_json.get_json()["confidence_scores"]
+    stored = client.stored[0]
+    assert stored["user_info"] == META["user_info"] and stored["eeg"] == dict(zip(eeg_columns, ROW.tolist()))
+
+
+@pytest.mark.parametrize("case", list(MALFORMED))
+@pytest.mark.parametrize("path", ["/predict", "/predict/batch"])
+def test_malformed_bodies_are_rejected_with_400(client, case, path):
+    response = post(client, path, MALFORMED[case][0])
+    assert response.status_code == 400
+    assert MALFORMED[case][1] in response.get_json()["error"]
+    assert client.stored == []
+
+
+@pytest.mark.parametrize("path", ["/predict", "/predict/batch"])
+def test_missing_channels_are_rejected_with_400(client, path):
+    response = post(client, path, encode(ROW[:-1], columns=eeg_columns[:-1]))
+    assert response.status_code == 400
+    assert eeg_columns[-1] in response.get_json()["error"]
+
+
+def test_predict_takes_exactly_one_row(client):
+    response = post(client, "/predict", encode(np.vstack([ROW, ROW])))
+    assert response.status_code == 400 and "one EEG row" in response.get_json()["error"]
+
+
+@pytest.mark.parametrize("value", [np.nan, np.inf, -np.inf])
+def test_predict_rejects_non_finite_values(client, value):
+    row = ROW.copy()
+    row[3] = value
+    response = post(client, "/predict", encode(row))
+    assert response.status_code == 400 and "finite" in response.get_json()["error"]
+    assert client.stored == []
+
+
+def test_batch_reports_non_finite_rows_individually(client):
+    rows = np.vstack([ROW, ROW, ROW])
+    rows[1, 0] = np.nan
+    response = post(client, "/predict/batch", encode(rows))
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert "prediction" in results[0] and "prediction" in results[2]
+    assert results[1] == {"index": 1, "error": "EEG values must be finite"}
+
+
+def test_arrow_without_pyarrow_is_415(client, monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    response = post(client, "/predict", b"\xff\xff\xff\xff", content_type=ARROW_CONTENT_TYPE)
+    assert response.status_code == 415 and "pyarrow" in response.get_json()["error"]
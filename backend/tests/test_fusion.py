@@ -0,0 +1,52 @@
+import math
+
+import numpy as np
+import pytest
+
+import app as service
+from features import eeg_columns
+from fusion import FusionCalibration, FusionPredictor
+
+
+def test_identity_calibration_counts_the_prior_once():
+    calibration = FusionCalibration.identity(prior=0.2)
+    # Two models that each only restate the prior carry no evidence
+    assert calibration.combine(0.2, 0.2) == pytest.approx(0.2)
+    # Independent evidence: posterior odds = prior odds x LR_eeg x LR_q
+    lr_eeg, lr_q = (0.6 / 0.4) / 0.25, (0.5 / 0.5) / 0.25
+    odds = 0.25 * lr_eeg * lr_q
+    assert calibration.combine(0.6, 0.5) == pytest.approx(odds / (1 + odds))
+    assert calibration.combine(p_eeg=0.7) == pytest.approx(0.7)
+
+
+def test_load_without_file_uses_identity_for_prior(tmp_path):
+    calibration = FusionCalibration.load(str(tmp_path / "missing.json"), prior=0.3)
+    assert calibration.bias == pytest.approx(-math.log(0.3 / 0.7))
+
+
+def test_failed_warm_up_disables_only_fusion(monkeypatch):
+    broken = FusionPredictor(eeg_source=service.registry.get, questionnaire_path="no-such-model.pkl")
+    monkeypatch.setattr(service, "fusion", broken)
+    monkeypatch.setattr(service, "get_writer", lambda: None)
+    monkeypatch.setattr(service, "store_assessment_in_supabase", lambda *args, **kwargs: "queued")
+    client = service.create_app(warm_up=True).test_client()
+
+    eeg = {col: 10.0 for col in eeg_columns}
+    response = client.post("/predict/fusion", json={"eeg": eeg, "questions": [3] * 30})
+    assert response.status_code == 503 and "no-such-model.pkl" in response.get_json()["error"]
+    assert client.post("/predict", json={"eeg": eeg}).status_code == 200
+    assert client.get("/health").get_json()["fusion_disabled"]
+
+
+def test_modality_after_the_budget_is_skipped_not_scored():
+    outcomes = []
+    predictor = FusionPredictor(eeg_source=service.registry.get, budget=0.0,
+                                observer=lambda name, seconds, outcome: outcomes.append((name, outcome)))
+    calls = []
+    predictor._score_questionnaire = lambda row: calls.append(row)
+    predictor.questionnaire_forest = lambda: None
+    predictor._state()
+
+    result = predictor.predict(eeg_row=np.full(len(eeg_columns), 10.0), answers=[3] * 30)
+    assert result["fusion"] == "eeg" and "over latency budget" in result["dropped"]["questionnaire"]
+    assert calls == [] and outcomes == [("eeg", "ok"), ("questionnaire", "timeout")]
@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+
+from microbatch import MicroBatcher
+
+
+class Recorder:
+    """Batch function that doubles each row, records its batches and can be held on an event."""
+
+    def __init__(self):
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+        self.entered = threading.Event()
+
+    def __call__(self, key, rows):
+        self.batches.append((key, list(rows)))
+        self.entered.set()
+        self.release.wait(5)
+        if key == "bad":
+            raise ValueError("model failed")
+        return [(key, row * 2) for row in rows]
+
+
+def held_batcher(recorder, **kwargs):
+    """A batcher whose dispatcher is busy with a first row, so later submits queue up."""
+    batcher = MicroBatcher(recorder, **kwargs)
+    recorder.release.clear()
+    first = batcher.submit("model", -1)
+    assert recorder.entered.wait(5)
+    return batcher, first
+
+
+def test_concurrent_submits_share_one_call_and_get_their_own_results():
+    recorder = Recorder()
+    batcher, first = held_batcher(recorder, max_batch=32)
+    futures = [batcher.submit("model", i) for i in range(10)]
+    recorder.release.set()
+
+    assert first.result(5) == ("model", -2)
+    assert [f.result(5) for f in futures] == [("model", i * 2) for i in range(10)]
+    assert [len(rows) for _, rows in recorder.batches] == [1, 10]
+    assert batcher.stats == {"batches": 2, "rows": 11, "max_batch_seen": 10}
+    batcher.stop()
+
+
+def test_batches_are_capped_at_max_batch():
+    recorder = Recorder()
+    batcher, _ = held_batcher(recorder, max_batch=4)
+    futures = [batcher.submit("model", i) for i in range(10)]
+    recorder.release.set()
+    assert [f.result(5) for f in futures] == [("model", i * 2) for i in range(10)]
+    assert [len(rows) for _, rows in recorder.batches] == [1, 4, 4, 2]
+    batcher.stop()
+
+
+def test_rows_are_grouped_by_key_and_a_failure_reaches_only_its_waiters():
+    recorder = Recorder()
+    batcher, _ = held_batcher(recorder)
+    good = [batcher.submit("model", i) for i in range(3)]
+    bad = [batcher.submit("bad", i) for i in range(3)]
+    recorder.release.set()
+
+    assert [f.result(5) for f in good] == [("model", 0), ("model", 2), ("model", 4)]
+    for future in bad:
+        with pytest.raises(ValueError, match="model failed"):
+            future.result(5)
+    assert sorted((key, rows) for key, rows in recorder.batches[1:]) == [("bad", [0, 1, 2]), ("model", [0, 1, 2])]
+    batcher.stop()
+
+
+def test_wrong_result_count_fails_the_waiters_instead_of_hanging():
+    batcher = MicroBatcher(lambda key, rows: [])
+    with pytest.raises(RuntimeError, match="0 results for 1 rows"):
+        batcher("model", 1, timeout=5)
+    batcher.stop()
+
+
+def test_stop_drains_pending_rows_and_a_later_submit_restarts():
+    recorder = Recorder()
+    batcher, first = held_batcher(recorder, max_batch=4)
+    futures = [batcher.submit("model", i) for i in range(10)]
+    dispatcher = batcher._thread
+    stopper = threading.Thread(target=batcher.stop)
+    stopper.start()
+    recorder.release.set()
+    stopper.join(5)
+
+    assert not dispatcher.is_alive()
+    assert first.result(0) == ("model", -2)
+    assert [f.result(0) for f in futures] == [("model", i * 2) for i in range(10)]
+    assert batcher("model", 21, timeout=5) == ("model", 42)
+    batcher.stop()
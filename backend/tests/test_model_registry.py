@@ -0,0 +1,118 @@
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+from features import eeg_columns
+from forest_compiler import ARTIFACT_VERSION, ArtifactError, _PREAMBLE, compile_forest, save_forest
+from model_registry import BASE_VERSION, ModelRegistry, ModelValidationError
+
+DATA = pd.read_csv("dataset.csv", nrows=600)
+
+
+def write_model(directory, columns=eeg_columns, flip_labels=False):
+    """Train a small forest on dataset.csv rows and write scaler + .forest into ``directory``."""
+    os.makedirs(directory, exist_ok=True)
+    X = DATA[list(columns)].values.astype(np.float64)
+    y = DATA["Class"].values
+    if flip_labels:
+        y = np.where(y == "ADHD", "Non_ADHD", "ADHD")
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=5, random_state=0).fit(scaler.transform(X), y)
+    joblib.dump(scaler, os.path.join(directory, "eeg_scaler.pkl"))
+    save_forest(compile_forest(model), os.path.join(directory, "eeg_only_model.forest"))
+
+
+def make_registry(tmp_path):
+    write_model(str(tmp_path / "models"))
+    return ModelRegistry(forest_path=str(tmp_path / "models" / "eeg_only_model.forest"),
+                         model_path=str(tmp_path / "models" / "eeg_only_model.pkl"),
+                         scaler_path=str(tmp_path / "models" / "eeg_scaler.pkl"),
+                         versions_dir=str(tmp_path / "versions"), poll_interval=0)
+
+
+def corrupt_payload(path):
+    with open(path, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xFF]))
+
+
+def bump_format_version(path):
+    with open(path, "r+b") as f:
+        magic, _, header_len = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        f.seek(0)
+        f.write(_PREAMBLE.pack(magic, ARTIFACT_VERSION + 1, header_len))
+
+
+def test_load_seconds_follow_the_serving_model():
+    registry = ModelRegistry(poll_interval=0)
+    assert registry.load_seconds == {}
+    serving = registry.get()
+    assert registry.load_seconds is serving.load_seconds and "scaler" in serving.load_seconds
+
+    # Loading a candidate (e.g. one that then fails validation) leaves the reported timings alone
+    candidate = registry.load("base")
+    assert candidate.load_seconds is not serving.load_seconds
+    assert registry.load_seconds is serving.load_seconds
+
+    registry._swap(candidate)
+    assert registry.load_seconds is candidate.load_seconds
+
+
+BROKEN = {
+    "checksum": (lambda d: corrupt_payload(os.path.join(d, "eeg_only_model.forest")),
+                 ArtifactError, "checksum mismatch"),
+    "format version": (lambda d: bump_format_version(os.path.join(d, "eeg_only_model.forest")),
+                       ArtifactError, f"expected v{ARTIFACT_VERSION}"),
+    "features": (lambda d: write_model(d, columns=eeg_columns[:-1]),
+                 ModelValidationError, "features"),
+    "smoke test": (lambda d: write_model(d, flip_labels=True),
+                   ModelValidationError, "smoke accuracy"),
+}
+
+
+@pytest.mark.parametrize("problem", list(BROKEN))
+def test_broken_version_fails_fast_and_keeps_the_serving_model(tmp_path, problem):
+    registry = make_registry(tmp_path)
+    serving = registry.get()
+    assert serving.version == BASE_VERSION
+
+    directory = str(tmp_path / "versions" / "v2")
+    write_model(directory)
+    breaks, error, message = BROKEN[problem]
+    breaks(directory)
+
+    with pytest.raises(error, match=message):
+        registry.load("v2")
+    # The watcher's swap rejects it and records why
+    assert registry.check_for_update() == BASE_VERSION
+    assert registry.get() is serving
+    assert message in registry.status()["rejected"]["v2"]
+    # So does an explicit activation, without pinning it
+    with pytest.raises(error, match=message):
+        registry.activate("v2")
+    assert registry.get() is serving and registry.status()["pinned"] is None
+
+
+def test_broken_base_model_fails_on_first_load(tmp_path):
+    registry = make_registry(tmp_path)
+    corrupt_payload(registry.forest_path)
+    with pytest.raises(ArtifactError, match="checksum mismatch"):
+        registry.get()
+    assert not registry.loaded
+
+
+def test_broken_pinned_version_falls_back_to_base_on_first_load(tmp_path):
+    registry = make_registry(tmp_path)
+    directory = str(tmp_path / "versions" / "v2")
+    write_model(directory, flip_labels=True)
+    registry._write_pinned("v2")
+
+    assert registry.get().version == BASE_VERSION
+    assert "smoke accuracy" in registry.status()["rejected"]["v2"]
@@ -0,0 +1,90 @@
+import json
+
+import numpy as np
+import pytest
+
+import app as service
+from features import eeg_columns
+
+GOOD = {col: 10.0 + i for i, col in enumerate(eeg_columns)}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    stored = []
+    monkeypatch.setattr(service, "store_assessment_in_supabase",
+                        lambda data, prediction, version=None: stored.append(prediction) or "queued")
+    client = service.create_app(warm_up=False).test_client()
+    client.stored = stored
+    return client
+
+
+@pytest.mark.parametrize("value", ["NaN", "Infinity", "-Infinity"])
+def test_predict_rejects_non_finite_values(client, value):
+    body = json.dumps({"eeg": GOOD}).replace("10.0", value, 1)
+    response = client.post("/predict", data=body, content_type="application/json")
+    assert response.status_code == 400
+    assert "finite" in response.get_json()["error"]
+    assert client.stored == []
+
+
+@pytest.mark.parametrize("eeg", [[1.0] * len(eeg_columns), "Fp1", {**GOOD, "Fp1": "high"}, {**GOOD, "Fp1": None}])
+def test_predict_rejects_malformed_eeg(client, eeg):
+    response = client.post("/predict", json={"eeg": eeg})
+    assert response.status_code == 400
+    assert client.stored == []
+
+
+def test_predict_accepts_finite_values(client):
+    response = client.post("/predict", json={"eeg": GOOD})
+    assert response.status_code == 200
+    assert client.stored == [response.get_json()["prediction"]]
+
+
+def test_loaded_model_rejects_non_finite_rows():
+    model = service.registry.get()
+    rows = np.tile([GOOD[col] for col in eeg_columns], (3, 1))
+    rows[1, 4] = np.nan
+    with pytest.raises(ValueError, match="finite"):
+        model.predict(rows)
+
+
+def test_batch_reports_non_finite_rows_individually(client):
+    values = [GOOD[col] for col in eeg_columns]
+    # json.dumps writes inf/nan as the Infinity/NaN literals Flask accepts
+    records = client.post("/predict/batch", data=json.dumps({"records": [GOOD, {**GOOD, "Fp1": float("inf")}]}),
+                          content_type="application/json").get_json()
+    rows = client.post("/predict/batch", data=json.dumps({"rows": [values, values[:-1] + [float("nan")]]}),
+                       content_type="application/json").get_json()
+    for result in (records, rows):
+        assert (result["scored"], result["failed"]) == (1, 1)
+        assert "prediction" in result["results"][0]
+        assert "finite" in result["results"][1]["error"]
+
+
+def test_batch_size_is_checked_before_parsing(client, monkeypatch):
+    monkeypatch.setattr(service, "BATCH_MAX_ROWS", 2)
+    monkeypatch.setattr(service, "_batch_rows_from_payload", lambda data: pytest.fail("parsed an oversized batch"))
+    response = client.post("/predict/batch", json={"rows": [[0.0] * len(eeg_columns)] * 3})
+    assert response.status_code == 413
+
+
+def test_stream_reports_bad_rows_and_keeps_going(client):
+    header = ",".join(eeg_columns)
+    good = ",".join(str(GOOD[col]) for col in eeg_columns)
+    body = "\n".join([header, good, good.replace("10.0", "nan", 1), good]).encode() + b"\n\xff\xfe\n" + good.encode()
+    response = client.post("/predict/stream", data=body, content_type="text/csv")
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    rows = {line["row"]: line for line in lines[:-1]}
+    assert sorted(rows) == [0, 1, 2, 3, 4]
+    assert all("prediction" in rows[i] for i in (0, 2, 4))
+    assert "finite" in rows[1]["error"] and "UTF-8" in rows[3]["error"]
+    assert lines[-1]["summary"] == {"rows_scored": 3, "rows_failed": 2, "windows": None}
+
+
+def test_stream_line_length_is_capped():
+    from eeg_stream import BadLine, iter_lines
+    import io
+
+    lines = list(iter_lines(io.BytesIO(b"a" * 5000 + b"\nok\n"), read_size=1024, max_line=2048))
+    assert isinstance(lines[0], BadLine) and lines[1:] == ["ok"]
@@ -0,0 +1,64 @@
+import gc
+
+import numpy as np
+
+import app as service
+from prediction_memo import PredictionMemo
+
+
+class FixedForest:
+    """Stands in for a CompiledForest that always predicts ``label``."""
+
+    classes_ = np.array(["ADHD", "Non_ADHD"])
+
+    def __init__(self, label):
+        self.label = label
+        self.calls = 0
+
+    def predict(self, X):
+        self.calls += 1
+        proba = np.tile([1.0, 0.0] if self.label == "ADHD" else [0.0, 1.0], (len(X), 1))
+        return np.array([self.label] * len(X)), proba
+
+
+class FakeModel:
+    def __init__(self, label, version="v1"):
+        self.forest = FixedForest(label)
+        self.version = version
+        self.classes = self.forest.classes_.tolist()
+
+
+def test_hot_swap_never_serves_the_other_models_prediction(monkeypatch):
+    memo = PredictionMemo(max_entries=16)
+    monkeypatch.setattr(service, "prediction_memo", memo)
+    # Same version name on purpose: a re-published version must not share entries either
+    old, new = FakeModel("ADHD"), FakeModel("Non_ADHD")
+    row = np.zeros((1, 19))
+
+    # In-flight requests on the old model interleave with requests on the new one
+    for _ in range(5):
+        assert service._predict_scaled_row(old, row)["prediction"] == "ADHD"
+        assert service._predict_scaled_row(new, row)["prediction"] == "Non_ADHD"
+
+    # Each model ran the forest once; neither flushed the other's entry
+    assert old.forest.calls == 1 and new.forest.calls == 1
+    assert memo.stats() == {"entries": 2, "hits": 8, "misses": 2, "invalidations": 1}
+
+
+def test_retired_model_tags_are_not_reused():
+    memo = PredictionMemo(max_entries=16)
+    row = np.zeros((1, 19))
+    first = FakeModel("ADHD")
+    memo.put(memo.key(first, row), {"prediction": "ADHD"})
+    del first
+    gc.collect()
+    # A new model object (possibly at the same address) gets a fresh tag
+    assert memo.get(memo.key(FakeModel("Non_ADHD"), row)) is None
+
+
+def test_rounding_shares_entries_within_the_tolerance():
+    memo = PredictionMemo(max_entries=16, decimals=2)
+    model = FakeModel("ADHD")
+    assert memo.key(model, np.full((1, 19), 0.501)) == memo.key(model, np.full((1, 19), 0.499))
+    assert memo.key(model, np.full((1, 19), -0.0001)) == memo.key(model, np.zeros((1, 19)))
+    assert memo.key(model, np.full((1, 19), 0.51)) != memo.key(model, np.full((1, 19), 0.5))
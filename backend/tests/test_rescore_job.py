@@ -0,0 +1,14 @@
+from local_supabase import LocalSupabase
+from model_registry import ModelRegistry
+from rescore_job import RescoreJob, seed_local
+
+
+def test_second_pass_finds_nothing_to_update():
+    model = ModelRegistry(poll_interval=0).get()
+    client = seed_local(LocalSupabase(), 250)
+
+    first = RescoreJob(client, model, page_size=100, checkpoint_path=None, report_every=1e9).run()
+    assert first["done"] and first["scored"] == 250 and first["updated"] == 250
+
+    second = RescoreJob(client, model, page_size=100, checkpoint_path=None, report_every=1e9).run()
+    assert second["updated"] == 0 and second["unchanged"] == 250
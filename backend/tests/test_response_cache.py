@@ -0,0 +1,36 @@
+from flask import Flask, jsonify
+
+from response_cache import ResponseCache, cache_key, cached
+
+
+def test_key_escapes_separators_in_values():
+    assert cache_key("/a", [("x", "1"), ("y", "2")]) != cache_key("/a", [("x", "1&y=2")])
+    assert cache_key("/a", [("y", "2"), ("x", "1")]) == cache_key("/a", [("x", "1"), ("y", "2")])
+
+
+def test_invalidation_during_a_read_skips_the_store():
+    cache = ResponseCache()
+    app = Flask(__name__)
+    data = {"value": 1}
+
+    @app.route("/stats")
+    @cached(cache, lambda: {"stats"})
+    def stats():
+        body = jsonify(data)
+        # An insert lands (and invalidates) after the view read the old value
+        data["value"] = 2
+        cache.invalidate("stats")
+        return body
+
+    client = app.test_client()
+    first = client.get("/stats")
+    assert first.get_json() == {"value": 1} and "ETag" not in first.headers
+    assert cache.stats()["entries"] == 0
+    assert client.get("/stats").get_json() == {"value": 2}
+
+
+def test_untouched_tags_still_store():
+    cache = ResponseCache()
+    generation = cache.generation({"stats"})
+    cache.invalidate("patient:P1")
+    assert cache.put("/stats?", b"{}", "application/json", {"stats"}, generation) is not None
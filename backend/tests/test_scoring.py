@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from scoring import (N_MODEL_QUESTIONS, encode_history, encode_responses, final_label, final_labels,
+                     flags_from_possible, heuristic_flags_weighted, model_inputs, possible_matrix,
+                     subscale_scores)
+
+
+def reference_flags(questionnaire, medical_history=None):
+    # The per-row implementation main.py used before scoring.py, verbatim
+    if medical_history is None:
+        medical_history = {}
+    flags = {}
+    odd_score = np.mean([questionnaire[i] for i in range(10, 13)]) if len(questionnaire) >= 13 else 0
+    if medical_history.get('family_adhd', 'No').lower() == 'yes':
+        odd_score = (odd_score + 1) / 2
+    flags['ODD'] = 'Possible' if odd_score >= 0.5 else 'Unlikely'
+    dys_score = np.mean([questionnaire[i] for i in range(13, 16)]) if len(questionnaire) >= 16 else 0
+    if medical_history.get('family_learning_disorders', 'No').lower() == 'yes':
+        dys_score = (dys_score + 1) / 2
+    flags['Dyslexia'] = 'Possible' if dys_score >= 0.5 else 'Unlikely'
+    asd_score = np.mean([questionnaire[i] for i in range(16, 20)]) if len(questionnaire) >= 20 else 0
+    flags['ASD'] = 'Possible' if asd_score >= 0.5 else 'Unlikely'
+    return flags
+
+
+def random_inputs(n, seed):
+    rng = np.random.default_rng(seed)
+    questionnaires = []
+    for i in range(n):
+        length = int(rng.integers(0, 23))
+        # 0-1 answers straddle the 0.5 threshold; 1-5 answers are the real scale
+        answers = rng.integers(1, 6, size=length) if i % 2 else rng.choice([0.0, 0.25, 0.5, 0.75, 1.0], length)
+        questionnaires.append(answers.tolist())
+    histories = [None if i % 5 == 0 else
+                 {"family_adhd": str(rng.choice(["Yes", "yes", "YES", "No", "no"])),
+                  "family_learning_disorders": str(rng.choice(["Yes", "no"]))} if i % 3 else {}
+                 for i in range(n)]
+    eeg_pred = rng.choice(["ADHD", "Non_ADHD"], size=n).tolist()
+    return questionnaires, histories, eeg_pred
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_vectorized_heuristics_match_per_row_reference(seed):
+    questionnaires, histories, eeg_pred = random_inputs(3000, seed)
+    expected_flags = [reference_flags(q, h) for q, h in zip(questionnaires, histories)]
+    expected_labels = [final_label(p, f) for p, f in zip(eeg_pred, expected_flags)]
+
+    responses, counts = encode_responses(questionnaires)
+    possible = possible_matrix(subscale_scores(responses, counts, encode_history(histories)))
+
+    assert [flags_from_possible(row) for row in possible] == expected_flags
+    assert final_labels(eeg_pred, possible) == expected_labels
+
+
+@pytest.mark.parametrize("length", [0, 10, 12, 13, 15, 16, 19, 20, 25])
+def test_single_row_helper_matches_reference_at_subscale_boundaries(length):
+    answers = [0.5] * length
+    for history in (None, {}, {"family_adhd": "Yes", "family_learning_disorders": "yes"}):
+        assert heuristic_flags_weighted(answers, history) == reference_flags(answers, history)
+
+
+def test_model_inputs_match_per_row_concatenation():
+    rng = np.random.default_rng(3)
+    questionnaires = [rng.integers(1, 6, size=int(rng.integers(N_MODEL_QUESTIONS, 21))).tolist() for _ in range(500)]
+    eeg_scaled = rng.normal(size=(500, 19))
+    responses, _ = encode_responses(questionnaires)
+    reference = np.array([np.concatenate([eeg_scaled[i], (np.array(q[:N_MODEL_QUESTIONS]) - 1) / 4])
+                          for i, q in enumerate(questionnaires)])
+    assert np.array_equal(model_inputs(eeg_scaled, responses), reference)
@@ -0,0 +1,86 @@
+import json
+
+import numpy as np
+
+from assessment_writer import AssessmentWriter
+from features import eeg_columns
+from local_supabase import LocalSupabase
+from model_registry import ModelRegistry
+from similarity import SimilarityIndex
+
+MODEL = ModelRegistry(poll_interval=0)
+
+
+def assessment(patient_id, value):
+    return {"patient_id": patient_id, "prediction": "ADHD", "assessment_date": "2026-10-18T00:00:00",
+            "eeg_data": json.dumps({col: value + i for i, col in enumerate(eeg_columns)})}
+
+
+def test_listener_rows_carry_the_stored_id(tmp_path):
+    index = SimilarityIndex(MODEL.get, dataset_path=None)
+    index.load(LocalSupabase)
+    client = LocalSupabase()
+    writer = AssessmentWriter(client, journal_path=str(tmp_path / "journal.jsonl"))
+    writer.add_listener(index.record)
+    writer._write_batch([assessment("P1", 10.0), assessment("P2", 50.0)])
+
+    hits = index.search([10.0 + i for i in range(len(eeg_columns))], k=2)
+    stored = {row["patient_id"]: row["id"] for row in client.tables["patient_assessments"]}
+    assert [(hit["patient_id"], hit["assessment_id"]) for hit in hits] == [("P1", stored["P1"]), ("P2", stored["P2"])]
+
+
+class ShiftedScaler:
+    def __init__(self, scaler):
+        self.scaler = scaler
+
+    def transform(self, X):
+        return self.scaler.transform(X) + 1.0
+
+
+def test_rescale_publishes_new_arrays():
+    index = SimilarityIndex(MODEL.get, dataset_path=None)
+    rng = np.random.default_rng(0)
+    index.add(rng.normal(10, 3, (100, len(eeg_columns))), "dataset", ["ADHD"] * 100, list(range(100)))
+    before_scaled, before_norms = index._scaled, index._norms
+    snapshot = before_scaled[:, :100].copy()
+
+    with index._lock:
+        index._rescale(ShiftedScaler(MODEL.get().scaler))
+    # A search still holding the old views sees them unchanged
+    assert np.array_equal(before_scaled[:, :100], snapshot)
+    assert index._scaled is not before_scaled and index._norms is not before_norms
+    assert np.allclose(index._scaled[:, :100], snapshot + 1.0, atol=1e-5)
+
+
+class FlakyClient(LocalSupabase):
+    """Fails the first table scan, like a database that is down at startup."""
+    failures = 0
+
+    def table(self, name):
+        if FlakyClient.failures:
+            FlakyClient.failures -= 1
+            raise ConnectionError("database unavailable")
+        return super().table(name)
+
+
+def test_failed_load_is_rolled_back_and_retried(tmp_path):
+    client = FlakyClient()
+    writer = AssessmentWriter(client, journal_path=str(tmp_path / "journal.jsonl"))
+    writer._write_batch([assessment("P1", 10.0), assessment("P2", 50.0)])
+
+    index = SimilarityIndex(MODEL.get, dataset_path=None, retry_interval=0)
+    FlakyClient.failures = 1
+    try:
+        index.load(lambda: client)
+    except ConnectionError:
+        pass
+    assert not index.ready and index.n == 0 and not index._accepting
+
+    index.start(lambda: client)
+    index._thread.join(timeout=10)
+    assert index.ready and index.status()["started"]
+    assert index.status()["assessment_rows"] == 2
+    # A second start in the same process is a no-op
+    thread = index._thread
+    index.start(lambda: client)
+    assert index._thread is thread
@@ -0,0 +1,24 @@
+import os
+import threading
+
+import joblib
+import pytest
+
+from train_pipeline import dump_atomic
+
+
+def test_dump_atomic_replaces_the_file_in_one_step(tmp_path):
+    path = str(tmp_path / "eeg_scaler.pkl")
+    dump_atomic({"version": 1}, path)
+    dump_atomic({"version": 2}, path)
+    assert joblib.load(path) == {"version": 2}
+    assert os.listdir(tmp_path) == ["eeg_scaler.pkl"]
+
+
+def test_failed_dump_leaves_the_old_artifact(tmp_path):
+    path = str(tmp_path / "eeg_scaler.pkl")
+    dump_atomic({"version": 1}, path)
+    with pytest.raises(Exception):
+        dump_atomic({"lock": threading.Lock()}, path)  # not picklable
+    assert joblib.load(path) == {"version": 1}
+    assert os.listdir(tmp_path) == ["eeg_scaler.pkl"]
@@ -2,6 +2,9 @@
 Train EEG-Only ADHD Detection Model
 Uses dataset.csv with 19 EEG channels to classify ADHD vs Non_ADHD.
 Saves model and scaler to models/ directory.
+
+For parallel cross-validation, cached preprocessing and a metrics/timing
+report, use train_pipeline.py instead.
 """
 
 import numpy as np
@@ -12,6 +15,7 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split, cross_val_score
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
+from forest_compiler import compile_forest, save_forest
 
 # ---------------------------
 # Load EEG dataset
@@ -100,6 +104,11 @@ os.makedirs("models", exist_ok=True)
 joblib.dump(model, "models/eeg_only_model.pkl")
 joblib.dump(scaler, "models/eeg_scaler.pkl")
 
+# Memory-mappable compiled forest used by the Flask workers
+save_forest(compile_forest(model), "models/eeg_only_model.forest",
+            metadata={"source": "eeg_only_model.pkl"})
+
 print(f"\n✅ Model saved to models/eeg_only_model.pkl")
+print(f"✅ Compiled forest saved to models/eeg_only_model.forest")
 print(f"✅ Scaler saved to models/eeg_scaler.pkl")
 print(f"Model classes: {model.classes_}")
@@ -0,0 +1,271 @@
+"""
+Reproducible EEG model training pipeline.
+
+One command replaces the ad-hoc train_model.py / model.py runs:
+
+    python train_pipeline.py --config train_config.json
+
+1. The CSV is parsed once and cached as a columnar ``.npz`` (one array per
+   column) keyed by the file's size and mtime; warm retrains load the cache
+   and never touch the CSV parser.
+2. The scaler is fitted on the training split only.
+3. Every (hyperparameter candidate, CV fold) pair is fitted in parallel on a
+   process pool; the training matrix is shipped to each worker once.
+4. The best candidate is refitted on the full training split, evaluated on
+   the held-out test split, and the model, scaler, compiled ``.forest``
+   artifact and a JSON metrics + timing report are written together.
+5. With ``versions_dir`` set, the artifacts are also published as a new
+   version directory that running servers pick up without a restart (see
+   model_registry.py).
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from sklearn.preprocessing import StandardScaler
+
+from features import eeg_columns
+from forest_compiler import compile_forest, save_forest
+
+DEFAULT_CONFIG = {
+    "dataset": "dataset.csv",
+    "target": "Class",
+    "cache_dir": ".cache",
+    "output_dir": "models",
+    "model_name": "eeg_only_model",
+    "test_size": 0.2,
+    "random_state": 42,
+    "cv_folds": 5,
+    "n_workers": None,
+    "versions_dir": None,
+    "activate_version": True,
+    "candidates": [
+        {"n_estimators": 300, "max_depth": 20, "min_samples_split": 5, "min_samples_leaf": 2}
+    ],
+}
+
+
+def load_config(path=None):
+    config = dict(DEFAULT_CONFIG)
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            config.update(json.load(f))
+    return config
+
+
+# ---------------------------
+# Dataset cache
+# ---------------------------
+def _cache_path(csv_path, cache_dir):
+    st = os.stat(csv_path)
+    key = hashlib.sha1(f"{os.path.abspath(csv_path)}:{st.st_size}:{st.st_mtime_ns}".encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{os.path.splitext(os.path.basename(csv_path))[0]}-{key}.npz")
+
+
+def load_dataset(csv_path, target, cache_dir):
+    """Return (X, y, cache_hit) for the EEG columns and target of ``csv_path``."""
+    cache_file = _cache_path(csv_path, cache_dir)
+    if os.path.exists(cache_file):
+        with np.load(cache_file, allow_pickle=False) as cached:
+            X = np.column_stack([cached[f"col_{c}"] for c in eeg_columns])
+            return X, cached["target"], True
+
+    import pandas as pd
+    data = pd.read_csv(csv_path)
+    missing = [col for col in eeg_columns + [target] if col not in data.columns]
+    if missing:
+        raise ValueError(f"Missing columns in {csv_path}: {missing}")
+
+    columns = {f"col_{c}": data[c].to_numpy(dtype=np.float64) for c in eeg_columns}
+    y = data[target].to_numpy().astype(str)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = cache_file + ".tmp.npz"
+    np.savez(tmp, target=y, **columns)
+    os.replace(tmp, cache_file)
+    return np.column_stack([columns[f"col_{c}"] for c in eeg_columns]), y, False
+
+
+def split_and_scale(X, y, config):
+    """Stratified train/test split with a scaler fitted on the training split only."""
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=config["test_size"], random_state=config["random_state"], stratify=y)
+    scaler = StandardScaler().fit(X_train)
+    return scaler.transform(X_train), scaler.transform(X_test), y_train, y_test, scaler
+
+
+# ---------------------------
+# Parallel cross-validation
+# ---------------------------
+_worker_data = {}
+
+
+def _init_worker(X, y):
+    # Each pool process receives the training matrix once, not once per task
+    _worker_data["X"] = X
+    _worker_data["y"] = y
+
+
+def _fit_fold(candidate_index, params, fold, train_idx, val_idx, random_state):
+    X, y = _worker_data["X"], _worker_data["y"]
+    t0 = time.perf_counter()
+    model = RandomForestClassifier(random_state=random_state, n_jobs=1, **params)
+    model.fit(X[train_idx], y[train_idx])
+    score = accuracy_score(y[val_idx], model.predict(X[val_idx]))
+    return candidate_index, fold, float(score), time.perf_counter() - t0
+
+
+def cross_validate(X, y, candidates, folds, random_state, n_workers=None):
+    """Mean/std CV accuracy per candidate, all (candidate, fold) fits in parallel."""
+    splits = list(StratifiedKFold(n_splits=folds, shuffle=True, random_state=random_state).split(X, y))
+    scores = {i: [None] * folds for i in range(len(candidates))}
+    fit_seconds = {i: 0.0 for i in range(len(candidates))}
+
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(X, y)) as pool:
+        futures = [pool.submit(_fit_fold, i, params, f, train_idx, val_idx, random_state)
+                   for i, params in enumerate(candidates)
+                   for f, (train_idx, val_idx) in enumerate(splits)]
+        for future in futures:
+            i, f, score, seconds = future.result()
+            scores[i][f] = score
+            fit_seconds[i] += seconds
+
+    return [{"params": params,
+             "cv_scores": scores[i],
+             "cv_mean": float(np.mean(scores[i])),
+             "cv_std": float(np.std(scores[i])),
+             "fit_seconds": round(fit_seconds[i], 3)}
+            for i, params in enumerate(candidates)]
+
+
+# ---------------------------
+# Publishing
+# ---------------------------
+def dump_atomic(obj, path):
+    """joblib.dump to a temporary name, fsync and rename into place.
+
+    A server starting while the pipeline runs loads either the old file or
+    the new one, never a half-written pickle. Each file is replaced on its
+    own; use the versioned publish (versions_dir) to swap a matched set.
+    """
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    try:
+        with open(tmp_path, "wb") as f:
+            joblib.dump(obj, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def publish_version(out, name, versions_dir, activate=True):
+    """Copy the artifacts in ``out`` into a new ``versions_dir/<version>`` directory.
+
+    The directory is assembled under a dot-prefixed name and renamed into
+    place, so a watching server never sees a partial version.
+    """
+    version = datetime.now(timezone.utc).strftime("v%Y%m%d-%H%M%S")
+    staging = os.path.join(versions_dir, "." + version)
+    os.makedirs(staging, exist_ok=True)
+    for filename in (f"{name}.forest", f"{name}.pkl", "eeg_scaler.pkl", "training_report.json"):
+        shutil.copy2(os.path.join(out, filename), os.path.join(staging, filename))
+    os.replace(staging, os.path.join(versions_dir, version))
+    if activate:
+        active = os.path.join(versions_dir, "ACTIVE")
+        with open(active + ".tmp", "w", encoding="utf-8") as f:
+            f.write(version + "\n")
+        os.replace(active + ".tmp", active)
+    return version
+
+
+# ---------------------------
+# Pipeline
+# ---------------------------
+def run(config):
+    timings = {}
+    t = time.perf_counter()
+
+    def lap(name):
+        nonlocal t
+        now = time.perf_counter()
+        timings[name] = round(now - t, 3)
+        t = now
+
+    X, y, cache_hit = load_dataset(config["dataset"], config["target"], config["cache_dir"])
+    lap("load_dataset")
+    print(f"Dataset: {X.shape[0]} rows ({'cache hit' if cache_hit else 'parsed CSV'})")
+
+    X_train_s, X_test_s, y_train, y_test, scaler = split_and_scale(X, y, config)
+    lap("split_and_scale")
+
+    results = cross_validate(X_train_s, y_train, config["candidates"], config["cv_folds"],
+                             config["random_state"], config["n_workers"])
+    lap("cross_validation")
+    for r in results:
+        print(f"  {r['params']}: CV {r['cv_mean']:.4f} (+/- {r['cv_std']:.4f})")
+    best = max(results, key=lambda r: r["cv_mean"])
+
+    model = RandomForestClassifier(random_state=config["random_state"], n_jobs=-1, **best["params"])
+    model.fit(X_train_s, y_train)
+    lap("final_fit")
+
+    y_pred = model.predict(X_test_s)
+    metrics = {
+        "test_accuracy": float(accuracy_score(y_test, y_pred)),
+        "classification_report": classification_report(y_test, y_pred, output_dict=True),
+        "confusion_matrix": confusion_matrix(y_test, y_pred, labels=model.classes_).tolist(),
+        "classes": model.classes_.tolist(),
+    }
+    lap("evaluate")
+    print(f"Best {best['params']}: test accuracy {metrics['test_accuracy']:.4f}")
+
+    out = config["output_dir"]
+    name = config["model_name"]
+    os.makedirs(out, exist_ok=True)
+    dump_atomic(model, os.path.join(out, f"{name}.pkl"))
+    dump_atomic(scaler, os.path.join(out, "eeg_scaler.pkl"))
+    save_forest(compile_forest(model), os.path.join(out, f"{name}.forest"),
+                metadata={"source": f"{name}.pkl", "params": best["params"],
+                          "test_accuracy": metrics["test_accuracy"]})
+    lap("save_artifacts")
+
+    report = {
+        "config": config,
+        "dataset_rows": int(X.shape[0]),
+        "dataset_cache_hit": cache_hit,
+        "best_params": best["params"],
+        "candidates": results,
+        "metrics": metrics,
+        "timings_seconds": timings,
+    }
+    report_path = os.path.join(out, "training_report.json")
+    with open(report_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    os.replace(report_path + ".tmp", report_path)
+    print(f"Artifacts and training_report.json written to {out}/ "
+          f"(total {sum(timings.values()):.1f}s)")
+    if config["versions_dir"]:
+        version = publish_version(out, name, config["versions_dir"], config["activate_version"])
+        report["version"] = version
+        print(f"Published {version} to {config['versions_dir']}/")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the EEG RandomForest model")
+    parser.add_argument("--config", default="train_config.json")
+    args = parser.parse_args()
+    run(load_config(args.config))
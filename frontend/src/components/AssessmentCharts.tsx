@@ -5,7 +5,7 @@ import {
   ResponsiveContainer, Legend, Area, AreaChart
 } from 'recharts'
 import { BarChart3, Loader, TrendingUp } from 'lucide-react'
-import { getAssessments, AssessmentRecord } from '../services/api'
+import { getAssessmentStats, AssessmentStatsResponse } from '../services/api'
 
 const RISK_COLORS: Record<string, string> = {
   high: '#ef4444',
@@ -22,15 +22,26 @@ const PREDICTION_COLORS: Record<string, string> = {
   Dyslexia: '#3b82f6',
 }
 
+// Days shown in the "Assessments Over Time" chart
+const TREND_DAYS = 14
+
 const AssessmentCharts: React.FC = () => {
-  const [assessments, setAssessments] = useState<AssessmentRecord[]>([])
+  const [stats, setStats] = useState<AssessmentStatsResponse | null>(null)
+  const [trend, setTrend] = useState<AssessmentStatsResponse | null>(null)
   const [loading, setLoading] = useState(true)
 
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const data = await getAssessments()
-        setAssessments(data.assessments)
+        // Totals come from /assessments/stats, so the charts cover every stored
+        // assessment rather than the first page of /assessments
+        const since = new Date(Date.now() - (TREND_DAYS - 1) * 86400000).toISOString().split('T')[0]
+        const [totals, daily] = await Promise.all([
+          getAssessmentStats(),
+          getAssessmentStats({ start: since, bucket: 'day' }),
+        ])
+        setStats(totals)
+        setTrend(daily)
       } catch {
         // silently fail — charts are supplementary
       } finally {
@@ -49,7 +60,7 @@ const AssessmentCharts: React.FC = () => {
     )
   }
 
-  if (assessments.length === 0) {
+  if (!stats || stats.total_assessments === 0) {
     return (
       <div className="text-center py-8 text-medical-slate">
         <BarChart3 className="w-10 h-10 mx-auto mb-2 opacity-40" />
@@ -59,19 +70,12 @@ const AssessmentCharts: React.FC = () => {
   }
 
   // === Data for Prediction Pie Chart ===
-  const predictionCounts: Record<string, number> = {}
-  assessments.forEach(a => {
-    const p = a.prediction || 'Unknown'
-    predictionCounts[p] = (predictionCounts[p] || 0) + 1
-  })
-  const pieData = Object.entries(predictionCounts).map(([name, value]) => ({ name, value }))
+  const pieData = Object.entries(stats.predictions_breakdown || {})
+    .filter(([, value]) => value > 0)
+    .map(([name, value]) => ({ name: name || 'Unknown', value }))
 
   // === Data for Risk Level Bar Chart ===
-  const riskCounts: Record<string, number> = { high: 0, moderate: 0, low: 0 }
-  assessments.forEach(a => {
-    const r = a.risk_level || 'low'
-    riskCounts[r] = (riskCounts[r] || 0) + 1
-  })
+  const riskCounts: Record<string, number> = { high: 0, moderate: 0, low: 0, ...stats.risk_levels_breakdown }
   const barData = Object.entries(riskCounts).map(([name, count]) => ({
     name: name.charAt(0).toUpperCase() + name.slice(1),
     count,
@@ -79,23 +83,18 @@ const AssessmentCharts: React.FC = () => {
   }))
 
   // === Data for Assessments Over Time (area chart) ===
-  const dateCounts: Record<string, { total: number; adhd: number; nonAdhd: number }> = {}
-  assessments.forEach(a => {
-    const date = a.assessment_date ? a.assessment_date.split('T')[0] : 'Unknown'
-    if (!dateCounts[date]) dateCounts[date] = { total: 0, adhd: 0, nonAdhd: 0 }
-    dateCounts[date].total++
-    if (a.prediction === 'ADHD') dateCounts[date].adhd++
-    else dateCounts[date].nonAdhd++
-  })
-  const timeData = Object.entries(dateCounts)
-    .sort(([a], [b]) => a.localeCompare(b))
-    .slice(-14) // last 14 days
-    .map(([date, data]) => ({
-      date: date.length > 5 ? date.slice(5) : date, // MM-DD
-      Total: data.total,
-      ADHD: data.adhd,
-      'Non-ADHD': data.nonAdhd,
-    }))
+  const timeData = (trend?.buckets || [])
+    .slice()
+    .sort((a, b) => a.date.localeCompare(b.date))
+    .map(bucket => {
+      const adhd = bucket.predictions?.ADHD || 0
+      return {
+        date: bucket.date.length > 5 ? bucket.date.slice(5) : bucket.date, // MM-DD
+        Total: bucket.total,
+        ADHD: adhd,
+        'Non-ADHD': bucket.total - adhd,
+      }
+    })
 
   return (
     <motion.div
@@ -183,7 +182,7 @@ const AssessmentCharts: React.FC = () => {
       {/* Summary Stats Row */}
       <div className="grid grid-cols-2 md:grid-cols-4 gap-3">
         <div className="bg-white rounded-lg p-3 border border-gray-200 text-center">
-          <p className="text-2xl font-bold text-medical-blue">{assessments.length}</p>
+          <p className="text-2xl font-bold text-medical-blue">{stats.total_assessments}</p>
           <p className="text-xs text-medical-slate">Total Assessments</p>
         </div>
         <div className="bg-white rounded-lg p-3 border border-gray-200 text-center">
@@ -17,24 +17,40 @@ import {
 } from 'lucide-react'
 import { getAssessments, getAssessmentStats, AssessmentRecord, AssessmentStatsResponse } from '../services/api'
 
+// Rows fetched per request; further pages are loaded on demand via next_cursor
+const PAGE_SIZE = 100
+
 const PatientRecords: React.FC = () => {
   const navigate = useNavigate()
   const [assessments, setAssessments] = useState<AssessmentRecord[]>([])
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
   const [stats, setStats] = useState<AssessmentStatsResponse | null>(null)
   const [loading, setLoading] = useState(true)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [searchTerm, setSearchTerm] = useState('')
+  const [patientPrefix, setPatientPrefix] = useState('')
   const [filterPrediction, setFilterPrediction] = useState<string>('all')
   const [error, setError] = useState('')
 
+  // Filters are applied by the API, so every matching record is reachable, not just the first page
+  const pageQuery = (cursor?: string) => ({
+    view: 'summary' as const,
+    limit: PAGE_SIZE,
+    cursor,
+    prediction: filterPrediction === 'all' ? undefined : filterPrediction,
+    patient_prefix: patientPrefix || undefined,
+  })
+
   const fetchData = async () => {
     setLoading(true)
     setError('')
     try {
       const [assessmentData, statsData] = await Promise.all([
-        getAssessments(),
+        getAssessments(pageQuery()),
         getAssessmentStats(),
       ])
       setAssessments(assessmentData.assessments)
+      setNextCursor(assessmentData.next_cursor || null)
       setStats(statsData)
     } catch (err: any) {
       setError(err.message || 'Failed to fetch data from database')
@@ -43,18 +59,36 @@ const PatientRecords: React.FC = () => {
     }
   }
 
+  const loadMore = async () => {
+    if (!nextCursor) return
+    setLoadingMore(true)
+    try {
+      const page = await getAssessments(pageQuery(nextCursor))
+      setAssessments((prev) => [...prev, ...page.assessments])
+      setNextCursor(page.next_cursor || null)
+    } catch (err: any) {
+      setError(err.message || 'Failed to fetch data from database')
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
+  // Debounce the search box before it becomes a server-side patient_prefix filter
+  useEffect(() => {
+    const timer = setTimeout(() => setPatientPrefix(searchTerm.trim()), 300)
+    return () => clearTimeout(timer)
+  }, [searchTerm])
+
   useEffect(() => {
     fetchData()
-  }, [])
+  }, [filterPrediction, patientPrefix])
 
-  const filteredAssessments = assessments.filter((a) => {
-    const matchesSearch =
-      a.patient_id.toLowerCase().includes(searchTerm.toLowerCase()) ||
-      (a.gender && a.gender.toLowerCase().includes(searchTerm.toLowerCase()))
-    const matchesFilter =
-      filterPrediction === 'all' || a.prediction === filterPrediction
-    return matchesSearch && matchesFilter
-  })
+  // Total matching records, when the stats endpoint can answer for the active filters
+  const matchingTotal = patientPrefix
+    ? null
+    : filterPrediction === 'all'
+      ? stats?.total_assessments ?? null
+      : stats?.predictions_breakdown?.[filterPrediction] ?? 0
 
   const getRiskIcon = (riskLevel: string) => {
     switch (riskLevel) {
@@ -222,7 +256,7 @@ const PatientRecords: React.FC = () => {
               type="text"
               value={searchTerm}
               onChange={(e) => setSearchTerm(e.target.value)}
-              placeholder="Search by Patient ID or Gender..."
+              placeholder="Search by Patient ID prefix..."
               className="w-full pl-10 pr-4 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-medical-blue focus:border-medical-blue outline-none text-sm"
             />
           </div>
@@ -265,7 +299,7 @@ const PatientRecords: React.FC = () => {
       {/* Assessment Table */}
       {!loading && !error && (
         <div className="card overflow-hidden p-0">
-          {filteredAssessments.length === 0 ? (
+          {assessments.length === 0 ? (
             <div className="text-center py-12">
               <FileText className="w-12 h-12 text-gray-300 mx-auto mb-4" />
               <p className="text-medical-slate font-medium">No assessment records found</p>
@@ -307,12 +341,12 @@ const PatientRecords: React.FC = () => {
                   </tr>
                 </thead>
                 <tbody>
-                  {filteredAssessments.map((assessment, index) => (
+                  {assessments.map((assessment, index) => (
                     <motion.tr
                       key={assessment.id}
                       initial={{ opacity: 0 }}
                       animate={{ opacity: 1 }}
-                      transition={{ delay: index * 0.05 }}
+                      transition={{ delay: Math.min(index, 20) * 0.05 }}
                       className="border-b border-gray-100 hover:bg-blue-50 transition-colors"
                     >
                       <td className="px-6 py-4 text-gray-500">{index + 1}</td>
@@ -372,9 +406,22 @@ const PatientRecords: React.FC = () => {
       )}
 
       {/* Results Summary */}
-      {!loading && filteredAssessments.length > 0 && (
-        <div className="text-center text-sm text-medical-slate">
-          Showing {filteredAssessments.length} of {assessments.length} records
+      {!loading && assessments.length > 0 && (
+        <div className="flex flex-col items-center space-y-3 text-sm text-medical-slate">
+          <span>
+            Showing {assessments.length}
+            {matchingTotal !== null ? ` of ${matchingTotal}` : ''} records
+          </span>
+          {nextCursor && (
+            <button
+              onClick={loadMore}
+              disabled={loadingMore}
+              className="btn-secondary flex items-center space-x-2 text-sm"
+            >
+              {loadingMore && <Loader className="w-4 h-4 animate-spin" />}
+              <span>Load more</span>
+            </button>
+          )}
         </div>
       )}
     </motion.div>
@@ -84,6 +84,8 @@ export interface PredictionResponse {
   confidence?: number
   confidence_scores?: Record<string, number>
   saved_to_database?: boolean
+  persistence?: 'queued' | 'journaled' | null
+  model_version?: string
   error?: string
 }
 
@@ -100,6 +102,7 @@ export interface AssessmentRecord {
   eeg_data: EEGData
   prediction: string
   risk_level: string
+  model_version?: string | null
   assessment_date: string
   created_at: string
 }
@@ -107,12 +110,39 @@ export interface AssessmentRecord {
 export interface AssessmentsListResponse {
   assessments: AssessmentRecord[]
   count: number
+  next_cursor?: string | null
+  has_more?: boolean
+}
+
+export interface AssessmentsQuery {
+  limit?: number
+  cursor?: string
+  prediction?: string
+  risk_level?: string
+  patient_prefix?: string
+  view?: 'summary' | 'full'
+  fields?: string
+}
+
+export interface AssessmentStatsBucket {
+  date: string
+  total: number
+  predictions: Record<string, number>
+  risk_levels: Record<string, number>
 }
 
 export interface AssessmentStatsResponse {
   total_assessments: number
   predictions_breakdown: Record<string, number>
   risk_levels_breakdown: Record<string, number>
+  buckets?: AssessmentStatsBucket[]
+  reconciled_at?: string | null
+}
+
+export interface AssessmentStatsQuery {
+  start?: string
+  end?: string
+  bucket?: 'day'
 }
 
 export const submitAssessment = async (
@@ -126,9 +156,13 @@ export const submitAssessment = async (
   }
 }
 
-export const getAssessments = async (): Promise<AssessmentsListResponse> => {
+export const getAssessments = async (
+  query: AssessmentsQuery = {}
+): Promise<AssessmentsListResponse> => {
   try {
-    const response = await apiClient.get<AssessmentsListResponse>('/assessments')
+    const response = await apiClient.get<AssessmentsListResponse>('/assessments', {
+      params: query,
+    })
     return response.data
   } catch (error: any) {
     throw new Error(error.response?.data?.error || 'Failed to fetch assessments')
@@ -136,11 +170,13 @@ export const getAssessments = async (): Promise<AssessmentsListResponse> => {
 }
 
 export const getPatientAssessments = async (
-  patientId: string
+  patientId: string,
+  query: AssessmentsQuery = {}
 ): Promise<AssessmentsListResponse> => {
   try {
     const response = await apiClient.get<AssessmentsListResponse>(
-      `/assessments/${patientId}`
+      `/assessments/${patientId}`,
+      { params: query }
     )
     return response.data
   } catch (error: any) {
@@ -148,9 +184,13 @@ export const getPatientAssessments = async (
   }
 }
 
-export const getAssessmentStats = async (): Promise<AssessmentStatsResponse> => {
+export const getAssessmentStats = async (
+  query: AssessmentStatsQuery = {}
+): Promise<AssessmentStatsResponse> => {
   try {
-    const response = await apiClient.get<AssessmentStatsResponse>('/assessments/stats')
+    const response = await apiClient.get<AssessmentStatsResponse>('/assessments/stats', {
+      params: query,
+    })
     return response.data
   } catch (error: any) {
     throw new Error(error.response?.data?.error || 'Failed to fetch assessment stats')